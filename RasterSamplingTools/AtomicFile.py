@@ -0,0 +1,57 @@
+"""\
+Replace a file with a complete new one
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import stat
+import tempfile
+import contextlib
+
+
+def currentUmask() -> int:
+    # There's no way to read the umask without setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once, on import, because reading it briefly changes it for
+# every thread in the process.
+_umask = currentUmask()
+
+
+def replacementMode(file: str) -> int:
+    # The mode the file would have if it were rewritten in place: the mode
+    # it has now, or for a new file, the mode open() would give it.
+    try:
+        return stat.S_IMODE(os.stat(file).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_umask
+
+
+@contextlib.contextmanager
+def replaceFile(
+    file: str, mode: str = "w", prefix: str = "."
+) -> typing.Iterator[typing.IO]:
+    # Write to a temporary file in the same directory and rename it over
+    # file, so an interrupted write never leaves a partial file, and readers
+    # never see one. mkstemp() creates the temporary file readable only by
+    # its owner, so it's given the mode file would have had first.
+    fd, tempFile = tempfile.mkstemp(
+        prefix=prefix, suffix=".tmp", dir=os.path.dirname(os.path.abspath(file))
+    )
+    try:
+        with os.fdopen(fd, mode) as outFile:
+            yield outFile
+        os.chmod(tempFile, replacementMode(file))
+        os.replace(tempFile, file)
+    except BaseException:
+        if os.path.exists(tempFile):
+            os.remove(tempFile)
+        raise
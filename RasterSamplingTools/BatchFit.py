@@ -0,0 +1,268 @@
+"""\
+Batched line fitting
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import numpy as np
+import scipy.stats
+
+# The value scipy.stats.linregress uses to keep the t statistic finite
+# when r is exactly +/-1.
+_tiny = 1.0e-20
+
+# The bootstrap intervals are percentile intervals at this confidence
+bootstrapConfidence = 0.95
+
+# Every glyph's resamples are drawn from a generator seeded with this,
+# so a glyph gets the same intervals whatever order it's tested in.
+bootstrapSeed = 0
+
+
+class BatchFitResults(object):
+    __slots__ = (
+        "counts",
+        "slope",
+        "intercept",
+        "rValue",
+        "pValue",
+        "stdErr",
+        "lmod",
+        "widthMin",
+        "widthQuartiles",
+        "widthMean",
+        "widthMax",
+    )
+
+    def __init__(self, count: int):
+        self.counts = np.zeros(count, dtype=np.intp)
+        self.slope = np.full(count, np.nan)
+        self.intercept = np.full(count, np.nan)
+        self.rValue = np.full(count, np.nan)
+        self.pValue = np.full(count, np.nan)
+        self.stdErr = np.full(count, np.nan)
+        self.lmod = np.full(count, np.nan)
+        self.widthMin = np.full(count, np.nan)
+        self.widthQuartiles = np.full((count, 3), np.nan)
+        self.widthMean = np.full(count, np.nan)
+        self.widthMax = np.full(count, np.nan)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def isValid(self, index: int) -> bool:
+        return self.counts[index] >= 2
+
+    def fit(self, index: int) -> tuple[float, float, float, float, float]:
+        return (
+            float(self.slope[index]),
+            float(self.intercept[index]),
+            float(self.rValue[index]),
+            float(self.pValue[index]),
+            float(self.stdErr[index]),
+        )
+
+    def widthDict(self, index: int) -> dict[str, float]:
+        q1, median, q3 = self.widthQuartiles[index]
+        return {
+            "min": round(float(self.widthMin[index]), 2),
+            "q1": round(float(q1), 2),
+            "median": round(float(median), 2),
+            "mean": round(float(self.widthMean[index]), 2),
+            "q3": round(float(q3), 2),
+            "max": round(float(self.widthMax[index]), 2),
+        }
+
+
+def packSegments(
+    segments: typing.Iterable[
+        tuple[typing.Sequence[float], typing.Sequence[float], typing.Sequence[float]]
+    ],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Each segment is (midpoint xs, midpoint ys, widths) for one glyph.
+    xs: list[float] = []
+    ys: list[float] = []
+    widths: list[float] = []
+    offsets = [0]
+
+    for segmentXs, segmentYs, segmentWidths in segments:
+        xs.extend(segmentXs)
+        ys.extend(segmentYs)
+        widths.extend(segmentWidths)
+        offsets.append(len(xs))
+
+    return (
+        np.asarray(xs, dtype=float),
+        np.asarray(ys, dtype=float),
+        np.asarray(widths, dtype=float),
+        np.asarray(offsets, dtype=np.intp),
+    )
+
+
+def segmentIDs(offsets: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def segmentSums(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    # np.add.reduceat() returns the element at the start index for empty
+    # segments, so use a cumulative sum, which handles them correctly.
+    cumulative = np.concatenate(([0.0], np.cumsum(values, axis=-1)))
+    return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+
+def segmentQuantiles(values: np.ndarray, offsets: np.ndarray, n: int = 4) -> np.ndarray:
+    # Same as statistics.quantiles(method="inclusive"), including its integer
+    # arithmetic, so the rounded results match the unbatched ones exactly.
+    ids = segmentIDs(offsets)
+    ordered = values[np.lexsort((values, ids))]
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    m = np.maximum(counts - 1, 0)
+
+    result = np.full((len(counts), n - 1), np.nan)
+    valid = counts > 0
+    for i in range(1, n):
+        j = i * m // n
+        delta = i * m - j * n
+        low = ordered[np.where(valid, starts + j, 0)]
+        high = ordered[np.where(valid, starts + np.minimum(j + 1, m), 0)]
+        result[valid, i - 1] = ((low * (n - delta) + high * delta) / n)[valid]
+
+    return result
+
+
+def fitSegments(
+    xs: np.ndarray, ys: np.ndarray, widths: np.ndarray, offsets: np.ndarray
+) -> BatchFitResults:
+    # Fit x = by + a to the midpoints of every segment, which is what
+    # RasterSamplingTest.bestFit() does with scipy.stats.linregress(ys, xs)
+    # one glyph at a time.
+    segmentCount = len(offsets) - 1
+    results = BatchFitResults(segmentCount)
+    counts = np.diff(offsets)
+    results.counts = counts
+
+    if len(xs) == 0:
+        return results
+
+    ids = segmentIDs(offsets)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = counts.astype(float)
+        meanY = segmentSums(ys, offsets) / n
+        meanX = segmentSums(xs, offsets) / n
+        dy = ys - meanY[ids]
+        dx = xs - meanX[ids]
+        ssyy = segmentSums(dy * dy, offsets)
+        ssxx = segmentSums(dx * dx, offsets)
+        ssxy = segmentSums(dx * dy, offsets)
+
+        slope = ssxy / ssyy
+        intercept = meanX - slope * meanY
+
+        # linregress returns NaN for r when the covariance is zero too,
+        # e.g. when every midpoint has the same x coordinate.
+        degenerate = (ssyy == 0.0) | (ssxx == 0.0)
+        r = np.where(
+            degenerate,
+            np.where(ssxy == 0.0, np.nan, 0.0),
+            ssxy / np.sqrt(ssyy * ssxx),
+        )
+        r = np.clip(r, -1.0, 1.0)
+
+        df = n - 2
+        t = r * np.sqrt(df / ((1.0 - r + _tiny) * (1.0 + r + _tiny)))
+        pValue = 2 * scipy.stats.t.sf(np.abs(t), df)
+        stdErr = np.sqrt((1 - r * r) * ssxx / ssyy / df)
+
+        # linregress special-cases exactly two points
+        pair = counts == 2
+        pairStarts = offsets[:-1][pair]
+        pValue[pair] = np.where(xs[pairStarts] == xs[pairStarts + 1], 1.0, 0.0)
+        stdErr[pair] = 0.0
+
+        # Segments too short to fit would poison the cumulative sums
+        # for the segments after them, so give them a harmless line.
+        valid = counts >= 2
+        lineSlope = np.where(valid, slope, 0.0)[ids]
+        lineIntercept = np.where(valid, intercept, 0.0)[ids]
+        distances = np.abs(lineIntercept + lineSlope * ys - xs) / np.sqrt(
+            1 + lineSlope * lineSlope
+        )
+        lmod = np.log1p(segmentSums(distances, offsets) / n)
+
+        results.widthMin = np.full(segmentCount, np.nan)
+        results.widthMax = np.full(segmentCount, np.nan)
+        nonEmpty = counts > 0
+        if nonEmpty.any():
+            starts = offsets[:-1][nonEmpty]
+            results.widthMin[nonEmpty] = np.minimum.reduceat(widths, starts)
+            results.widthMax[nonEmpty] = np.maximum.reduceat(widths, starts)
+        results.widthMean = segmentSums(widths, offsets) / n
+
+    results.widthQuartiles = segmentQuantiles(widths, offsets)
+
+    results.slope = np.where(valid, slope, np.nan)
+    results.intercept = np.where(valid, intercept, np.nan)
+    results.rValue = np.where(valid, r, np.nan)
+    results.pValue = np.where(valid, pValue, np.nan)
+    results.stdErr = np.where(valid, stdErr, np.nan)
+    results.lmod = np.where(valid, lmod, np.nan)
+
+    return results
+
+
+class BootstrapFit(object):
+    # The fit of each resample of one glyph's midpoints and widths
+    __slots__ = "slope", "lmod", "widthMedian"
+
+    def __init__(self, slope: np.ndarray, lmod: np.ndarray, widthMedian: np.ndarray):
+        self.slope = slope
+        self.lmod = lmod
+        self.widthMedian = widthMedian
+
+
+def bootstrapFit(
+    xs: np.ndarray, ys: np.ndarray, widths: np.ndarray, resampleCount: int
+) -> BootstrapFit:
+    # Draw every resample at once, as a row of indices into the rasters, so
+    # each raster's midpoint stays with its width. Then fit x = by + a to
+    # each row, measure its lmod, and take its median width, all in one
+    # set of array operations instead of a loop over the resamples.
+    rng = np.random.default_rng(bootstrapSeed)
+    indices = rng.integers(0, len(xs), size=(resampleCount, len(xs)))
+    resampleXs = xs[indices]
+    resampleYs = ys[indices]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = resampleXs - resampleXs.mean(axis=1, keepdims=True)
+        dy = resampleYs - resampleYs.mean(axis=1, keepdims=True)
+        slope = (dx * dy).sum(axis=1) / (dy * dy).sum(axis=1)
+        intercept = resampleXs.mean(axis=1) - slope * resampleYs.mean(axis=1)
+
+        distances = (
+            np.abs(
+                intercept[:, np.newaxis]
+                + slope[:, np.newaxis] * resampleYs
+                - resampleXs
+            )
+            / np.sqrt(1 + slope * slope)[:, np.newaxis]
+        )
+        lmod = np.log1p(distances.mean(axis=1))
+
+    widthMedian = np.median(widths[indices], axis=1)
+    return BootstrapFit(slope, lmod, widthMedian)
+
+
+def percentileInterval(values: np.ndarray, digits: int) -> typing.Optional[list[float]]:
+    # A resample with every midpoint at the same height has no slope
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None
+
+    tail = (1 - bootstrapConfidence) / 2
+    low, high = np.quantile(values, [tail, 1 - tail])
+    return [round(float(low), digits), round(float(high), digits)]
@@ -0,0 +1,149 @@
+"""\
+Stroke spans from a scan-converted bitmap of the glyph
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import math
+import numpy as np
+from PathLib.Bezier import BContour
+
+# Pixels per unit, after the outline is scaled to 1000 units per em
+bitmapResolution = 8
+
+# Curves are flattened into at most this many lines each
+maxCurveSteps = 64
+
+# The leftmost x, the x where the leftmost span ends, and
+# the x where the rightmost span ends, on one raster
+Span = tuple[float, float, float]
+
+
+def bernstein(order: int, ts: np.ndarray) -> np.ndarray:
+    # The Bernstein basis of the given order at each t, one row per t
+    return np.stack(
+        [
+            math.comb(order, k) * ts**k * (1 - ts) ** (order - k)
+            for k in range(order + 1)
+        ],
+        axis=-1,
+    )
+
+
+def flattenCurves(controlPoints: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # controlPoints has a row of control points for each curve of the same
+    # order. Each curve is cut into enough lines that none of them is more
+    # than about a pixel from the curve. Returns their start and end points.
+    curveCount, pointCount, _ = controlPoints.shape
+    order = pointCount - 1
+    if order == 1:
+        return controlPoints[:, 0], controlPoints[:, 1]
+
+    # How far the inner control points are from the chord
+    start = controlPoints[:, :1]
+    chord = controlPoints[:, -1:] - start
+    fractions = np.arange(pointCount)[np.newaxis, :, np.newaxis] / order
+    deviation = np.abs(controlPoints - (start + chord * fractions)).max(axis=(1, 2))
+    steps = np.clip(
+        np.ceil(np.sqrt(deviation * bitmapResolution)), 1, maxCurveSteps
+    ).astype(np.intp)
+
+    curveIDs = np.repeat(np.arange(curveCount), steps)
+    firstLines = np.cumsum(steps) - steps
+    ts = (np.arange(len(curveIDs)) - firstLines[curveIDs]) / steps[curveIDs]
+    nextTs = ts + 1 / steps[curveIDs]
+
+    points = controlPoints[curveIDs]
+    starts = np.einsum("lk,lkd->ld", bernstein(order, ts), points)
+    ends = np.einsum("lk,lkd->ld", bernstein(order, nextTs), points)
+    return starts, ends
+
+
+class BitmapSpans(object):
+    # Scan-converts the contours into an occupancy grid with one row for
+    # each raster, at bitmapResolution pixels per unit across, using the
+    # nonzero winding rule. The spans on each row come from run-length
+    # encoding it: where the runs of filled pixels start and end. After
+    # the contours are flattened, everything is done with whole-array
+    # operations, so the time per raster doesn't grow with the number of
+    # segments the way solving for each crossing does.
+    __slots__ = "spans"
+
+    def __init__(self, contours: list[BContour], ys: typing.Sequence[float]):
+        self.spans: list[typing.Optional[Span]] = [None] * len(ys)
+
+        curvesByOrder: dict[int, list[list[tuple[float, float]]]] = {}
+        for contour in contours:
+            for curve in contour:
+                points = [curve.pointXY(p) for p in curve.controlPoints]
+                curvesByOrder.setdefault(len(points) - 1, []).append(points)
+
+        if not curvesByOrder or len(ys) == 0:
+            return
+
+        lines = [
+            flattenCurves(np.array(curves, dtype=float))
+            for curves in curvesByOrder.values()
+        ]
+        starts = np.concatenate([lineStarts for lineStarts, _ in lines])
+        ends = np.concatenate([lineEnds for _, lineEnds in lines])
+        self._scan(starts, ends, np.asarray(ys, dtype=float))
+
+    def _scan(self, starts: np.ndarray, ends: np.ndarray, ys: np.ndarray):
+        x0, y0 = starts[:, 0], starts[:, 1]
+        x1, y1 = ends[:, 0], ends[:, 1]
+
+        # Horizontal lines never cross a raster at a single point
+        sloped = y0 != y1
+        x0, y0, x1, y1 = x0[sloped], y0[sloped], x1[sloped], y1[sloped]
+        winding = np.where(y1 > y0, 1, -1)
+
+        # The rows each line crosses. Like the analytic edges, the lines
+        # are half open, [yMin, yMax), so a shared end point counts once.
+        order = np.argsort(ys)
+        sortedYs = ys[order]
+        first = np.searchsorted(sortedYs, np.minimum(y0, y1), side="left")
+        limit = np.searchsorted(sortedYs, np.maximum(y0, y1), side="left")
+        counts = limit - first
+        lineIDs = np.repeat(np.arange(len(counts)), counts)
+        if len(lineIDs) == 0:
+            return
+
+        firstCrossings = np.cumsum(counts) - counts
+        sortedRows = first[lineIDs] + np.arange(len(lineIDs)) - firstCrossings[lineIDs]
+        rowYs = sortedYs[sortedRows]
+        crossingXs = x0[lineIDs] + (rowYs - y0[lineIDs]) * (
+            x1[lineIDs] - x0[lineIDs]
+        ) / (y1[lineIDs] - y0[lineIDs])
+
+        # Each crossing changes the winding number of the pixels
+        # whose centers are to its right.
+        left = math.floor(crossingXs.min()) - 1
+        width = math.ceil((crossingXs.max() - left) * bitmapResolution) + 2
+        columns = np.floor((crossingXs - left) * bitmapResolution - 0.5).astype(np.intp)
+        deltas = np.zeros((len(ys), width + 1), dtype=np.int32)
+        np.add.at(deltas, (sortedRows, columns + 1), winding[lineIDs])
+        filled = np.cumsum(deltas, axis=1)[:, :width] != 0
+
+        # Run-length encode the rows: +1 where a run starts, -1 after it ends
+        padded = np.pad(filled.astype(np.int8), ((0, 0), (1, 1)))
+        transitions = np.diff(padded, axis=1)
+        runRows, runStarts = np.nonzero(transitions == 1)
+        _, runEnds = np.nonzero(transitions == -1)
+
+        # np.nonzero() is in row order, so each row's runs are together
+        rows, firstRuns = np.unique(runRows, return_index=True)
+        lastRuns = np.append(firstRuns[1:], len(runRows)) - 1
+
+        def xAt(column: np.ndarray) -> np.ndarray:
+            return left + column / bitmapResolution
+
+        spanXs = xAt(runStarts[firstRuns])
+        leftEnds = xAt(runEnds[firstRuns])
+        rightEnds = xAt(runEnds[lastRuns])
+        for row, x, leftEnd, rightEnd in zip(rows, spanXs, leftEnds, rightEnds):
+            self.spans[order[row]] = (float(x), float(leftEnd), float(rightEnd))
@@ -11,8 +11,8 @@ import typing
 import json
 
 # from re import fullmatch
-from TestArguments.GlyphSpec import GlyphSpec
 from TestArguments.Font import Font
+from RasterSamplingTools.GlyphIndex import GlyphIndex
 
 
 class FontDatabase:
@@ -29,6 +29,10 @@ class FontDatabase:
         self._defaultTests: list[FontDatabase.Test] = self._db[0].get("default_tests", "")
         self._testDefaults: FontDatabase.Test = self._db[0].get("test_defaults", "")
 
+    @property
+    def defaultTestCount(self) -> int:
+        return len(self._defaultTests)
+
     def getFontInfo(self, font: Font) -> Info:
         NameFunc = typing.Callable[[Font], typing.Optional[str]]
         psNameFunc: NameFunc = lambda f: f.postscriptName
@@ -56,14 +60,19 @@ class FontDatabase:
 
         return testDefaults
 
-    def getIgnoreGlyphList(self, font: Font, info: Info) -> list[GlyphSpec]:
-        ignoreList: list[GlyphSpec] = []
+    def getIgnoreGlyphList(
+        self, font: Font, info: Info, glyphIndex: typing.Optional[GlyphIndex] = None
+    ) -> list[str]:
+        if glyphIndex is None:
+            glyphIndex = GlyphIndex(font)
+
+        ignoreList: list[str] = []
         infoIgnoreList = info.get("ignore_glyphs", [])
 
         for spec in infoIgnoreList:
-            glyphSpec = GlyphSpec(spec)
-            nameSpec = typing.cast(GlyphSpec, glyphSpec.nameSpecForFont(font))
-            ignoreList.append(nameSpec)
+            nameSpec = glyphIndex.nameSpecForSpec(spec)
+            if nameSpec:
+                ignoreList.append(nameSpec)
 
         return ignoreList
 
@@ -78,6 +87,11 @@ class FontDatabase:
     @staticmethod
     def copyTest(test: Test, glyphNameSpec: str, testDefaults: Test) -> Test:
         testCopy = test.copy()
+        # "glyph" is always the glyph's name, which is how its results are
+        # keyed. The spec it was listed with is kept too, because a character
+        # says which of the glyph's code points the test is for.
+        if "glyph" in test:
+            testCopy["glyph_spec"] = test["glyph"]
         testCopy["glyph"] = glyphNameSpec
 
         for key, value in testDefaults.items():
@@ -86,21 +100,24 @@ class FontDatabase:
 
         return testCopy
 
-    def getTests(self, font: Font, info: Info) -> list[Test]:
+    def getTests(
+        self, font: Font, info: Info, glyphIndex: typing.Optional[GlyphIndex] = None
+    ) -> list[Test]:
+        if glyphIndex is None:
+            glyphIndex = GlyphIndex(font)
+
         tests: list[FontDatabase.Test] = []
         infoTests = info.get("tests", [])
         testDefaults = self.getTestDefaults(info)
-        ignoreList = self.getIgnoreGlyphList(font, info)
+        ignoreList = self.getIgnoreGlyphList(font, info, glyphIndex)
 
         for test in infoTests:
-            glyphSpec = GlyphSpec(test["glyph"])
-            glyphNameSpec = glyphSpec.nameSpecForFont(font)
+            glyphNameSpec = glyphIndex.nameSpecForSpec(test["glyph"])
             if glyphNameSpec:
                 tests.append(self.copyTest(test, glyphNameSpec, testDefaults))
 
         for defaultTest in self._defaultTests:
-            glyphSpec = GlyphSpec(defaultTest["glyph"])
-            glyphNameSpec = glyphSpec.nameSpecForFont(font)
+            glyphNameSpec = glyphIndex.nameSpecForSpec(defaultTest["glyph"])
             if (
                 glyphNameSpec
                 and not glyphNameSpec in ignoreList
@@ -110,6 +127,30 @@ class FontDatabase:
 
         return tests
 
+    def getUnlistedTests(
+        self,
+        font: Font,
+        info: Info,
+        tests: list[Test],
+        glyphIndex: typing.Optional[GlyphIndex] = None,
+    ) -> list[Test]:
+        # A test with the font's defaults for every glyph that isn't
+        # already in tests or on the ignore list.
+        if glyphIndex is None:
+            glyphIndex = GlyphIndex(font)
+
+        testDefaults = self.getTestDefaults(info)
+        skipGlyphs = set(self.getIgnoreGlyphList(font, info, glyphIndex))
+        skipGlyphs.update(test["glyph"] for test in tests)
+
+        unlistedTests: list[FontDatabase.Test] = []
+        for glyphName in glyphIndex.glyphNames:
+            glyphNameSpec = f"/{glyphName}"
+            if glyphNameSpec not in skipGlyphs:
+                unlistedTests.append(self.copyTest({}, glyphNameSpec, testDefaults))
+
+        return unlistedTests
+
     def getTest(self, test: Test):
         glyph: str = test["glyph"]
         range = test["range"]
@@ -0,0 +1,214 @@
+"""\
+Find the font files in a directory tree
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import re
+import json
+import time
+import hashlib
+
+from RasterSamplingTools.AtomicFile import replaceFile
+
+manifestVersion = 1
+
+# The same files that rglob("*.[otOT][tT][cfCF]") finds
+fontFilePattern = re.compile(r".*\.[otOT][tT][cfCF]")
+
+# A directory modified this recently may still be changing within the
+# resolution of its modification time (a whole second on some NFS servers),
+# so its listing isn't trusted the next time.
+racyInterval = 2.0
+
+hashChunkSize = 1024 * 1024
+
+# name, size, modification time in nanoseconds
+FileListing = list[typing.Any]
+
+
+class FontFile(object):
+    __slots__ = "path", "size", "paths"
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+        # Every path, relative to the root, where this file was found,
+        # in the order they were found. The first one is the one tested.
+        self.paths: list[str] = []
+
+
+def fileHash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fontFile:
+        while chunk := fontFile.read(hashChunkSize):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FontDiscovery(object):
+    # Walks the tree with os.scandir(). With a manifest, a directory whose
+    # modification time hasn't changed since the last run isn't read again:
+    # its list of fonts and subdirectories comes from the manifest. Its
+    # subdirectories are still visited, since changes inside them don't
+    # change its modification time.
+    __slots__ = (
+        "root",
+        "manifestFile",
+        "_oldDirectories",
+        "_oldHashes",
+        "_directories",
+        "_hashes",
+        "_scanStart",
+        "scannedCount",
+        "reusedCount",
+        "hashedCount",
+    )
+
+    def __init__(self, root: str, manifestFile: typing.Optional[str] = None):
+        self.root = root
+        self.manifestFile = manifestFile
+
+        self._oldDirectories: dict[str, typing.Any] = {}
+        self._oldHashes: dict[str, typing.Any] = {}
+        if manifestFile:
+            self._readManifest(manifestFile)
+
+        self._directories: dict[str, typing.Any] = {}
+        self._hashes: dict[str, typing.Any] = {}
+        self._scanStart = 0
+        self.scannedCount = 0
+        self.reusedCount = 0
+        self.hashedCount = 0
+
+    def _readManifest(self, manifestFile: str):
+        try:
+            with open(manifestFile) as file:
+                manifest = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if manifest.get("version") == manifestVersion and manifest.get(
+            "root"
+        ) == os.path.abspath(self.root):
+            self._oldDirectories = manifest.get("directories", {})
+            self._oldHashes = manifest.get("hashes", {})
+
+    def _writeManifest(self, manifestFile: str):
+        manifest = {
+            "version": manifestVersion,
+            "root": os.path.abspath(self.root),
+            "directories": self._directories,
+            "hashes": self._hashes,
+        }
+
+        with replaceFile(manifestFile) as outFile:
+            json.dump(manifest, outFile)
+
+    def _listDirectory(
+        self, relDir: str, mtime: int
+    ) -> tuple[list[FileListing], list[str]]:
+        old = self._oldDirectories.get(relDir)
+        if old and old["mtime"] == mtime:
+            self.reusedCount += 1
+            return old["fonts"], old["subdirectories"]
+
+        self.scannedCount += 1
+        fonts: list[FileListing] = []
+        subdirectories: list[str] = []
+        with os.scandir(os.path.join(self.root, relDir)) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.name)
+                    elif fontFilePattern.fullmatch(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        fonts.append([entry.name, stat.st_size, stat.st_mtime_ns])
+                except OSError:
+                    # It was removed while we were looking at it
+                    continue
+
+        return fonts, subdirectories
+
+    def _walk(self, relDir: str) -> typing.Iterator[tuple[str, int, int]]:
+        # Yields (relative path, size, mtime) for each font file, with the
+        # files in each directory before the directories inside it, in the
+        # same order as rglob().
+        try:
+            mtime = os.stat(os.path.join(self.root, relDir)).st_mtime_ns
+            fonts, subdirectories = self._listDirectory(relDir, mtime)
+        except OSError:
+            return
+
+        racy = mtime >= self._scanStart - racyInterval * 1e9
+        self._directories[relDir] = {
+            "mtime": None if racy else mtime,
+            "fonts": fonts,
+            "subdirectories": subdirectories,
+        }
+
+        for name, size, fileMTime in fonts:
+            yield os.path.join(relDir, name), size, fileMTime
+
+        for name in subdirectories:
+            yield from self._walk(os.path.join(relDir, name))
+
+    def _hash(self, relPath: str) -> str:
+        # The file is stat'ed again, because its size and modification time
+        # in a listing from the manifest are stale if it was rewritten in
+        # place, which doesn't change its directory's modification time.
+        path = os.path.join(self.root, relPath)
+        stat = os.stat(path)
+        size, mtime = stat.st_size, stat.st_mtime_ns
+
+        old = self._oldHashes.get(relPath)
+        if old and old["size"] == size and old["mtime"] == mtime:
+            digest = old["sha256"]
+        else:
+            digest = fileHash(path)
+            self.hashedCount += 1
+
+        racy = mtime >= self._scanStart - racyInterval * 1e9
+        self._hashes[relPath] = {
+            "size": size,
+            "mtime": None if racy else mtime,
+            "sha256": digest,
+        }
+        return digest
+
+    def fontFiles(self) -> list[FontFile]:
+        # Each distinct font file once, in the order they were found.
+        # Only files that are the same size as another file are hashed.
+        self._scanStart = time.time_ns()
+        found = list(self._walk(""))
+
+        sizeCounts: dict[int, int] = {}
+        for _, size, _ in found:
+            sizeCounts[size] = sizeCounts.get(size, 0) + 1
+
+        fontFiles: dict[typing.Any, FontFile] = {}
+        for relPath, size, _ in found:
+            key: typing.Any = size
+            if sizeCounts[size] > 1:
+                try:
+                    key = (size, self._hash(relPath))
+                except OSError:
+                    # We can't read it now, so let the test report that
+                    key = relPath
+
+            fontFile = fontFiles.get(key)
+            if fontFile is None:
+                fontFile = FontFile(os.path.join(self.root, relPath), size)
+                fontFiles[key] = fontFile
+            fontFile.paths.append(relPath)
+
+        if self.manifestFile:
+            self._writeManifest(self.manifestFile)
+
+        return list(fontFiles.values())
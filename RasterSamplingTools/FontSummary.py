@@ -0,0 +1,164 @@
+"""\
+Per-font summaries of the output database
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import json
+import statistics
+
+from UnicodeData.CharProps import getScript
+from UnicodeData.UCDTypeDictionaries import scriptNames as scriptCodes
+from RasterSamplingTools.AtomicFile import replaceFile
+
+summaryVersion = 1
+
+widthFields = ["min", "q1", "median", "mean", "q3", "max"]
+
+FontEntry = dict[str, typing.Any]
+FontSummary = dict[str, typing.Any]
+
+# The size and modification time of a file, in nanoseconds
+FileStamp = list[int]
+
+
+def summaryFileFor(dbFile: str) -> str:
+    # OutputDatabase.json -> OutputDatabase.summary.json
+    root, _ = os.path.splitext(dbFile)
+    return root + ".summary.json"
+
+
+def fileStamp(file: str) -> typing.Optional[FileStamp]:
+    try:
+        stat = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def getScriptCode(codePoint: int) -> str:
+    return scriptCodes[getScript(codePoint)]
+
+
+def statSummary(values: list[float]) -> dict[str, float]:
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "mean": statistics.mean(values),
+        "max": max(values),
+    }
+
+
+def summarizeFont(entry: FontEntry) -> FontSummary:
+    testResults = entry["test_results"]
+    widths: dict[str, list[float]] = {field: [] for field in widthFields}
+    angles: list[float] = []
+    lmods: list[float] = []
+    scripts: set[str] = set()
+    goodGlyphCount = 0
+    failedGlyphCount = 0
+
+    for result in testResults.values():
+        if "failure" in result:
+            failedGlyphCount += 1
+            continue
+
+        for codePoint in result.get("code_points", []):
+            scripts.add(getScriptCode(codePoint))
+
+        widthResults = result.get("widths", None)
+        if widthResults:
+            goodGlyphCount += 1
+            for field in widthFields:
+                widths[field].append(widthResults[field])
+
+            fitResults = result["fit_results"]
+            angles.append(fitResults["stroke_angle"])
+            lmods.append(fitResults["log_mean_orthogonal_distance"])
+
+    scripts.discard("Zzzz")  # Don't count the unknown script
+    summary: FontSummary = {
+        "ps_name": entry["ps_name"],
+        "glyph_count": len(testResults),
+        "good_glyph_count": goodGlyphCount,
+        "ignored_glyph_count": len(testResults) - goodGlyphCount - failedGlyphCount,
+        "failed_glyph_count": failedGlyphCount,
+        "scripts": sorted(scripts),
+        "widths": None,
+        "stroke_angle": None,
+        "lmod": None,
+    }
+
+    if goodGlyphCount > 0:
+        summary["widths"] = {
+            field: statistics.mean(values) for field, values in widths.items()
+        }
+        summary["stroke_angle"] = statSummary(angles)
+        summary["lmod"] = statSummary(lmods)
+
+    return summary
+
+
+class FontSummaries(object):
+    # The summaries of the fonts in an output database, kept in a file next
+    # to it. The file records the size and modification time the database
+    # had when they were written, so they're only used while the database
+    # hasn't been changed by anything else.
+    __slots__ = "dbFile", "file", "current", "_summaries"
+
+    def __init__(self, dbFile: str):
+        self.dbFile = dbFile
+        self.file = summaryFileFor(dbFile)
+        self._summaries: dict[str, FontSummary] = {}
+
+        # True if there's a summary for every font in the database
+        dbStamp = fileStamp(dbFile)
+        self.current = dbStamp is None
+
+        try:
+            with open(self.file) as summaryFile:
+                contents = json.load(summaryFile)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if (
+            contents.get("version") == summaryVersion
+            and contents.get("database") == dbStamp
+        ):
+            self._summaries = {
+                summary["ps_name"]: summary for summary in contents["fonts"]
+            }
+            self.current = True
+
+    @property
+    def summaries(self) -> list[FontSummary]:
+        return list(self._summaries.values())
+
+    def update(self, db: list[FontEntry], changedFonts: set[str]):
+        # Only the fonts whose test results changed, or that
+        # don't have a summary yet, are summarized again.
+        summaries: dict[str, FontSummary] = {}
+        for entry in db:
+            psName = entry["ps_name"]
+            summary = self._summaries.get(psName)
+            if summary is None or psName in changedFonts:
+                summary = summarizeFont(entry)
+            summaries[psName] = summary
+
+        self._summaries = summaries
+
+    def write(self):
+        # Call this after the database has been written.
+        contents = {
+            "version": summaryVersion,
+            "database": fileStamp(self.dbFile),
+            "fonts": self.summaries,
+        }
+        with replaceFile(self.file) as summaryFile:
+            json.dump(contents, summaryFile, indent=4)
+        self.current = True
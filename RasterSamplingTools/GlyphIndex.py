@@ -0,0 +1,130 @@
+"""\
+Glyph Index
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import re
+from UnicodeData.CharNames import CharNames
+from TestArguments.Font import Font
+
+# Character names don't depend on the font, so one cache serves every index.
+_charNames: dict[int, typing.Optional[str]] = {}
+
+
+def charName(charCode: int) -> typing.Optional[str]:
+    if charCode not in _charNames:
+        _charNames[charCode] = CharNames.getCharName(charCode)
+    return _charNames[charCode]
+
+
+class GlyphInfo(object):
+    __slots__ = "name", "glyphID", "charCode", "codePoints"
+
+    def __init__(
+        self,
+        name: str,
+        glyphID: int,
+        charCode: typing.Optional[int],
+        codePoints: list[int],
+    ):
+        self.name = name
+        self.glyphID = glyphID
+        self.charCode = charCode
+        self.codePoints = codePoints
+
+    @property
+    def nameSpec(self) -> str:
+        return f"/{self.name}"
+
+    @property
+    def glyphIDSpec(self) -> str:
+        return f"gid{self.glyphID}"
+
+    @property
+    def unicodeName(self) -> typing.Optional[str]:
+        return charName(self.charCode) if self.charCode is not None else None
+
+
+class GlyphIndex(object):
+    __slots__ = "_glyphOrder", "_glyphIDs", "_cmap", "_codePoints", "_infos"
+
+    def __init__(self, font: Font):
+        ttFont = font.ttFont
+
+        self._glyphOrder: list[str] = ttFont.getGlyphOrder()
+        self._glyphIDs = {name: gid for gid, name in enumerate(self._glyphOrder)}
+        self._cmap: dict[int, str] = ttFont.getBestCmap() or {}
+
+        # The reverse cmap, with each glyph's code points in ascending order
+        self._codePoints: dict[str, list[int]] = {}
+        for charCode in sorted(self._cmap):
+            self._codePoints.setdefault(self._cmap[charCode], []).append(charCode)
+
+        self._infos: dict[str, GlyphInfo] = {}
+
+    def glyphNameForCharacterCode(self, charCode: int) -> typing.Optional[str]:
+        return self._cmap.get(charCode)
+
+    def glyphNameForGlyphID(self, glyphID: int) -> typing.Optional[str]:
+        if 0 <= glyphID < len(self._glyphOrder):
+            return self._glyphOrder[glyphID]
+        return None
+
+    def glyphIDForGlyphName(self, glyphName: str) -> typing.Optional[int]:
+        return self._glyphIDs.get(glyphName)
+
+    def codePointsForGlyphName(self, glyphName: str) -> list[int]:
+        return self._codePoints.get(glyphName, [])
+
+    @property
+    def glyphNames(self) -> list[str]:
+        return self._glyphOrder
+
+    def infoForName(
+        self, glyphName: str, charCode: typing.Optional[int] = None
+    ) -> typing.Optional[GlyphInfo]:
+        glyphID = self._glyphIDs.get(glyphName)
+        if glyphID is None:
+            return None
+
+        key = glyphName if charCode is None else f"{glyphName}\0{charCode}"
+        info = self._infos.get(key)
+        if info is None:
+            codePoints = self.codePointsForGlyphName(glyphName)
+            if charCode is None and codePoints:
+                charCode = codePoints[0]
+            info = GlyphInfo(glyphName, glyphID, charCode, codePoints)
+            self._infos[key] = info
+
+        return info
+
+    def resolve(self, spec: str) -> typing.Optional[GlyphInfo]:
+        # spec is in the same format as the --glyph option and FontDatabase:
+        # char | /glyphName | uni<4-6 hex digits> | gid<1-5 decimal digits>
+        if len(spec) == 1:
+            charCode = ord(spec)
+            glyphName = self.glyphNameForCharacterCode(charCode)
+            return self.infoForName(glyphName, charCode) if glyphName else None
+
+        if spec.startswith("/"):
+            return self.infoForName(spec[1:])
+
+        if m := re.fullmatch("uni([0-9A-Fa-f]{4,6})", spec):
+            charCode = int(m.group(1), 16)
+            glyphName = self.glyphNameForCharacterCode(charCode)
+            return self.infoForName(glyphName, charCode) if glyphName else None
+
+        if m := re.fullmatch("gid([0-9]{1,5})", spec):
+            glyphName = self.glyphNameForGlyphID(int(m.group(1)))
+            return self.infoForName(glyphName) if glyphName else None
+
+        return None
+
+    def nameSpecForSpec(self, spec: str) -> typing.Optional[str]:
+        info = self.resolve(spec)
+        return info.nameSpec if info else None
@@ -0,0 +1,100 @@
+"""\
+Run the tests for one font on a pool of forked worker processes
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import io
+import os
+import time
+import contextlib
+import multiprocessing
+
+from RasterSamplingTools import RasterSamplingTest
+from RasterSamplingTools.Scheduling import chunkSize
+from RasterSamplingTools.Governor import (
+    Event,
+    RecordingOutputDatabase,
+    TestFailure,
+    failureError,
+)
+
+# The test (and through it, the parsed font) that the pool's workers run.
+# It's set before the pool is created so each worker inherits it when it
+# forks, instead of reading and parsing the font again.
+_rasterTest: typing.Optional[RasterSamplingTest.RasterSamplingTest] = None
+_testArgs: typing.Optional[RasterSamplingTest.RasterSamplingTestArgs] = None
+
+PoolJob = tuple[dict[str, typing.Any], bool]
+# The test's output, its results, its failure if it failed,
+# how long it took, and the ID of the worker that ran it.
+PoolResult = tuple[str, list[Event], typing.Optional[TestFailure], float, int]
+
+
+def available() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _runTest(job: PoolJob) -> PoolResult:
+    props, first = job
+    rasterTest = _rasterTest
+    testArgs = _testArgs
+    assert rasterTest and testArgs
+
+    outdb = RecordingOutputDatabase()
+    testArgs.outdb = outdb
+    testArgs.colon = first
+    testArgs.showFullName = first
+
+    # Capture the output so the parent can print it in test order.
+    output = io.StringIO()
+    failure = None
+    start = time.monotonic()
+    with contextlib.redirect_stdout(output):
+        try:
+            testArgs.setProps(props)
+            rasterTest.run()
+        except Exception as error:
+            failure = TestFailure(
+                failureError,
+                f"{type(error).__name__}: {error}",
+                time.monotonic() - start,
+            )
+
+    elapsed = time.monotonic() - start
+    return output.getvalue(), outdb.events, failure, elapsed, os.getpid()
+
+
+def runTests(
+    rasterTest: RasterSamplingTest.RasterSamplingTest,
+    testArgs: RasterSamplingTest.RasterSamplingTestArgs,
+    testProps: list[dict[str, typing.Any]],
+    workerCount: int,
+) -> typing.Iterator[PoolResult]:
+    # Yields the results in the same order as testProps, whatever
+    # order the workers finish them in.
+    global _rasterTest, _testArgs
+
+    # Load everything the tests share before forking, so the workers
+    # inherit it copy-on-write instead of each building its own.
+    rasterTest.font.glyphSet
+    rasterTest.glyphIndex
+
+    _rasterTest = rasterTest
+    _testArgs = testArgs
+    jobs = [
+        (props, index == 0 and testArgs.colon) for index, props in enumerate(testProps)
+    ]
+
+    context = multiprocessing.get_context("fork")
+    workerCount = min(workerCount, len(jobs)) or 1
+    try:
+        with context.Pool(workerCount) as pool:
+            yield from pool.imap(_runTest, jobs, chunkSize(len(jobs), workerCount))
+    finally:
+        _rasterTest = None
+        _testArgs = None
@@ -0,0 +1,399 @@
+"""\
+Resource governor for running tests in a worker process
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import sys
+import time
+import multiprocessing
+from multiprocessing.connection import Connection
+
+from TestArguments.Font import Font
+from RasterSamplingTools import RasterSamplingTest
+from RasterSamplingTools.OutputDatabase import OutputDatabase
+from RasterSamplingTools.SampleExport import GlyphSamples
+from RasterSamplingTools.OutlineArena import OutlineArena, ArenaDescriptor
+from RasterSamplingTools.VariableFonts import parseInstances
+from RasterSamplingTools.ProcessMemory import processRSS
+
+failureError = "error"
+failureTimeout = "timeout"
+failureMemory = "memory"
+failureCrash = "crash"
+
+# How often to check on a test that's still running, in seconds
+pollInterval = 0.1
+
+# Recycle the worker once it's using this fraction of the memory limit,
+# rather than waiting for a test to cross the limit and get killed.
+recycleFraction = 0.8
+
+
+class TestFailure(object):
+    __slots__ = "reason", "message", "elapsed", "rss"
+
+    def __init__(
+        self,
+        reason: str,
+        message: str,
+        elapsed: float = 0.0,
+        rss: typing.Optional[int] = None,
+    ):
+        self.reason = reason
+        self.message = message
+        self.elapsed = elapsed
+        self.rss = rss
+
+    def asDict(self) -> dict[str, typing.Any]:
+        failure: dict[str, typing.Any] = {
+            "reason": self.reason,
+            "message": self.message,
+            "elapsed": round(self.elapsed, 2),
+        }
+        if self.rss is not None:
+            failure["rss_mb"] = round(self.rss / (1024 * 1024), 1)
+        return failure
+
+
+Event = tuple[typing.Any, ...]
+
+
+class RecordingOutputDatabase(object):
+    # Stands in for the real output database in the worker. It records
+    # each change as an event so the parent can replay it into the real one.
+    # It isn't an OutputDatabase, which reads and writes files: it only has
+    # the methods RasterSamplingTest calls on one.
+    __slots__ = "_index", "events"
+
+    def __init__(self):
+        self._index: dict[str, OutputDatabase.FontEntry] = {}
+        self.events: list[Event] = []
+
+    def flush(self, force: bool = False):
+        pass
+
+    def close(self):
+        pass
+
+    def getEntry(self, font: Font) -> OutputDatabase.FontEntry:
+        return self.getEntryForNames(font.postscriptName, font.fullName)
+
+    def getEntryForNames(self, psName: str, fullName: str) -> OutputDatabase.FontEntry:
+        entry = self._index.get(psName)
+        if entry is None:
+            entry = {"ps_name": psName, "full_name": fullName, "test_results": {}}
+            self._index[psName] = entry
+        return entry
+
+    def setFontValue(
+        self, entry: OutputDatabase.FontEntry, key: str, value: typing.Any
+    ):
+        self.events.append(
+            ("font_value", entry["ps_name"], entry["full_name"], key, value)
+        )
+
+    def setTestResults(
+        self,
+        entry: OutputDatabase.FontEntry,
+        glyphNameSpec: str,
+        results: OutputDatabase.TestResults,
+    ):
+        self.events.append(
+            (
+                "test_results",
+                entry["ps_name"],
+                entry["full_name"],
+                glyphNameSpec,
+                results,
+            )
+        )
+
+    def setSamples(
+        self,
+        entry: OutputDatabase.FontEntry,
+        glyphNameSpec: str,
+        samples: GlyphSamples,
+    ):
+        self.events.append(
+            ("samples", entry["ps_name"], entry["full_name"], glyphNameSpec, samples)
+        )
+
+
+def replayEvents(events: list[Event], outdb: OutputDatabase):
+    for kind, psName, fullName, key, value in events:
+        entry = outdb.getEntryForNames(psName, fullName)
+        if kind == "font_value":
+            outdb.setFontValue(entry, key, value)
+        elif kind == "test_results":
+            outdb.setTestResults(entry, key, value)
+        elif kind == "samples":
+            outdb.setSamples(entry, key, value)
+
+    outdb.flush()
+
+
+class TestJob(object):
+    __slots__ = (
+        "fontFile",
+        "fontNumber",
+        "outdir",
+        "props",
+        "first",
+        "instanceSpec",
+        "instanceIndex",
+        "outlineArena",
+    )
+
+    def __init__(
+        self,
+        fontFile: str,
+        fontNumber: int,
+        outdir: str,
+        props: dict[str, typing.Any],
+        first: bool,
+        instanceSpec: typing.Optional[str] = None,
+        instanceIndex: typing.Optional[int] = None,
+        outlineArena: typing.Optional[ArenaDescriptor] = None,
+    ):
+        self.fontFile = fontFile
+        self.fontNumber = fontNumber
+        self.outdir = outdir
+        self.props = props
+
+        # The first test of a font also reports the colon angle and full name
+        self.first = first
+
+        # The variable font instances to sweep, and the one to test
+        self.instanceSpec = instanceSpec
+        self.instanceIndex = instanceIndex
+
+        # Where to find the font's outlines in shared memory, if they're there
+        self.outlineArena = outlineArena
+
+
+class _Worker(object):
+    __slots__ = (
+        "_testArgs",
+        "_rasterTest",
+        "_fontKey",
+        "_instanceSpec",
+        "_outlineArena",
+    )
+
+    def __init__(self, testSettings: dict[str, typing.Any]):
+        testArgs = RasterSamplingTest.RasterSamplingTestArgs()
+        testArgs.fontName = None
+        testArgs.debug = False
+        testArgs.silent = True
+        testArgs.autoRangeOff = False
+        for name, value in testSettings.items():
+            setattr(testArgs, name, value)
+        self._testArgs = testArgs
+        self._rasterTest: typing.Optional[RasterSamplingTest.RasterSamplingTest] = None
+        self._fontKey: typing.Optional[tuple[str, int]] = None
+        self._instanceSpec: typing.Optional[str] = None
+        self._outlineArena: typing.Optional[OutlineArena] = None
+
+    def attachOutlineArena(
+        self, descriptor: typing.Optional[ArenaDescriptor]
+    ) -> typing.Optional[OutlineArena]:
+        # Stay attached to the arena for as long as the jobs use it
+        arena = self._outlineArena
+        if arena and (descriptor is None or descriptor[0] != arena.name):
+            arena.close()
+            arena = None
+
+        if arena is None and descriptor:
+            arena = OutlineArena.attach(descriptor)
+
+        self._outlineArena = arena
+        return arena
+
+    def run(self, job: TestJob, outdb: RecordingOutputDatabase):
+        testArgs = self._testArgs
+        testArgs.outdir = job.outdir
+        testArgs.outdb = outdb
+        testArgs.colon = job.first
+        testArgs.showFullName = job.first
+
+        # Keep the font open across the tests for it
+        fontKey = (job.fontFile, job.fontNumber)
+        if self._rasterTest is None or fontKey != self._fontKey:
+            testArgs.fontFile = job.fontFile
+            testArgs.fontNumber = job.fontNumber
+            self._rasterTest = RasterSamplingTest.RasterSamplingTest(testArgs)
+            self._fontKey = fontKey
+            self._instanceSpec = None
+
+        rasterTest = self._rasterTest
+        if job.instanceIndex is not None and job.instanceSpec != self._instanceSpec:
+            ttFont = rasterTest.font.ttFont
+            rasterTest.setInstances(parseInstances(job.instanceSpec, ttFont))
+            self._instanceSpec = job.instanceSpec
+        rasterTest.selectInstance(job.instanceIndex)
+        rasterTest.outlineArena = self.attachOutlineArena(job.outlineArena)
+
+        testArgs.setProps(job.props)
+        rasterTest.run()
+
+
+def workerMain(connection: Connection, testSettings: dict[str, typing.Any]):
+    worker = _Worker(testSettings)
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+
+        if job is None:
+            break
+
+        outdb = RecordingOutputDatabase()
+        failure = None
+        start = time.monotonic()
+        try:
+            worker.run(job, outdb)
+        except Exception as error:
+            failure = TestFailure(
+                failureError,
+                f"{type(error).__name__}: {error}",
+                time.monotonic() - start,
+            )
+
+        # The parent's output is interleaved with ours, so don't leave any behind.
+        sys.stdout.flush()
+        connection.send((outdb.events, failure, processRSS(os.getpid())))
+
+    connection.close()
+
+
+class Governor(object):
+    __slots__ = (
+        "testTimeout",
+        "memoryLimit",
+        "recycleAfter",
+        "testSettings",
+        "_context",
+        "_process",
+        "_connection",
+        "_testCount",
+    )
+
+    def __init__(
+        self,
+        testTimeout: typing.Optional[float] = None,
+        memoryLimit: typing.Optional[int] = None,
+        recycleAfter: typing.Optional[int] = None,
+        testSettings: typing.Optional[dict[str, typing.Any]] = None,
+    ):
+        self.testTimeout = testTimeout
+        self.memoryLimit = memoryLimit
+        self.recycleAfter = recycleAfter
+
+        # Test arguments that are the same for every test, like the cache
+        self.testSettings = testSettings or {}
+        self._context = multiprocessing.get_context()
+        self._process: typing.Optional[multiprocessing.process.BaseProcess] = None
+        self._connection: typing.Optional[Connection] = None
+        self._testCount = 0
+
+    def _startWorker(self):
+        parentConnection, childConnection = self._context.Pipe()
+        self._process = self._context.Process(
+            target=workerMain, args=(childConnection, self.testSettings), daemon=True
+        )
+        self._process.start()
+        childConnection.close()
+        self._connection = parentConnection
+        self._testCount = 0
+
+    def _killWorker(self):
+        if self._process:
+            self._process.kill()
+            self._process.join()
+            self._process = None
+
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def stop(self):
+        # Ask the worker to exit, and kill it if it doesn't.
+        if self._connection:
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass
+
+        if self._process:
+            self._process.join(1.0)
+
+        self._killWorker()
+
+    def _shouldRecycle(self, rss: typing.Optional[int]) -> bool:
+        if self.recycleAfter and self._testCount >= self.recycleAfter:
+            return True
+
+        return bool(
+            self.memoryLimit and rss and rss >= self.memoryLimit * recycleFraction
+        )
+
+    def _fail(self, reason: str, message: str, start: float, rss=None):
+        self._killWorker()
+        return [], TestFailure(reason, message, time.monotonic() - start, rss)
+
+    def runTest(self, job: TestJob) -> tuple[list[Event], typing.Optional[TestFailure]]:
+        if self._process is None:
+            self._startWorker()
+
+        process = self._process
+        connection = self._connection
+        assert process and connection
+
+        sys.stdout.flush()
+        start = time.monotonic()
+        try:
+            connection.send(job)
+        except OSError as error:
+            return self._fail(failureCrash, f"Can't reach worker: {error}", start)
+
+        while not connection.poll(pollInterval):
+            elapsed = time.monotonic() - start
+
+            if not process.is_alive():
+                return self._fail(
+                    failureCrash, f"Worker exited with code {process.exitcode}", start
+                )
+
+            if self.testTimeout and elapsed > self.testTimeout:
+                return self._fail(
+                    failureTimeout, f"Took more than {self.testTimeout} seconds", start
+                )
+
+            if self.memoryLimit:
+                rss = processRSS(process.pid) if process.pid else None
+                if rss and rss > self.memoryLimit:
+                    return self._fail(
+                        failureMemory,
+                        f"Used more than {self.memoryLimit // (1024 * 1024)} MB",
+                        start,
+                        rss,
+                    )
+
+        try:
+            events, failure, rss = connection.recv()
+        except (EOFError, OSError):
+            return self._fail(failureCrash, "Worker exited before reporting", start)
+
+        self._testCount += 1
+        if self._shouldRecycle(rss):
+            self.stop()
+
+        return events, failure
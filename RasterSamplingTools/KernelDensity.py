@@ -0,0 +1,100 @@
+"""\
+Kernel Density Estimates
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import math
+import numpy as np
+
+kdeMethodBinned = 0
+kdeMethodStatsmodels = 1
+
+# The bandwidth RasterSamplingTest has always passed to KDEUnivariate.fit()
+defaultBandwidth = 0.9
+defaultGridSize = 512
+defaultCut = 3.0
+
+
+def gridForData(
+    data: np.ndarray, bandwidth: float, gridSize: int, cut: float
+) -> np.ndarray:
+    low = data.min() - cut * bandwidth
+    high = data.max() + cut * bandwidth
+    return np.linspace(low, high, gridSize)
+
+
+def linearBinning(data: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    # Split each observation between the two grid points on either side
+    # of it, in proportion to how close it is to each of them.
+    gridSize = len(grid)
+    delta = grid[1] - grid[0]
+    position = (data - grid[0]) / delta
+    index = np.clip(np.floor(position).astype(np.intp), 0, gridSize - 2)
+    fraction = position - index
+
+    counts = np.bincount(index, weights=1.0 - fraction, minlength=gridSize)
+    counts += np.bincount(index + 1, weights=fraction, minlength=gridSize)
+    return counts
+
+
+def binnedKDE(
+    data: typing.Sequence[float],
+    bandwidth: float = defaultBandwidth,
+    gridSize: int = defaultGridSize,
+    cut: float = defaultCut,
+) -> tuple[np.ndarray, np.ndarray]:
+    values = np.asarray(data, dtype=float)
+    grid = gridForData(values, bandwidth, gridSize, cut)
+    counts = linearBinning(values, grid)
+
+    # Gaussian kernel sampled at every grid offset, laid out circularly
+    # in a buffer twice the size of the grid so the FFT computes a
+    # linear (not a wrapped) convolution.
+    delta = grid[1] - grid[0]
+    offsets = np.arange(gridSize) * delta / bandwidth
+    kernelHalf = np.exp(-0.5 * offsets * offsets) / (math.sqrt(2 * math.pi) * bandwidth)
+
+    fftSize = 2 * gridSize
+    kernel = np.zeros(fftSize)
+    kernel[:gridSize] = kernelHalf
+    kernel[-(gridSize - 1) :] = kernelHalf[:0:-1]
+
+    padded = np.zeros(fftSize)
+    padded[:gridSize] = counts
+
+    density = np.fft.irfft(np.fft.rfft(padded) * np.fft.rfft(kernel), fftSize)
+    density = np.maximum(density[:gridSize], 0.0) / len(values)
+
+    return grid, density
+
+
+def statsmodelsKDE(
+    data: typing.Sequence[float],
+    points: typing.Sequence[float],
+    bandwidth: float = defaultBandwidth,
+) -> np.ndarray:
+    # statsmodels is slow to import, and only needed for this method,
+    # so don't import it unless we have to.
+    import statsmodels.api
+
+    dens = statsmodels.api.nonparametric.KDEUnivariate(data)
+    dens.fit(bw=bandwidth)
+    return dens.evaluate(points)
+
+
+def densityAt(
+    data: typing.Sequence[float],
+    points: typing.Sequence[float],
+    method: int = kdeMethodBinned,
+    bandwidth: float = defaultBandwidth,
+) -> np.ndarray:
+    if method == kdeMethodStatsmodels:
+        return statsmodelsKDE(data, points, bandwidth)
+
+    grid, density = binnedKDE(data, bandwidth)
+    return np.interp(points, grid, density)
@@ -0,0 +1,264 @@
+"""\
+Memory use of each font, and each stage of testing it
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import gc
+import os
+import json
+import time
+import tracemalloc
+from RasterSamplingTools.ProcessMemory import processRSS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# How many allocation sites to report for each font and for the whole run
+defaultTopCount = 10
+
+# Allocations made by these aren't the tool's, so they aren't reported
+ignoredFiles = [
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+]
+
+Stats = dict[str, typing.Any]
+
+
+def megabytes(byteCount: typing.Optional[float]) -> typing.Optional[float]:
+    return round(byteCount / (1024 * 1024), 1) if byteCount is not None else None
+
+
+def peakRSS() -> typing.Optional[int]:
+    # The largest resident set size the process has had so far, or since
+    # the last resetPeakRSS(). Only this process: the tests that run in
+    # GlyphPool or Governor worker processes aren't included.
+    if resource is None:
+        return None
+
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # It's in kilobytes on Linux, and in bytes on macOS
+    return maxRSS if os.uname().sysname == "Darwin" else maxRSS * 1024
+
+
+def resetPeakRSS() -> bool:
+    # Linux lets a process reset the peak that ru_maxrss reports, which
+    # otherwise only ever grows, so it can be measured for each stage.
+    try:
+        with open("/proc/self/clear_refs", "w") as clearRefs:
+            clearRefs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def takeSnapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, file) for file in ignoredFiles]
+    )
+
+
+def siteName(stat: tracemalloc.Statistic) -> str:
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class MemoryStage(object):
+    __slots__ = "_profile", "_name", "_start", "_rss", "_traced"
+
+    def __init__(self, profile: "MemoryProfile", name: str):
+        self._profile = profile
+        self._name = name
+        self._start = 0.0
+        self._rss: typing.Optional[int] = None
+        self._traced = 0
+
+    def __enter__(self):
+        if self._profile.profiling:
+            self._start = time.monotonic()
+            self._rss = processRSS(os.getpid())
+            self._traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            self._profile.resetPeak()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if self._profile.profiling:
+            rss = processRSS(os.getpid())
+            traced, tracedPeak = tracemalloc.get_traced_memory()
+            rssDelta = rss - self._rss if rss is not None and self._rss else None
+            peak = self._profile.measurePeak()
+            self._profile.addStage(
+                {
+                    "stage": self._name,
+                    "elapsed": round(time.monotonic() - self._start, 2),
+                    "rss_mb": megabytes(rss),
+                    "rss_delta_mb": megabytes(rssDelta),
+                    self._profile.peakKey: megabytes(peak),
+                    "traced_delta_mb": megabytes(traced - self._traced),
+                    "traced_peak_mb": megabytes(tracedPeak),
+                }
+            )
+        return False
+
+
+class MemoryProfile(object):
+    # Profiles one of every sampleEvery fonts; none if it's 0. The fonts
+    # in between run at full speed, because tracemalloc is only running
+    # while a sampled font is being tested.
+    __slots__ = (
+        "sampleEvery",
+        "topCount",
+        "_fontCount",
+        "_font",
+        "_fontRSS",
+        "_fontPeak",
+        "_processPeak",
+        "_peakResets",
+        "_fonts",
+        "_sites",
+    )
+
+    def __init__(self, sampleEvery: int = 0, topCount: int = defaultTopCount):
+        self.sampleEvery = sampleEvery
+        self.topCount = topCount
+        self._fontCount = 0
+        self._font: typing.Optional[Stats] = None
+        self._fontRSS: typing.Optional[int] = None
+        self._fontPeak = 0
+        self._processPeak = 0
+        self._peakResets = False
+        self._fonts: list[Stats] = []
+
+        # allocation site -> [size, count] summed over the profiled fonts
+        self._sites: dict[str, list[int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.sampleEvery > 0
+
+    @property
+    def profiling(self) -> bool:
+        return self._font is not None
+
+    @property
+    def peakKey(self) -> str:
+        # What the peak RSS measures: the stage or font it's reported for,
+        # or, where it can't be reset, the whole process so far.
+        return "peak_rss_mb" if self._peakResets else "process_peak_rss_mb"
+
+    def measurePeak(self) -> typing.Optional[int]:
+        peak = peakRSS()
+        if peak is not None:
+            self._processPeak = max(self._processPeak, peak)
+            if self._font is not None:
+                self._fontPeak = max(self._fontPeak, peak)
+        return peak
+
+    def resetPeak(self):
+        # Keep the peak so far, for the font and the process, before
+        # it's lost.
+        self.measurePeak()
+        self._peakResets = resetPeakRSS()
+
+    def startFont(self, fontFile: str, fontNumber: int):
+        if not self.enabled:
+            return
+
+        self._fontCount += 1
+        if (self._fontCount - 1) % self.sampleEvery != 0:
+            return
+
+        self.resetPeak()
+        self._font = {"font_file": fontFile, "font_number": fontNumber, "stages": []}
+        self._fontPeak = 0
+        tracemalloc.start()
+        self._fontRSS = processRSS(os.getpid())
+
+    def setFontName(self, psName: str):
+        if self._font is not None:
+            self._font["ps_name"] = psName
+
+    def stage(self, name: str) -> MemoryStage:
+        return MemoryStage(self, name)
+
+    def addStage(self, stats: Stats):
+        assert self._font is not None
+        self._font["stages"].append(stats)
+
+    def finishFont(self):
+        font = self._font
+        if font is None:
+            return
+
+        # Don't count garbage that just hasn't been collected yet,
+        # like figures that are only referenced by their own cycles.
+        gc.collect()
+        snapshot = takeSnapshot()
+        tracemalloc.stop()
+
+        rss = processRSS(os.getpid())
+        startRSS = self._fontRSS
+        font["rss_delta_mb"] = megabytes(rss - startRSS if rss and startRSS else None)
+        self.measurePeak()
+        font[self.peakKey] = megabytes(self._fontPeak or None)
+
+        # tracemalloc was started for this font, so these are the
+        # font's allocations that are still alive, largest first.
+        topAllocations: list[Stats] = []
+        for stat in snapshot.statistics("lineno"):
+            site = siteName(stat)
+            totals = self._sites.setdefault(site, [0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+
+            if len(topAllocations) < self.topCount:
+                topAllocations.append(
+                    {
+                        "site": site,
+                        "size_mb": megabytes(stat.size),
+                        "count": stat.count,
+                    }
+                )
+
+        font["top_allocations"] = topAllocations
+        self._fonts.append(font)
+        self._font = None
+
+    def abandonFont(self):
+        # There's no such font, e.g. past the end of a collection
+        if not self.enabled:
+            return
+
+        self._fontCount -= 1
+        if self._font is not None:
+            tracemalloc.stop()
+            self._font = None
+
+    def summary(self) -> Stats:
+        self.measurePeak()
+        sites = sorted(self._sites.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            "font_count": self._fontCount,
+            "profiled_font_count": len(self._fonts),
+            "sample_every": self.sampleEvery,
+            "process_peak_rss_mb": megabytes(self._processPeak or None),
+            "top_allocations": [
+                {"site": site, "size_mb": megabytes(size), "count": count}
+                for site, (size, count) in sites[: self.topCount]
+            ],
+            "fonts": self._fonts,
+        }
+
+    def write(self, file: str):
+        with open(file, "w") as profileFile:
+            json.dump(self.summary(), profileFile, indent=4)
@@ -0,0 +1,207 @@
+"""\
+Y-monotone curve pieces
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import math
+import numpy as np
+from PathLib.PathTypes import Point
+from PathLib.Bezier import Bezier, BContour
+
+# Parameters this close to 0 or 1 would produce degenerate pieces.
+_tEpsilon = 1.0e-9
+
+
+def lerp(p0: Point, p1: Point, t: float) -> Point:
+    return p0[0] + (p1[0] - p0[0]) * t, p0[1] + (p1[1] - p0[1]) * t
+
+
+def splitAt(points: list[Point], t: float) -> tuple[list[Point], list[Point]]:
+    # de Casteljau subdivision, which is exact for any order.
+    left = [points[0]]
+    right = [points[-1]]
+    while len(points) > 1:
+        points = [lerp(p0, p1, t) for p0, p1 in zip(points, points[1:])]
+        left.append(points[0])
+        right.append(points[-1])
+    right.reverse()
+    return left, right
+
+
+def yExtrema(ys: list[float]) -> list[float]:
+    # The parameters in (0, 1) where dy/dt is zero.
+    order = len(ys) - 1
+    roots: list[float] = []
+
+    if order == 2:
+        y0, y1, y2 = ys
+        denominator = y0 - 2 * y1 + y2
+        if denominator != 0:
+            roots.append((y0 - y1) / denominator)
+    elif order == 3:
+        y0, y1, y2, y3 = ys
+        # dy/dt / 3 = a t^2 + b t + c
+        a = -y0 + 3 * y1 - 3 * y2 + y3
+        b = 2 * (y0 - 2 * y1 + y2)
+        c = y1 - y0
+        if a == 0:
+            if b != 0:
+                roots.append(-c / b)
+        else:
+            discriminant = b * b - 4 * a * c
+            if discriminant >= 0:
+                sqrtDiscriminant = math.sqrt(discriminant)
+                # Numerically stable form of the quadratic formula
+                q = -0.5 * (b + math.copysign(sqrtDiscriminant, b))
+                roots.append(q / a)
+                if q != 0:
+                    roots.append(c / q)
+
+    return sorted(t for t in roots if _tEpsilon < t < 1 - _tEpsilon)
+
+
+def splitCurve(curve: Bezier, splits: list[Bezier]):
+    # Split curve at its vertical extrema, so every piece
+    # appended to splits is monotone in y.
+    points = [curve.pointXY(p) for p in curve.controlPoints]
+    ts = yExtrema([y for _, y in points])
+
+    if not ts:
+        splits.append(curve)
+        return
+
+    previous = 0.0
+    for t in ts:
+        # Rescale t to the part of the curve that's left
+        head, points = splitAt(points, (t - previous) / (1 - previous))
+        splits.append(Bezier(head))
+        previous = t
+    splits.append(Bezier(points))
+
+
+def powerCoefficients(values: list[float]) -> tuple[float, float, float, float]:
+    # Bernstein to power basis: v(t) = c0 + c1 t + c2 t^2 + c3 t^3
+    order = len(values) - 1
+    if order == 1:
+        v0, v1 = values
+        return v0, v1 - v0, 0.0, 0.0
+    if order == 2:
+        v0, v1, v2 = values
+        return v0, 2 * (v1 - v0), v0 - 2 * v1 + v2, 0.0
+
+    v0, v1, v2, v3 = values
+    return v0, 3 * (v1 - v0), 3 * (v0 - 2 * v1 + v2), -v0 + 3 * v1 - 3 * v2 + v3
+
+
+def quadraticRoots(a: float, b: float, c: float) -> list[float]:
+    if a == 0:
+        return [-c / b] if b != 0 else []
+
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        # A monotone piece always has a root, so this is rounding error.
+        discriminant = 0.0
+
+    q = -0.5 * (b + math.copysign(math.sqrt(discriminant), b))
+    roots = [q / a]
+    if q != 0:
+        roots.append(c / q)
+    return roots
+
+
+def cubicRoots(a: float, b: float, c: float, d: float) -> list[float]:
+    # Cardano's method (trigonometric form when there are three real roots)
+    # for a t^3 + b t^2 + c t + d = 0.
+    scale = abs(b) + abs(c) + abs(d)
+    if abs(a) <= 1.0e-12 * scale:
+        return quadraticRoots(b, c, d)
+
+    b, c, d = b / a, c / a, d / a
+    shift = b / 3
+    p = c - b * shift
+    q = 2 * shift**3 - shift * c + d
+    discriminant = (q / 2) ** 2 + (p / 3) ** 3
+
+    if discriminant > 0:
+        sqrtDiscriminant = math.sqrt(discriminant)
+        u = -q / 2 + sqrtDiscriminant
+        v = -q / 2 - sqrtDiscriminant
+        s = math.copysign(abs(u) ** (1 / 3), u) + math.copysign(abs(v) ** (1 / 3), v)
+        return [s - shift]
+
+    if p == 0:
+        return [-shift]
+
+    r = 2 * math.sqrt(-p / 3)
+    cosine = max(-1.0, min(1.0, 3 * q / (p * r)))
+    theta = math.acos(cosine) / 3
+    return [r * math.cos(theta - 2 * math.pi * k / 3) - shift for k in range(3)]
+
+
+class MonotonePiece(object):
+    __slots__ = "yMin", "yMax", "direction", "xCoefficients", "yCoefficients"
+
+    def __init__(self, curve: Bezier):
+        points = [curve.pointXY(p) for p in curve.controlPoints]
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+
+        self.yMin = min(ys[0], ys[-1])
+        self.yMax = max(ys[0], ys[-1])
+        if ys[0] < ys[-1]:
+            self.direction = Bezier.dir_up
+        elif ys[0] > ys[-1]:
+            self.direction = Bezier.dir_down
+        else:
+            self.direction = Bezier.dir_flat
+
+        self.xCoefficients = powerCoefficients(xs)
+        self.yCoefficients = powerCoefficients(ys)
+
+    def tAtY(self, y: float) -> float:
+        c0, c1, c2, c3 = self.yCoefficients
+        roots = cubicRoots(c3, c2, c1, c0 - y)
+
+        # There's exactly one root in [0, 1]; pick the one
+        # closest to it in case rounding pushed it outside.
+        def distance(t: float) -> float:
+            return max(0.0, -t, t - 1)
+
+        t = min(roots, key=distance) if roots else 0.0
+        return min(1.0, max(0.0, t))
+
+    def xAtY(self, y: float) -> float:
+        t = self.tAtY(y)
+        c0, c1, c2, c3 = self.xCoefficients
+        return c0 + t * (c1 + t * (c2 + t * c3))
+
+
+class MonotoneEdges(object):
+    __slots__ = "pieces", "_yMins", "_yMaxs"
+
+    def __init__(self, contours: typing.Iterable[BContour]):
+        self.pieces: list[MonotonePiece] = []
+        for contour in contours:
+            for curve in contour:
+                splits: list[Bezier] = []
+                splitCurve(curve, splits)
+                for split in splits:
+                    piece = MonotonePiece(split)
+
+                    # A horizontal piece never crosses a raster at a single point.
+                    if piece.direction != Bezier.dir_flat:
+                        self.pieces.append(piece)
+
+        self._yMins = np.array([piece.yMin for piece in self.pieces])
+        self._yMaxs = np.array([piece.yMax for piece in self.pieces])
+
+    def crossingsAtY(self, y: float) -> list[tuple[float, int]]:
+        # The pieces are half open, [yMin, yMax), so a raster through
+        # the point where two pieces meet only counts it once.
+        active = np.nonzero((self._yMins <= y) & (y < self._yMaxs))[0]
+        return [(self.pieces[i].xAtY(y), self.pieces[i].direction) for i in active]
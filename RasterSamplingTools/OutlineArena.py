@@ -0,0 +1,158 @@
+"""\
+Glyph outlines in shared memory, for worker processes
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import numpy as np
+from multiprocessing import shared_memory
+from PathLib.PathTypes import Contour
+
+# Each array in the block starts on a multiple of this
+arrayAlignment = 8
+
+# (offset, shape, dtype) of each array in the shared memory block
+ArrayLayout = dict[str, tuple[int, tuple[int, ...], str]]
+
+# What a worker needs to attach to an arena. It's small, so it's cheap to
+# send with every job: the glyph names are in the shared memory too.
+ArenaDescriptor = tuple[str, ArrayLayout]
+
+
+def alignedSize(size: int) -> int:
+    return (size + arrayAlignment - 1) // arrayAlignment * arrayAlignment
+
+
+class OutlineArena(object):
+    # The outlines of a font's glyphs, packed into flat arrays in one block
+    # of shared memory: the control points of every segment, and where each
+    # segment, contour and glyph starts. The process that creates the arena
+    # extracts the outlines once; the workers attach to it without copying
+    # anything, and build each glyph's outline from the arrays as they test it.
+    __slots__ = "descriptor", "_memory", "_owner", "_arrays", "_glyphIndices"
+
+    def __init__(
+        self,
+        memory: shared_memory.SharedMemory,
+        layout: ArrayLayout,
+        owner: bool,
+    ):
+        self.descriptor: ArenaDescriptor = (memory.name, layout)
+        self._memory: typing.Optional[shared_memory.SharedMemory] = memory
+        self._owner = owner
+        self._arrays: dict[str, np.ndarray] = {
+            name: np.ndarray(
+                shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset
+            )
+            for name, (offset, shape, dtype) in layout.items()
+        }
+
+        names = bytes(self._arrays["names"]).decode("utf-8")
+        self._glyphIndices = {
+            name: index for index, name in enumerate(names.split("\0")) if name
+        }
+
+    @classmethod
+    def create(cls, outlines: dict[str, list[Contour]]) -> "OutlineArena":
+        points: list[tuple[float, float]] = []
+        segmentStarts = [0]
+        contourStarts = [0]
+        glyphStarts = [0]
+        integral: list[bool] = []
+
+        for contours in outlines.values():
+            glyphIntegral = True
+            for contour in contours:
+                for segment in contour:
+                    for x, y in segment:
+                        glyphIntegral = (
+                            glyphIntegral and isinstance(x, int) and isinstance(y, int)
+                        )
+                        points.append((x, y))
+                    segmentStarts.append(len(points))
+                contourStarts.append(len(segmentStarts) - 1)
+            glyphStarts.append(len(contourStarts) - 1)
+            integral.append(glyphIntegral)
+
+        # Glyph names can't contain NUL, so it separates them
+        names = "\0".join(outlines.keys()).encode("utf-8")
+        arrays = {
+            "points": np.array(points, dtype=np.float64).reshape(-1, 2),
+            "segment_starts": np.array(segmentStarts, dtype=np.int64),
+            "contour_starts": np.array(contourStarts, dtype=np.int64),
+            "glyph_starts": np.array(glyphStarts, dtype=np.int64),
+            "integral": np.array(integral, dtype=np.bool_),
+            "names": np.frombuffer(names, dtype=np.uint8),
+        }
+
+        layout: ArrayLayout = {}
+        size = 0
+        for name, array in arrays.items():
+            layout[name] = (size, array.shape, array.dtype.str)
+            size += alignedSize(array.nbytes)
+
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        arena = cls(memory, layout, True)
+        for name, array in arrays.items():
+            arena._arrays[name][...] = array
+
+        return arena
+
+    @classmethod
+    def attach(cls, descriptor: ArenaDescriptor) -> "OutlineArena":
+        name, layout = descriptor
+        return cls(shared_memory.SharedMemory(name=name), layout, False)
+
+    @property
+    def name(self) -> str:
+        return self.descriptor[0]
+
+    def __contains__(self, glyphName: str) -> bool:
+        return glyphName in self._glyphIndices
+
+    def __len__(self) -> int:
+        return len(self._glyphIndices)
+
+    def contours(self, glyphName: str) -> list[Contour]:
+        # The same contours that the font's pen drew for the glyph
+        arrays = self._arrays
+        index = self._glyphIndices[glyphName]
+        contourStarts = arrays["contour_starts"]
+        segmentStarts = arrays["segment_starts"]
+        glyphStart, glyphLimit = arrays["glyph_starts"][index : index + 2]
+
+        points = arrays["points"]
+        pointStart = segmentStarts[contourStarts[glyphStart]]
+        pointLimit = segmentStarts[contourStarts[glyphLimit]]
+        glyphPoints = points[pointStart:pointLimit]
+        if arrays["integral"][index]:
+            glyphPoints = glyphPoints.astype(np.int64)
+        pointList = [tuple(p) for p in glyphPoints.tolist()]
+
+        contours: list[Contour] = []
+        for contour in range(glyphStart, glyphLimit):
+            segments = []
+            for segment in range(contourStarts[contour], contourStarts[contour + 1]):
+                start = segmentStarts[segment] - pointStart
+                limit = segmentStarts[segment + 1] - pointStart
+                segments.append(pointList[start:limit])
+            contours.append(segments)
+
+        return contours
+
+    def close(self):
+        # The arrays are views of the shared memory, so they have
+        # to go before it can be closed. The owner also frees it.
+        memory = self._memory
+        if memory is None:
+            return
+
+        self._arrays = {}
+        self._memory = None
+        memory.close()
+        if self._owner:
+            memory.unlink()
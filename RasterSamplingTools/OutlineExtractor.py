@@ -0,0 +1,426 @@
+"""\
+Glyph outlines read straight from the glyf and CFF tables
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import numpy as np
+from fontTools.ttLib import TTFont
+from fontTools.misc.transform import Transform, Identity
+from fontTools.ttLib.tables._g_l_y_f import flagOnCurve, flagCubic
+from PathLib.PathTypes import Point, Contour
+
+# Outlines are scaled to this many units per em, like the pen's
+unitsPerEm = 1000
+
+# A glyph that isn't a composite, and the transform that places it in one
+Component = tuple[str, Transform]
+
+
+def buildContours(
+    points: np.ndarray, segmentSizes: list[int], contourSizes: list[int]
+) -> list[Contour]:
+    # The contours, in the same form SegmentPen makes them, from a flat
+    # array of the segments' points, the number of points in each segment
+    # and the number of segments in each contour.
+    pointList = [tuple(p) for p in points.tolist()]
+    contours: list[Contour] = []
+    segment = 0
+    start = 0
+    for contourSize in contourSizes:
+        segments = []
+        for size in segmentSizes[segment : segment + contourSize]:
+            segments.append(pointList[start : start + size])
+            start += size
+        segment += contourSize
+        contours.append(segments)
+
+    return contours
+
+
+class Unsupported(Exception):
+    # Raised while extracting an outline the extractor can't handle
+    pass
+
+
+class GlyfOutline(object):
+    # The points of a TrueType glyph that isn't a composite, and a plan for
+    # turning them into the segments the pen draws. Which points make up
+    # each segment depends only on which points are on the curve, so the
+    # plan is worked out once, and can be used for the points wherever the
+    # glyph is placed. Each point of each segment is the midpoint of two of
+    # the glyph's points: the same point twice, for a point on the curve,
+    # or two off-curve points, for the implied on-curve point between them.
+    __slots__ = (
+        "points",
+        "_these",
+        "_those",
+        "_segmentSizes",
+        "_contourSizes",
+        "_closingLines",
+    )
+
+    def __init__(self, points: np.ndarray, onCurve: np.ndarray, ends: np.ndarray):
+        self.points = points
+        self._these = self._those = np.empty(0, dtype=np.intp)
+        self._segmentSizes: list[int] = []
+        self._contourSizes: list[int] = []
+
+        # The segment number and the two end points of each line that
+        # closes a contour, which the pen leaves out if it has no length.
+        self._closingLines = np.empty((0, 3), dtype=np.intp)
+
+        if len(ends) > 0:
+            self._plan(onCurve, ends)
+
+    @classmethod
+    def fromGlyph(cls, glyph) -> "GlyfOutline":
+        if glyph.numberOfContours == 0:
+            return cls(
+                np.empty((0, 2)), np.empty(0, dtype=bool), np.empty(0, dtype=np.intp)
+            )
+
+        flags = np.frombuffer(bytes(glyph.flags), dtype=np.uint8)
+        if np.any(flags & flagCubic):
+            raise Unsupported()
+
+        return cls(
+            np.array(glyph.coordinates.array, dtype=float).reshape(-1, 2),
+            (flags & flagOnCurve) != 0,
+            np.array(glyph.endPtsOfContours, dtype=np.intp) + 1,
+        )
+
+    def _plan(self, onCurve: np.ndarray, ends: np.ndarray):
+        starts = np.append(0, ends[:-1])
+        lengths = ends - starts
+        pointCount = len(onCurve)
+
+        # Each contour starts at its first on-curve point. A contour with
+        # none starts at the point implied before its first off-curve point,
+        # so its walk starts at the last point, like the pen's does.
+        indices = np.arange(pointCount)
+        firstOnCurve = np.minimum.reduceat(
+            np.where(onCurve, indices, pointCount), starts
+        )
+        first = np.where(firstOnCurve < ends, firstOnCurve, ends - 1) - starts
+
+        contourIDs = np.repeat(np.arange(len(starts)), lengths)
+        contourStarts = starts[contourIDs]
+        contourLengths = lengths[contourIDs]
+        steps = indices - contourStarts + first[contourIDs]
+
+        def walk(step: int) -> np.ndarray:
+            return contourStarts + (steps + step) % contourLengths
+
+        current, following, afterFollowing = walk(0), walk(1), walk(2)
+
+        # Every off-curve point is the control point of a quadratic segment,
+        # and two on-curve points in a row are a line.
+        lines = onCurve[current] & onCurve[following]
+        curves = ~onCurve[following]
+        segments = lines | curves
+
+        # Where a curve starts, and where it ends
+        startsOnCurve = onCurve[current]
+        endsOnCurve = onCurve[afterFollowing]
+        these = np.stack(
+            [
+                current,
+                following,
+                np.where(endsOnCurve, afterFollowing, following),
+            ],
+            axis=1,
+        )
+        those = np.stack(
+            [
+                np.where(curves & ~startsOnCurve, following, current),
+                following,
+                afterFollowing,
+            ],
+            axis=1,
+        )
+        these[lines, 2] = those[lines, 2] = -1
+
+        segmentSizes = np.where(curves, 3, 2)[segments]
+        used = these[segments] >= 0
+        self._these = these[segments][used]
+        self._those = those[segments][used]
+        self._segmentSizes = segmentSizes.tolist()
+        self._contourSizes = np.bincount(
+            contourIDs[segments], minlength=len(starts)
+        ).tolist()
+
+        last = indices - contourStarts == contourLengths - 1
+        closing = (last & lines)[segments]
+        self._closingLines = np.stack(
+            [
+                np.flatnonzero(closing),
+                current[segments][closing],
+                following[segments][closing],
+            ],
+            axis=1,
+        )
+
+    def segments(self, points: np.ndarray) -> tuple[np.ndarray, list[int], list[int]]:
+        # The points of the segments the pen draws for the glyph, when its
+        # points are at points, with the size of each segment and contour.
+        segmentPoints = 0.5 * (points[self._these] + points[self._those])
+        segmentSizes = self._segmentSizes
+        contourSizes = self._contourSizes
+
+        closingLines = self._closingLines
+        empty = np.all(points[closingLines[:, 1]] == points[closingLines[:, 2]], axis=1)
+        if np.any(empty):
+            keep = np.ones(len(segmentSizes), dtype=bool)
+            keep[closingLines[empty, 0]] = False
+            sizes = np.array(segmentSizes)
+            segmentPoints = segmentPoints[np.repeat(keep, sizes)]
+            segmentSizes = sizes[keep].tolist()
+
+            contourIDs = np.repeat(np.arange(len(contourSizes)), contourSizes)
+            contourSizes = np.bincount(
+                contourIDs[keep], minlength=len(contourSizes)
+            ).tolist()
+
+        return segmentPoints, segmentSizes, contourSizes
+
+    def transformed(self, transform: Transform) -> np.ndarray:
+        # The same arithmetic as Transform.transformPoint(), on every point
+        if transform == Identity:
+            return self.points
+
+        xx, xy, yx, yy, dx, dy = transform
+        xs, ys = self.points[:, 0], self.points[:, 1]
+        return np.stack([xx * xs + yx * ys + dx, xy * xs + yy * ys + dy], axis=1)
+
+
+class SharedOutline(object):
+    # One of the glyphs a composite glyph is built from, and how it's
+    # placed: the 2x2 matrix of its transform, and the offset, scaled
+    # like the outline.
+    __slots__ = "glyphName", "matrix", "dx", "dy"
+
+    def __init__(self, glyphName: str, matrix: list[float], dx: float, dy: float):
+        self.glyphName = glyphName
+        self.matrix = matrix
+        self.dx = dx
+        self.dy = dy
+
+    @property
+    def translation(self) -> bool:
+        # Just moved, so it has the same shape as the glyph itself
+        return self.matrix == [1, 0, 0, 1]
+
+    @property
+    def result(self) -> dict[str, typing.Any]:
+        result: dict[str, typing.Any] = {
+            "glyph": self.glyphName,
+            "offset": [round(self.dx, 3), round(self.dy, 3)],
+        }
+        if not self.translation:
+            result["matrix"] = [round(value, 5) for value in self.matrix]
+        return result
+
+
+class SegmentRecorder(object):
+    # Just enough of a pen to record what a CFF charstring draws, without
+    # the calls through BasePen for every point: a CFF charstring only
+    # draws lines and cubic curves. Closes each contour the way SegmentPen does.
+    __slots__ = "points", "segmentSizes", "contourSizes", "_start", "_current"
+
+    def __init__(self):
+        self.points: list[Point] = []
+        self.segmentSizes: list[int] = []
+        self.contourSizes: list[int] = []
+        self._start: typing.Optional[Point] = None
+        self._current: typing.Optional[Point] = None
+
+    def _segment(self, *points: Point):
+        self.points.append(self._current)
+        self.points.extend(points)
+        self.segmentSizes.append(len(points) + 1)
+        self.contourSizes[-1] += 1
+        self._current = points[-1]
+
+    def moveTo(self, point: Point):
+        self._start = self._current = point
+        self.contourSizes.append(0)
+
+    def lineTo(self, point: Point):
+        self._segment(point)
+
+    def curveTo(self, *points: Point):
+        if len(points) != 3:
+            raise Unsupported()
+        self._segment(*points)
+
+    def qCurveTo(self, *points: Point):
+        raise Unsupported()
+
+    def closePath(self):
+        if self._current != self._start:
+            self._segment(self._start)
+
+    def endPath(self):
+        self.closePath()
+
+    def addComponent(self, glyphName: str, transform: tuple):
+        # A seac accented character
+        raise Unsupported()
+
+
+class OutlineExtractor(object):
+    # Reads the default outline of a glyph straight from the font's tables.
+    # For glyf, the coordinate and flag arrays are expanded into segments
+    # with array operations: the implied on-curve points between off-curve
+    # points are computed all at once. Each glyph is decoded once, however
+    # many composites use it, and a composite is built by transforming the
+    # decoded points of its components. For CFF and CFF2, fontTools keeps
+    # each charstring's decompiled program once it has been run, and the
+    # extractor records what it draws without going through a pen.
+    # contours() returns None for anything it can't handle, such as cubic
+    # glyf contours; those are drawn with the pen.
+    __slots__ = (
+        "_glyfTable",
+        "_hMetrics",
+        "_charStrings",
+        "_scale",
+        "_glyfOutlines",
+        "_components",
+    )
+
+    def __init__(self, ttFont: TTFont):
+        self._glyfTable = ttFont["glyf"] if "glyf" in ttFont else None
+        self._hMetrics = ttFont["hmtx"].metrics if "hmtx" in ttFont else None
+        self._charStrings = None
+        for tag in ["CFF ", "CFF2"]:
+            if tag in ttFont:
+                self._charStrings = ttFont[tag].cff.topDictIndex[0].CharStrings
+                break
+
+        upem = ttFont["head"].unitsPerEm
+        self._scale = unitsPerEm / upem if upem != unitsPerEm else None
+
+        self._glyfOutlines: dict[str, GlyfOutline] = {}
+        self._components: dict[str, typing.Optional[list[Component]]] = {}
+
+    def contours(self, glyphName: str) -> typing.Optional[list[Contour]]:
+        try:
+            if self._glyfTable is not None:
+                return self._glyfContours(glyphName)
+            if self._charStrings is not None:
+                return self._charStringContours(glyphName)
+        except Unsupported:
+            pass
+
+        return None
+
+    def _scaled(self, points: np.ndarray) -> np.ndarray:
+        return points * self._scale if self._scale else points
+
+    def _glyfContours(self, glyphName: str) -> list[Contour]:
+        if self._hMetrics is None:
+            raise Unsupported()
+
+        components = self.components(glyphName)
+        if components is None:
+            # The pen only moves a glyph by its hmtx offset when
+            # it draws it by itself, not as a component.
+            outline = self._glyfOutline(glyphName)
+            glyph = self._glyfTable[glyphName]
+            offset = self._hMetrics[glyphName][1] - getattr(glyph, "xMin", 0)
+            points = outline.points + (offset, 0) if offset else outline.points
+            parts = [outline.segments(points)]
+        else:
+            parts = []
+            for name, transform in components:
+                outline = self._glyfOutline(name)
+                parts.append(outline.segments(outline.transformed(transform)))
+
+        segmentPoints = [points for points, _, _ in parts]
+        return buildContours(
+            self._scaled(np.concatenate(segmentPoints or [np.empty((0, 2))])),
+            [size for _, segmentSizes, _ in parts for size in segmentSizes],
+            [size for _, _, contourSizes in parts for size in contourSizes],
+        )
+
+    def _glyfOutline(self, glyphName: str) -> GlyfOutline:
+        # A glyph that isn't a composite, decoded the first time it's needed
+        outline = self._glyfOutlines.get(glyphName)
+        if outline is None:
+            outline = GlyfOutline.fromGlyph(self._glyfTable[glyphName])
+            self._glyfOutlines[glyphName] = outline
+        return outline
+
+    def components(self, glyphName: str) -> typing.Optional[list[Component]]:
+        # The glyphs that aren't composites that a composite glyph is built
+        # from, each with the transform that places it in the composite.
+        # A component that is itself a composite is replaced by its own
+        # components, with their transforms combined the way the pen
+        # combines them. None if the glyph isn't a composite.
+        if glyphName in self._components:
+            return self._components[glyphName]
+
+        glyph = self._glyfTable[glyphName]
+        if not glyph.isComposite():
+            self._components[glyphName] = None
+            return None
+
+        components: list[Component] = []
+        for component in glyph.components:
+            if not hasattr(component, "x"):
+                # Placed by matching points, which the pen can't do either
+                raise Unsupported()
+
+            name, transform = component.getComponentInfo()
+            if name not in self._glyfTable:
+                raise Unsupported()
+
+            transform = Transform(*transform)
+            subcomponents = self.components(name)
+            if subcomponents is None:
+                components.append((name, transform))
+            else:
+                components.extend(
+                    (subname, transform.transform(subtransform))
+                    for subname, subtransform in subcomponents
+                )
+
+        self._components[glyphName] = components
+        return components
+
+    def sharedOutlines(self, glyphName: str) -> list[SharedOutline]:
+        # The components of a composite glyph, with their offsets scaled
+        # like the outline. Components that are only moved have the same
+        # shape as their glyph, and as every other glyph that uses it that way.
+        if self._glyfTable is None:
+            return []
+
+        try:
+            components = self.components(glyphName)
+        except Unsupported:
+            return []
+
+        scale = self._scale or 1
+        sharedOutlines: list[SharedOutline] = []
+        for name, transform in components or []:
+            *matrix, dx, dy = transform
+            sharedOutlines.append(SharedOutline(name, matrix, dx * scale, dy * scale))
+
+        return sharedOutlines
+
+    def _charStringContours(self, glyphName: str) -> list[Contour]:
+        recorder = SegmentRecorder()
+        self._charStrings[glyphName].draw(recorder)
+        if not recorder.points:
+            return [[] for _ in recorder.contourSizes]
+
+        return buildContours(
+            self._scaled(np.array(recorder.points, dtype=float)),
+            recorder.segmentSizes,
+            recorder.contourSizes,
+        )
@@ -7,9 +7,20 @@ Created on July 22, 2021
 """
 
 import typing
+import os
 import json
+import time
+import atexit
 
 from TestArguments.Font import Font
+from RasterSamplingTools.AtomicFile import replaceFile
+from RasterSamplingTools.FontSummary import FontSummaries, FontSummary
+from RasterSamplingTools.SampleExport import SampleExport, GlyphSamples
+
+# By default, write the database at most every 30 seconds
+# or 100 changes, whichever comes first.
+defaultFlushInterval = 30.0
+defaultFlushCount = 100
 
 
 class OutputDatabase(object):
@@ -17,45 +28,285 @@ class OutputDatabase(object):
     FontEntry = dict[str, typing.Any]
     TestResults = dict[str, typing.Any]
 
-    def __init__(self, file: str):
+    def __init__(
+        self,
+        file: str,
+        flushInterval: float = defaultFlushInterval,
+        flushCount: int = defaultFlushCount,
+    ):
         self._file = file
+        self._flushInterval = flushInterval
+        self._flushCount = flushCount
+        self._changeCount = 0
+        self._lastWrite = time.monotonic()
+        self._db = self._read(file)
+        self._index = {entry["ps_name"]: entry for entry in self._db}
+        self._summaries = FontSummaries(file)
+        self._changedFonts: set[str] = set()
+        self.sampleExport: typing.Optional[SampleExport] = None
+        atexit.register(self.close)
+
+    def _read(self, file: str) -> list[FontEntry]:
         try:
             inFile = open(file)
         except FileNotFoundError:
-            self._db: list[OutputDatabase.FontEntry] = []
-        else:
-            # We could check for errors in the input file
-            # but it's probably better to just err out...
-            self._db: list[OutputDatabase.FontEntry] = json.load(inFile)
-            inFile.close()
+            return []
+
+        # We could check for errors in the input file
+        # but it's probably better to just err out...
+        with inFile:
+            return json.load(inFile)
 
     @property
     def db(self) -> list[FontEntry]:
         return self._db
 
+    @property
+    def dirty(self) -> bool:
+        return self._changeCount > 0
+
+    def markDirty(self):
+        self._changeCount += 1
+
+    def write(self):
+        with replaceFile(self._file, prefix=".OutputDatabase.") as outFile:
+            json.dump(self._db, outFile, indent=4)
+
+        self._writeSummaries()
+        self._changeCount = 0
+        self._lastWrite = time.monotonic()
+
+    def _writeSummaries(self):
+        self._summaries.update(self._db, self._changedFonts)
+        self._summaries.write()
+        self._changedFonts.clear()
+
+    def fontSummaries(self) -> list[FontSummary]:
+        # Bring the per-font summaries up to date. Only the fonts whose
+        # test results have changed since they were written are summarized.
+        if self.dirty:
+            self.write()
+        elif not self._summaries.current:
+            self._writeSummaries()
+
+        return self._summaries.summaries
+
+    def flush(self, force: bool = False):
+        # Coalesce writes: only rewrite the file when enough changes
+        # have built up, or enough time has passed since the last write.
+        if not self.dirty:
+            return
+
+        if (
+            force
+            or self._changeCount >= self._flushCount
+            or time.monotonic() - self._lastWrite >= self._flushInterval
+        ):
+            self.write()
+
     def close(self):
-        outFile = open(self._file, "w")
-        json.dump(self._db, outFile, indent=4)
-        outFile.close()
+        self.flush(force=True)
+        if self.sampleExport:
+            self.sampleExport.close()
+        atexit.unregister(self.close)
 
-    def getEntry(self, font: Font):
-        psName = font.postscriptName
+    def exportSamples(self, directory: str):
+        # Write the raw samples for each glyph to a file per font in directory
+        self.sampleExport = SampleExport(directory)
 
-        for entry in self._db:
-            if entry["ps_name"] == psName:
-                break
-        else:
+    def getEntryForNames(self, psName: str, fullName: str) -> FontEntry:
+        entry = self._index.get(psName)
+        if entry is None:
             entry: OutputDatabase.FontEntry = {
                 "ps_name": psName,
-                "full_name": font.fullName,
+                "full_name": fullName,
                 "test_results": {},
             }
             self._db.append(entry)
+            self._index[psName] = entry
+            self.markDirty()
 
         if "full_name" not in entry:
-            entry["full_name"] = font.fullName
+            entry["full_name"] = fullName
+            self.markDirty()
 
         return entry
 
+    def getEntry(self, font: Font):
+        return self.getEntryForNames(font.postscriptName, font.fullName)
+
     def getTestResults(self, entry: FontEntry) -> TestResults:
         return entry["test_results"]
+
+    def setFontValue(self, entry: FontEntry, key: str, value: typing.Any):
+        entry[key] = value
+        self.markDirty()
+
+    def setTestResults(
+        self, entry: FontEntry, glyphNameSpec: str, results: TestResults
+    ):
+        self.getTestResults(entry)[glyphNameSpec] = results
+        self._changedFonts.add(entry["ps_name"])
+        self.markDirty()
+
+    def setSamples(self, entry: FontEntry, glyphNameSpec: str, samples: GlyphSamples):
+        if self.sampleExport:
+            self.sampleExport.add(entry["ps_name"], glyphNameSpec, samples)
+
+
+class OutputLog(OutputDatabase):
+    # An append-only JSON Lines version of OutputDatabase. Each font entry,
+    # font value and glyph result is written as one line as soon as it's set,
+    # so memory use stays flat and an interrupted run keeps everything
+    # but the glyph in flight. close() compacts the log into dbFile,
+    # unless compact is False, which leaves that to the caller.
+    def __init__(self, file: str, dbFile: str, compact: bool = True):
+        self._logPath = file
+        self._compact = compact
+        self._logFile: typing.Optional[typing.TextIO] = None
+        super().__init__(dbFile)
+
+    def _read(self, file: str) -> list[OutputDatabase.FontEntry]:
+        # dbFile isn't read: the log is merged into it when it's compacted.
+        return []
+
+    def _append(self, record: dict[str, typing.Any]):
+        if self._logFile is None:
+            self._logFile = open(self._logPath, "a")
+
+        self._logFile.write(json.dumps(record) + "\n")
+        self._logFile.flush()
+
+    def flush(self, force: bool = False):
+        # Every record is flushed as it's appended.
+        if self._logFile:
+            self._logFile.flush()
+
+    def write(self):
+        # There's nothing else to write until the log is compacted;
+        # self._db only has the per-font fields, not the test results.
+        self.flush()
+        self._changeCount = 0
+
+    def compact(self):
+        if self._logFile:
+            self._logFile.close()
+            self._logFile = None
+
+        compactLog(self._logPath, self._file)
+
+    def fontSummaries(self) -> list[FontSummary]:
+        # Only what's been compacted into dbFile is summarized.
+        if self._compact:
+            self.compact()
+
+        outdb = OutputDatabase(self._file)
+        summaries = outdb.fontSummaries()
+        outdb.close()
+        return summaries
+
+    def close(self):
+        if self.sampleExport:
+            self.sampleExport.close()
+
+        if self._compact:
+            self.compact()
+        elif self._logFile:
+            self._logFile.close()
+            self._logFile = None
+        atexit.unregister(self.close)
+
+    def getEntryForNames(self, psName: str, fullName: str) -> OutputDatabase.FontEntry:
+        # Only the small per-font fields are kept in memory;
+        # test results go straight to the log.
+        entry = self._index.get(psName)
+        if entry is None:
+            entry = {"ps_name": psName, "full_name": fullName, "test_results": {}}
+            self._index[psName] = entry
+            self._db.append(entry)
+            self._append({"record": "font", "ps_name": psName, "full_name": fullName})
+
+        return entry
+
+    def setFontValue(
+        self, entry: OutputDatabase.FontEntry, key: str, value: typing.Any
+    ):
+        entry[key] = value
+        self._append(
+            {
+                "record": "font_value",
+                "ps_name": entry["ps_name"],
+                "key": key,
+                "value": value,
+            }
+        )
+
+    def setTestResults(
+        self,
+        entry: OutputDatabase.FontEntry,
+        glyphNameSpec: str,
+        results: OutputDatabase.TestResults,
+    ):
+        self._append(
+            {
+                "record": "test_results",
+                "ps_name": entry["ps_name"],
+                "glyph": glyphNameSpec,
+                "results": results,
+            }
+        )
+
+
+def readLog(file: str) -> typing.Iterator[dict[str, typing.Any]]:
+    try:
+        logFile = open(file)
+    except FileNotFoundError:
+        return
+
+    with logFile:
+        for line in logFile:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of an interrupted run may be incomplete.
+                continue
+
+
+def compactLog(file: str, dbFile: str):
+    # Fold the records in the log into the OutputDatabase.json layout,
+    # merging them with whatever is already in dbFile.
+    outdb = OutputDatabase(dbFile)
+    fullNames: dict[str, str] = {}
+
+    for record in readLog(file):
+        psName = record["ps_name"]
+        kind = record["record"]
+
+        if kind == "font":
+            fullNames[psName] = record["full_name"]
+            outdb.getEntryForNames(psName, record["full_name"])
+            continue
+
+        entry = outdb.getEntryForNames(psName, fullNames.get(psName, psName))
+        if kind == "font_value":
+            outdb.setFontValue(entry, record["key"], record["value"])
+        elif kind == "test_results":
+            outdb.setTestResults(entry, record["glyph"], record["results"])
+
+    outdb.close()
+
+    if os.path.exists(file):
+        os.remove(file)
+
+
+def openOutputDatabase(
+    file: str,
+    flushInterval: float = defaultFlushInterval,
+    flushCount: int = defaultFlushCount,
+) -> OutputDatabase:
+    # A .jsonl file is the log for the .json file with the same name.
+    root, extension = os.path.splitext(file)
+    if extension == ".jsonl":
+        return OutputLog(file, root + ".json")
+
+    return OutputDatabase(file, flushInterval, flushCount)
@@ -0,0 +1,31 @@
+"""\
+How much memory a process is using
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def processRSS(pid: int) -> typing.Optional[int]:
+    if psutil:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+
+    # Without psutil, we can still get it on Linux
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
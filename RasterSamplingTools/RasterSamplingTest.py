@@ -20,14 +20,15 @@ import matplotlib
 # import matplotlib.axis as maxis
 import matplotlib.path as mpath
 import matplotlib.patches as mpatches
-import matplotlib.pyplot as plt
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
+from matplotlib.backends.backend_svg import FigureCanvasSVG
 import scipy.stats
 
 # from scipy import odr
-import statsmodels.api
-from UnicodeData.CharNames import CharNames
 from TestArguments.Font import Font
+from TestArguments.GlyphSpec import GlyphSpec
 from PathLib.PathTypes import Point, Contour  # , Segment
 from PathLib.Bezier import Bezier, BContour, BOutline
 
@@ -38,7 +39,27 @@ from PathLib.SegmentPen import SegmentPen
 from TestArguments.TestArguments import TestArgs
 from TestArguments.CommandLineArguments import CommandLineOption
 
-from RasterSamplingTools.OutputDatabase import OutputDatabase
+from RasterSamplingTools.OutputDatabase import OutputDatabase, openOutputDatabase
+from RasterSamplingTools import KernelDensity
+from RasterSamplingTools import BatchFit
+from RasterSamplingTools.MonotoneCurves import MonotoneEdges
+from RasterSamplingTools.BitmapSpans import BitmapSpans, Span
+from RasterSamplingTools.GlyphIndex import GlyphIndex, GlyphInfo
+from RasterSamplingTools.OutlineArena import OutlineArena
+from RasterSamplingTools.OutlineExtractor import OutlineExtractor, SharedOutline
+from RasterSamplingTools.ResultCache import ResultCache, CachedResult, outlineKey
+from RasterSamplingTools.RenderPolicy import RenderPolicy
+from RasterSamplingTools.RenderQueue import RenderQueue
+from RasterSamplingTools.SampleExport import (
+    GlyphSamples,
+    sampleDirectoryName,
+    sideNumbers,
+)
+from RasterSamplingTools.VariableFonts import (
+    VariableInstance,
+    VariableOutlines,
+    parseInstances,
+)
 
 _usage = """
 Usage: rastersamplingtest options...
@@ -50,9 +71,17 @@ Options:
 [--mainContour (largest | leftmost | rightmost | tallest)] (default: tallest)
 [--range XX-YY] (default: 30-70)
 [--direction (ltr | rtl)] (default: ltr)
-[--outdb databaseFilePath]
+[--outdb (databaseFilePath.json | databaseFilePath.jsonl)]
 [--loopDetection]
 [--autoRangeOff]
+[--kde (binned | statsmodels)] (default: binned)
+[--instances (named | tag=values[/tag=values...])]
+[--cache cacheDirectoryPath]
+[--render (all | none | anomalies | rule[,rule...])] (default: all)
+[--thumbnails]
+[--samples]
+[--bootstrap resampleCount]
+[--engine (analytic | bitmap)] (default: analytic)
 [--colon]
 [--debug]
 """
@@ -89,6 +118,14 @@ class RasterSamplingTestArgs(TestArgs):
         "leastspread": widthMethodLeastspread,
     }
     directions = {"ltr": 1, "rtl": -1}
+    kdeMethods = {
+        "binned": KernelDensity.kdeMethodBinned,
+        "statsmodels": KernelDensity.kdeMethodStatsmodels,
+    }
+
+    engineAnalytic = 0
+    engineBitmap = 1
+    engines = {"analytic": engineAnalytic, "bitmap": engineBitmap}
 
     mainContourLargest = 0
     mainContourLeftmost = 1
@@ -140,7 +177,7 @@ class RasterSamplingTestArgs(TestArgs):
         ),
         CommandLineOption(
             "outdb",
-            lambda s, a: OutputDatabase(a) if a else None,
+            lambda s, a: openOutputDatabase(a) if a else None,
             lambda a: a.nextExtra("output db"),
             "outdb",
             None,
@@ -153,6 +190,62 @@ class RasterSamplingTestArgs(TestArgs):
         CommandLineOption(
             "autoRangeOff", None, True, "autoRangeOff", False, required=False
         ),
+        CommandLineOption(
+            "kde",
+            lambda s, a: CommandLineOption.valueFromDict(
+                s.kdeMethods, a, "kde method"
+            ),
+            lambda a: a.nextExtra("kde method"),
+            "kdeMethod",
+            "binned",
+            required=False,
+        ),
+        CommandLineOption(
+            "instances",
+            None,
+            lambda a: a.nextExtra("instances"),
+            "instances",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "cache",
+            lambda s, a: ResultCache(a) if a else None,
+            lambda a: a.nextExtra("cache directory"),
+            "cache",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "render",
+            lambda s, a: RenderPolicy.fromSpec(a),
+            lambda a: a.nextExtra("render policy"),
+            "renderPolicy",
+            "all",
+            required=False,
+        ),
+        CommandLineOption(
+            "thumbnails", None, True, "thumbnails", False, required=False
+        ),
+        CommandLineOption(
+            "samples", None, True, "exportSamples", False, required=False
+        ),
+        CommandLineOption(
+            "engine",
+            lambda s, a: CommandLineOption.valueFromDict(s.engines, a, "engine"),
+            lambda a: a.nextExtra("engine"),
+            "engine",
+            "analytic",
+            required=False,
+        ),
+        CommandLineOption(
+            "bootstrap",
+            lambda s, a: s.processResampleCount(a),
+            lambda a: a.nextExtra("resample count"),
+            "bootstrap",
+            0,
+            required=False,
+        ),
     ]
 
     def __init__(self):
@@ -168,10 +261,27 @@ class RasterSamplingTestArgs(TestArgs):
         self.loopDetection = False
         self.colon = False
         self.autoRangeOff = False
+        self.kdeMethod = KernelDensity.kdeMethodBinned
+        self.instances: typing.Optional[str] = None
+        self.cache: typing.Optional[ResultCache] = None
+        self.renderPolicy = RenderPolicy()
+        self.thumbnails = False
+        self.exportSamples = False
+        self.bootstrap = 0
+        self.engine = self.engineAnalytic
+        self.renderQueue: typing.Optional[RenderQueue] = None
+
+        # The glyph spec string that glyphSpec was made from, when the
+        # test comes from setProps(), so it can go to GlyphIndex.resolve()
+        self.glyph: typing.Optional[str] = None
 
         TestArgs.__init__(self)
         self._options.extend(RasterSamplingTestArgs.options)
 
+    def setProps(self, props: dict[str, typing.Any]):
+        TestArgs.setProps(self, props)
+        self.glyph = props.get("glyphSpec")
+
     def processRange(self, rangeSpec: str) -> tuple[int, ...]:
         m = re.fullmatch("([0-9]{1,3})-([0-9]{1,3})", rangeSpec)
         if m:
@@ -181,6 +291,13 @@ class RasterSamplingTestArgs(TestArgs):
             
         raise ValueError(f'Invalid range specification: "{rangeSpec}"')
 
+    @staticmethod
+    def processResampleCount(spec: str) -> int:
+        if re.fullmatch("[0-9]{1,6}", spec) and int(spec) > 0:
+            return int(spec)
+
+        raise ValueError(f'Invalid resample count: "{spec}"')
+
     @property
     def widthMethodName(self):
         return keyForValue(self.widthMethods, self.widthMethod)
@@ -193,6 +310,10 @@ class RasterSamplingTestArgs(TestArgs):
     def directionName(self):
         return keyForValue(self.directions, self.directionAdjust)
 
+    @property
+    def engineName(self):
+        return keyForValue(self.engines, self.engine)
+
 
 oppositeDirection = {
     Bezier.dir_up: Bezier.dir_down,
@@ -208,27 +329,6 @@ widthSelection = {
 }
 
 
-def splitCurve(curve: Bezier, splits: list[Bezier]):
-    p1, p2, p3 = curve.controlPoints
-    q1 = p1
-    r3 = p3
-    q2 = PathUtilities.midpoint([p1, p2])
-    r2 = PathUtilities.midpoint([p2, p3])
-    q3 = r1 = PathUtilities.midpoint([q2, r2])
-    q = Bezier([q1, q2, q3])
-    r = Bezier([r1, r2, r3])
-
-    if q.direction != Bezier.dir_mixed:
-        splits.append(q)
-    else:
-        splitCurve(q, splits)
-
-    if r.direction != Bezier.dir_mixed:
-        splits.append(r)
-    else:
-        splitCurve(r, splits)
-
-
 def diff(a: list[float]) -> list[float]:
     prev = a[0]
     return [-prev + (prev := x) for x in a[1:]]
@@ -240,9 +340,147 @@ def longestRange(r1: tuple[int, int], r2: tuple[int, int]) -> tuple[int, int]:
     return r1 if l1 > l2 else r2
 
 
+class GlyphSample(object):
+    # What sampleGlyph() learned about a glyph, plus the settings that
+    # finishGlyph() needs, captured before the args change for the next test.
+    def __init__(self, args: RasterSamplingTestArgs):
+        self.silent = args.silent
+        self.outdb = args.outdb
+        self.directionAdjust = args.directionAdjust
+        self.kdeMethod = args.kdeMethod
+        self.cache = args.cache if args.outdb else None
+        self.renderPolicy = args.renderPolicy
+        self.thumbnails = args.thumbnails
+        self.exportSamples = args.exportSamples and args.outdb is not None
+        self.bootstrap = args.bootstrap
+        self.renderQueue = args.renderQueue
+
+        self.messages: list[str] = []
+        self.report: list[str] = []
+        self.indent = ""
+        self.fullName = ""
+        self.charInfo = ""
+        self.svgName = ""
+        self.glyphNameSpec: typing.Optional[str] = None
+        self.fontEntry: OutputDatabase.FontEntry = {}
+        self.glyphResults: dict[
+            str,
+            typing.Optional[typing.Union[str, int, float, list[int], dict[str, float]]],
+        ] = {}
+
+        self.outline: BOutline
+        self.path: mpath.Path
+        self.outlineBounds: PathUtilities.BoundsRectangle
+        self.left = 0.0
+        self.right = 0.0
+        self.outerAreaPercent = 0.0
+        self.outerHeightPercent = 0.0
+        self.rejected = False
+        self.missedRasterCount = 0
+        self.sides: list[RasterSide] = []
+
+        self.cacheKey: typing.Optional[str] = None
+        self.cached: typing.Optional[CachedResult] = None
+
+    @property
+    def needsFit(self) -> bool:
+        return not (self.rejected or self.cached)
+
+    @property
+    def title(self) -> str:
+        # The font and character, as the graphs show them
+        return f"{self.fullName}\n{self.charInfo}"
+
+
+class RasterSide(object):
+    __slots__ = (
+        "name",
+        "allRasters",
+        "start",
+        "limit",
+        "rasters",
+        "widths",
+        "w",
+        "w1",
+        "w2",
+        "bestRange",
+        "midpoints",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        allRasters: list[Bezier],
+        start: int,
+        limit: int,
+        w: list[float],
+        w1: list[float],
+        w2: list[float],
+        bestRange: tuple[int, int],
+    ):
+        # rasters and widths are the ones from start up to limit,
+        # which are used to fit the line and to measure the widths.
+        self.name = name
+        self.allRasters = allRasters
+        self.start = start
+        self.limit = limit
+        self.rasters = allRasters[start:limit]
+        self.widths = w[start:limit]
+        self.w = w
+        self.w1 = w1
+        self.w2 = w2
+        self.bestRange = bestRange
+        self.midpoints: list[Point] = [r.midpoint for r in self.rasters]
+
+
+class SideFit(object):
+    __slots__ = "b", "a", "rValue", "pValue", "stdErr", "lmod", "widthDict"
+
+    def __init__(
+        self,
+        b: float,
+        a: float,
+        rValue: float,
+        pValue: float,
+        stdErr: float,
+        lmod: float,
+        widthDict: dict[str, float],
+    ):
+        self.b = b
+        self.a = a
+        self.rValue = rValue
+        self.pValue = pValue
+        self.stdErr = stdErr
+        self.lmod = lmod
+        self.widthDict = widthDict
+
+
 lineWidth = 0.3
 markerSize = 2.0
 
+# The size, in inches, of an outline-only thumbnail
+thumbnailSize = 1.5
+
+matplotlib.set_loglevel("warning")
+
+# A glyph is only sampled if its main contour is at least this big,
+# relative to the bounding box of the whole glyph.
+minMainContourAreaPercent = 10.0
+minMainContourHeightPercent = 50.0
+
+# Glyphs with more contours than this rarely have a useful vertical stroke.
+maxUsefulContourCount = 3
+
+# A glyph whose bounding box is less than this tall, relative to
+# its width, doesn't have room for a vertical stroke.
+minPrefilterAspect = 0.5
+
+prefilterEmpty = "empty_outline"
+prefilterContourCount = "too_many_contours"
+prefilterAspect = "too_flat"
+prefilterMainContour = "small_main_contour"
+prefilterError = "error"
+
 
 class RasterSamplingTest(object):
     # __slots__ = "_args", "_font", "logger", "outline"
@@ -252,6 +490,13 @@ class RasterSamplingTest(object):
         self._font = Font(
             args.fontFile, fontName=args.fontName, fontNumber=args.fontNumber
         )
+        self._glyphIndex: typing.Optional[GlyphIndex] = None
+        self._outlineExtractor: typing.Optional[OutlineExtractor] = None
+        self._variations: typing.Optional[VariableOutlines] = None
+        self._instanceIndex: typing.Optional[int] = None
+
+        # The default instance's outlines, already extracted by another process
+        self.outlineArena: typing.Optional[OutlineArena] = None
 
         logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
         self.logger = logging.getLogger("raster-sampling-test")
@@ -275,67 +520,35 @@ class RasterSamplingTest(object):
         contours.sort(key=lambda c: c.boundsRectangle.left, reverse=reverse)
 
     @classmethod
-    def rasterLength(cls, raster: Bezier):
-        return PathUtilities.length(raster.controlPoints)
-
-    @classmethod
-    def curvesAtY(cls, curveList: list[Bezier], y: float):
-        return list(filter(lambda curve: curve.boundsRectangle.crossesY(y), curveList))
+    def selectMainContour(
+        cls, contours: list[BContour], mainContourType: int
+    ) -> list[BContour]:
+        # Returns a copy of contours with the main contour first.
+        contours = contours.copy()
+        if mainContourType == RasterSamplingTestArgs.mainContourLargest:
+            cls.sortByArea(contours, reverse=True)
+        elif mainContourType == RasterSamplingTestArgs.mainContourTallest:
+            cls.sortByHeight(contours, reverse=True)
+        elif mainContourType == RasterSamplingTestArgs.mainContourLeftmost:
+            cls.sortByLeft(contours, reverse=False)
+        else:
+            cls.sortByLeft(contours, reverse=True)
 
-    @classmethod
-    def leftmostPoint(cls, points: list[typing.Optional[Point]], outline: BOutline):
-        leftmostX = 65536
-        leftmostIndex = -1
-        for index, point in enumerate(points):
-            # if point is None, the curve is a line
-            # that's colinear with the raster
-            if point is not None:
-                ipx, _ = outline.pointXY(point)
-                if ipx < leftmostX:
-                    leftmostX = ipx
-                    leftmostIndex = index
-
-        return leftmostIndex
+        return contours
 
     @classmethod
-    def leftmostIntersection(
+    def mainContourPercents(
         cls,
-        intersections: list[typing.Optional[Point]],
-        curves: list[Bezier],
-        direction: int,
-    ) -> Point:
-        leftmostX = 65536
-        leftmostC = -1
-
-        for index, curve in enumerate(curves):
-            if cls.direction(curve) == direction:
-                if ip := intersections[index]:
-                    ipx, _ = curve.pointXY(ip)
-                    if ipx < leftmostX:
-                        leftmostX = ipx
-                        leftmostC = index
-
-        return typing.cast(Point, intersections[leftmostC])
+        mainBounds: PathUtilities.BoundsRectangle,
+        outlineBounds: PathUtilities.BoundsRectangle,
+    ) -> tuple[float, float]:
+        areaPercent = round(mainBounds.area / outlineBounds.area * 100.0, 3)
+        heightPercent = round(mainBounds.height / outlineBounds.height * 100.0, 3)
+        return areaPercent, heightPercent
 
     @classmethod
-    def rightmostIntersection(
-        cls,
-        intersections: list[typing.Optional[Point]],
-        curves: list[Bezier],
-        direction: int,
-    ) -> Point:
-        rightmostX = -65536
-        rightmostC = -1
-
-        for index, curve in enumerate(curves):
-            if cls.direction(curve) == direction:
-                if ip := intersections[index]:
-                    ipx, _ = curve.pointXY(ip)
-                    if ipx > rightmostX:
-                        rightmostX = ipx
-                        rightmostC = index
-
-        return typing.cast(Point, intersections[rightmostC])
+    def rasterLength(cls, raster: Bezier):
+        return PathUtilities.length(raster.controlPoints)
 
     @classmethod
     def offsetPercent(cls, offset: float, outlineBounds: PathUtilities.BoundsRectangle):
@@ -375,7 +588,7 @@ class RasterSamplingTest(object):
         cls,
         path: mpath.Path,
         outlineBounds: PathUtilities.BoundsRectangle,
-        ax: plt.Axes,
+        ax: Axes,
     ):
         ax.set_aspect(1)
         patch = mpatches.PathPatch(path, fc="tab:gray", linewidth=lineWidth, alpha=0.10)
@@ -459,35 +672,6 @@ class RasterSamplingTest(object):
 
         return b, a, rValue, pValue, stdErr
 
-    @classmethod
-    def direction(cls, curve: Bezier) -> int:
-        startY = curve.startY
-        endY = curve.endY
-
-        # minY = min(startY, endY)
-        # maxY = max(startY, endY)
-
-        #
-        # For the purposes of edge detection
-        # we don't care if the curve actually
-        # has a mixed direction, only that it
-        # tends upward or downward.
-        #
-        # ocps = curve.controlPoints[1:-1]
-        # for ocp in ocps:
-        #     ocpx, ocpy = curve.pointXY(ocp)
-        #     if ocpy < minY or ocpy > maxY: return Bezier.dir_mixed
-
-        # if we get here, the curve is either order 1 or
-        # has a uniform direction. Curves with order 2 or higher
-        # with startY and endY equal are likely mixed and got caught
-        # above.
-        if startY < endY:
-            return Bezier.dir_up
-        if startY > endY:
-            return Bezier.dir_down
-        return Bezier.dir_flat
-
     def scaleContours(self, contours: list[Contour]):
         upem = self._font.unitsPerEm()
         if upem != 1000:
@@ -520,18 +704,202 @@ class RasterSamplingTest(object):
     def font(self):
         return self._font
 
+    @property
+    def glyphIndex(self) -> GlyphIndex:
+        # Built the first time it's needed, then shared by every test of this font.
+        if self._glyphIndex is None:
+            self._glyphIndex = GlyphIndex(self._font)
+        return self._glyphIndex
+
+    @property
+    def outlineExtractor(self) -> OutlineExtractor:
+        if self._outlineExtractor is None:
+            self._outlineExtractor = OutlineExtractor(self._font.ttFont)
+        return self._outlineExtractor
+
+    @property
+    def instances(self) -> list[VariableInstance]:
+        return self._variations.instances if self._variations else []
+
+    def setInstances(self, instances: list[VariableInstance]):
+        self._variations = (
+            VariableOutlines(self._font.ttFont, instances, self.logger)
+            if instances
+            else None
+        )
+        self._instanceIndex = None
+
+    def selectInstance(self, index: typing.Optional[int]):
+        # None selects the default master.
+        self._instanceIndex = index
+
+    @property
+    def instanceIndex(self) -> typing.Optional[int]:
+        return self._instanceIndex
+
+    @property
+    def instance(self) -> typing.Optional[VariableInstance]:
+        if self._variations is None or self._instanceIndex is None:
+            return None
+        return self._variations.instances[self._instanceIndex]
+
+    @property
+    def fullName(self) -> str:
+        instance = self.instance
+        fullName = self._font.fullName
+        return f"{fullName} {instance.name}" if instance else fullName
+
+    def fontEntry(self, outdb: OutputDatabase) -> OutputDatabase.FontEntry:
+        # Each instance of a variable font gets an entry of its own.
+        instance = self.instance
+        if instance is None:
+            return outdb.getEntry(self._font)
+
+        psName = self._font.postscriptName
+        entry = outdb.getEntryForNames(f"{psName}@{instance.name}", self.fullName)
+        if "instance_location" not in entry:
+            outdb.setFontValue(entry, "variable_font", psName)
+            outdb.setFontValue(entry, "instance_location", instance.location)
+        return entry
+
+    def cacheParams(self) -> dict[str, typing.Any]:
+        # Everything besides the outline that affects a glyph's results or graph
+        args = self._args
+        params = {
+            "range": args.range,
+            "width_method": args.widthMethodName,
+            "main_contour": args.mainContourTypeName,
+            "direction": args.directionName,
+            "loop_detection": args.loopDetection,
+            "auto_range": not args.autoRangeOff,
+            "kde": args.kdeMethod,
+        }
+
+        # Only when they're not the default, so the results
+        # cached before there were options for them are still found
+        if args.bootstrap:
+            params["bootstrap"] = args.bootstrap
+        if args.engine != RasterSamplingTestArgs.engineAnalytic:
+            params["engine"] = args.engineName
+
+        return params
+
+    def glyphInfo(self, args: RasterSamplingTestArgs) -> GlyphInfo:
+        if args.glyph is not None:
+            glyphInfo = self.glyphIndex.resolve(args.glyph)
+        else:
+            # --glyph on the command line, which is only resolved once a run
+            glyphSpec: GlyphSpec = args.glyphSpec
+            glyphName = glyphSpec.nameForFont(self._font)
+            glyphInfo = (
+                self.glyphIndex.infoForName(
+                    glyphName, glyphSpec.charCodeForFont(self._font)
+                )
+                if glyphName
+                else None
+            )
+        if glyphInfo is None:
+            raise ValueError(f"{self._font.fullName} doesn't have the requested glyph")
+        return glyphInfo
+
     def outlineFromGlyph(self, glyphName: str) -> BOutline:
+        if self._variations and self._instanceIndex is not None:
+            contours = self._variations.contours(glyphName, self._instanceIndex)
+            return BOutline(self.scaleContours(contours))
+
+        arena = self.outlineArena
+        if arena and glyphName in arena:
+            return BOutline(arena.contours(glyphName))
+
+        return BOutline(self.glyphContours(glyphName))
+
+    def glyphContours(self, glyphName: str) -> list[Contour]:
+        # Read the outline straight from the font if we can,
+        # and draw it with the pen if we can't.
+        contours = self.outlineExtractor.contours(glyphName)
+        if contours is not None:
+            return contours
+
         pen = SegmentPen(self.font.glyphSet, self.logger)
         self.font.glyphSet[glyphName].draw(pen)
-        return BOutline(self.scaleContours(pen.contours))
+        return self.scaleContours(pen.contours)
+
+    def sharedOutlines(self, glyphName: str) -> list[SharedOutline]:
+        # The glyphs a composite glyph is built from. An instance of a
+        # variable font can move them, so this is only for the default.
+        if self._instanceIndex is not None:
+            return []
+        return self.outlineExtractor.sharedOutlines(glyphName)
+
+    def createOutlineArena(self, glyphNames: list[str]) -> OutlineArena:
+        # Extract the outlines of glyphNames, and of the colon for the first
+        # test, into shared memory for worker processes. A glyph that can't
+        # be drawn is left out, so the worker that tests it reports the error.
+        outlines: dict[str, list[Contour]] = {}
+        colonName = self.glyphIndex.glyphNameForCharacterCode(ord(":"))
+        for glyphName in [*glyphNames, colonName]:
+            if glyphName is None or glyphName in outlines:
+                continue
+
+            try:
+                outlines[glyphName] = self.glyphContours(glyphName)
+            except Exception:
+                continue
+
+        return OutlineArena.create(outlines)
 
     def outlineFromChar(
         self, char: typing.Union[str, int]
     ) -> typing.Optional[BOutline]:
         charCode = ord(char) if isinstance(char, str) else char
-        charName = self.font.glyphNameForCharacterCode(charCode)
+        charName = self.glyphIndex.glyphNameForCharacterCode(charCode)
         return self.outlineFromGlyph(charName) if charName else None
 
+    def prefilterGlyph(
+        self, glyphName: str, mainContourType: int
+    ) -> typing.Optional[str]:
+        # The checks sampleGlyph() makes before it starts rastering, plus a
+        # couple of other cheap ones. Returns the reason the glyph can't have
+        # a usable vertical stroke, or None if it's worth sampling.
+        try:
+            return self.prefilterOutline(
+                self.outlineFromGlyph(glyphName), mainContourType
+            )
+        except Exception:
+            # Anything we can't even measure certainly can't be sampled.
+            return prefilterError
+
+    @classmethod
+    def prefilterOutline(
+        cls, outline: BOutline, mainContourType: int
+    ) -> typing.Optional[str]:
+        contours = outline.contours
+        if len(contours) == 0:
+            return prefilterEmpty
+
+        if len(contours) > maxUsefulContourCount:
+            return prefilterContourCount
+
+        bounds = outline.boundsRectangle
+        if (
+            bounds.width <= 0
+            or bounds.height <= 0
+            or bounds.height < bounds.width * minPrefilterAspect
+        ):
+            return prefilterAspect
+
+        mainContour = cls.selectMainContour(contours, mainContourType)[0]
+        areaPercent, heightPercent = cls.mainContourPercents(
+            mainContour.boundsRectangle, bounds
+        )
+        if (
+            areaPercent < minMainContourAreaPercent
+            or heightPercent < minMainContourHeightPercent
+        ):
+            return prefilterMainContour
+
+        return None
+
     def italicAngleFromColonMethod(self):
         outline = self.outlineFromChar(":")
 
@@ -559,7 +927,7 @@ class RasterSamplingTest(object):
 
         return None
 
-    def run(self):
+    def sampleGlyph(self) -> GlyphSample:
         widthMethodStrings = {
             RasterSamplingTestArgs.widthMethodLeftmost: "",
             RasterSamplingTestArgs.widthMethodRightmost: "_rightmost",
@@ -568,21 +936,20 @@ class RasterSamplingTest(object):
 
         args = self._args
         font = self._font
+        sample = GlyphSample(args)
+        messages = sample.messages
         indent = ""
-        fullName = font.fullName
+        fullName = self.fullName
         if fullName.startswith("."):
             fullName = fullName[1:]
 
-        matplotlib.set_loglevel("warning")
-        matplotlib.use("svg")
-
-        glyph = args.getGlyph(font)
-        glyphName = glyph.name()
-        gidSpec = args.glyphSpec.glyphIDSpecForFont(font)
-        charCode = args.glyphSpec.charCodeForFont(font)
+        glyphInfo = self.glyphInfo(args)
+        glyphName = glyphInfo.name
+        gidSpec = glyphInfo.glyphIDSpec
+        charCode = glyphInfo.charCode
 
         if charCode:
-            unicodeName = CharNames.getCharName(charCode)
+            unicodeName = glyphInfo.unicodeName
 
             charInfo = f"U+{charCode:04X} {unicodeName if unicodeName else '(no Unicode name)'}"
         else:
@@ -592,31 +959,33 @@ class RasterSamplingTest(object):
         fontEntry: OutputDatabase.FontEntry = (
             {}
         )  # this is here to make any incorrect "possibly unbound" errors go away
-        testResults: OutputDatabase.TestResults = {}  # this too...
-        glyphNameSpec: typing.Optional[str] = None  # and this...
         if args.outdb:
-            fontEntry = args.outdb.getEntry(font)
-            testResults = args.outdb.getTestResults(fontEntry)
-            glyphNameSpec = args.glyphSpec.nameSpecForFont(font)
+            fontEntry = self.fontEntry(args.outdb)
+            sample.fontEntry = fontEntry
+            sample.glyphNameSpec = glyphInfo.nameSpec
 
         if args.silent:
             indent = "        "
 
             if args.showFullName:
-                print(f"    {font.fullName}:")
+                messages.append(f"    {self.fullName}:")
 
         if args.colon:
             colonAngle = self.italicAngleFromColonMethod()
-            print(f"{indent}italic angle from colon method = {colonAngle}\u00B0")
+            messages.append(
+                f"{indent}italic angle from colon method = {colonAngle}\u00B0"
+            )
             if args.outdb:
-                fontEntry["italic_angle_from_colon_method"] = colonAngle
+                args.outdb.setFontValue(
+                    fontEntry, "italic_angle_from_colon_method", colonAngle
+                )
 
         if args.silent:
-            print(f"{indent}{charInfo}:")
+            messages.append(f"{indent}{charInfo}:")
 
         widthMethodString = widthMethodStrings[args.widthMethod]
         loopDetectionString = "_loop" if args.loopDetection else ""
-        svgName = os.path.join(
+        sample.svgName = os.path.join(
             args.outdir,
             f"RasterSamplingTest {fullName}{widthMethodString}{loopDetectionString}_{gidSpec}({glyphName}).svg",
         )
@@ -624,36 +993,47 @@ class RasterSamplingTest(object):
         outline = self.outlineFromGlyph(glyphName)
 
         self.outline = outline
-        path = self.outlineToPath(outline)
+        sample.indent = indent
+        sample.fullName = fullName
+        sample.charInfo = charInfo
+        sample.outline = outline
+        sample.path = self.outlineToPath(outline)
 
         contourCount = len(outline.contours)
-        if contourCount > 3:
-            print(
+        if contourCount > maxUsefulContourCount:
+            messages.append(
                 f"{indent}(this glyph has {contourCount} contours, so results may not be useful)"
             )
 
-        glyphResults: dict[
-            str,
-            typing.Optional[typing.Union[str, int, float, list[int], dict[str, float]]],
-        ] = {}  # this is here to make bogus "possibly unbound" errors go away
-        if args.outdb:
-            glyphName = args.glyphSpec.nameForFont(font)
-            codePoints = font.codePointsForGlyphName(glyphName)
+        # The results are collected even without an output database,
+        # because the render policy looks at them.
+        glyphResults = sample.glyphResults
+        segmentCounts: list[int] = []
+        for contour in outline.contours:
+            segmentCounts.append(len(contour.beziers))
 
-            segmentCounts: list[int] = []
-            for contour in outline.contours:
-                segmentCounts.append(len(contour.beziers))
-
-            glyphResults = {
-                "code_points": codePoints,
+        glyphResults.update(
+            {
+                "code_points": glyphInfo.codePoints,
                 "unicode_character_name": unicodeName if unicodeName else "",
-                "glyph_id": args.glyphSpec.glyphIDForFont(font),
+                "glyph_id": glyphInfo.glyphID,
                 "contour_count": contourCount,
                 "segment_counts": segmentCounts,
                 "width_method": args.widthMethodName,
                 "main_contour": args.mainContourTypeName,
                 "direction": args.directionName,
             }
+        )
+
+        sharedOutlines = self.sharedOutlines(glyphName)
+        if sharedOutlines:
+            glyphResults["components"] = [shared.result for shared in sharedOutlines]
+
+        if sample.cache:
+            sample.cacheKey = outlineKey(outline, self.cacheParams())
+            sample.cached = self.cacheLookup(sample, sample.cacheKey)
+            if sample.cached:
+                return sample
 
         outlineBounds = outline.boundsRectangle
         # outlineBoundsLeft = outlineBounds.left if outlineBounds.left >= 0 else 0
@@ -663,68 +1043,31 @@ class RasterSamplingTest(object):
         baselineBounds = PathUtilities.BoundsRectangle(*baseline)
 
         overallBounds = baselineBounds.union(outlineBounds)
+        sample.outlineBounds = outlineBounds
 
-        contours = outline.contours.copy()
-        if args.mainContourType == RasterSamplingTestArgs.mainContourLargest:
-            self.sortByArea(contours, reverse=True)
-        elif args.mainContourType == RasterSamplingTestArgs.mainContourTallest:
-            self.sortByHeight(contours, reverse=True)
-        elif args.mainContourType == RasterSamplingTestArgs.mainContourLeftmost:
-            self.sortByLeft(contours, reverse=False)
-        else:
-            self.sortByLeft(contours, reverse=True)
-
+        contours = self.selectMainContour(outline.contours, args.mainContourType)
         mainContour = contours[0]
         mainBounds = mainContour.boundsRectangle
 
         # Make sure contour with the largest bounding rectangle has
         # an area that is at least 10% of the area of the bounding rectangle
         # of the whole glyph
-        outerAreaPercent = round(mainBounds.area / outlineBounds.area * 100.0, 3)
-        outerHeightPercent = round(mainBounds.height / outlineBounds.height * 100.0, 3)
-
-        if args.outdb:
-            glyphResults["main_contour_area_percent"] = outerAreaPercent
-            glyphResults["main_contour_height_percent"] = outerHeightPercent
+        outerAreaPercent, outerHeightPercent = self.mainContourPercents(
+            mainBounds, outlineBounds
+        )
+        sample.outerAreaPercent = outerAreaPercent
+        sample.outerHeightPercent = outerHeightPercent
 
-        if outerAreaPercent < 10.0 or outerHeightPercent < 50.0:
-            print(
-                f"{indent}The largest contour has an area that is only {outerAreaPercent}% of the total."
-            )
-            print(
-                f"{indent}The tallest contour has an height that is only {outerHeightPercent}% of the total."
-            )
-            if args.silent:
-                print()
+        glyphResults["main_contour_area_percent"] = outerAreaPercent
+        glyphResults["main_contour_height_percent"] = outerHeightPercent
 
-            if args.outdb:
-                if glyphNameSpec:
-                    testResults[glyphNameSpec] = glyphResults
-                args.outdb.close()
-
-            fig, ax = plt.subplots()
-            outlineCenter = outlineBounds.left + outlineBounds.width / 2
-            self.drawPathToAxis(path, outlineBounds, ax)
-            ax.text( # type: ignore
-                outlineCenter,
-                outlineBounds.top + 10,
-                f"{fullName}\n{charInfo}",
-                va="bottom",
-                ha="center",
-            )
-            ax.text( # type: ignore
-                outlineCenter,
-                outlineBounds.bottom - 10,
-                f"No main contour\nLargest area is {outerAreaPercent}% of the total\nTallest height is {outerHeightPercent}% of the total",
-                va="top",
-                ha="center",
-            )
-            ax.set_axis_off()
-            plt.savefig(svgName)
-            plt.close(fig)
-            return
+        if (
+            outerAreaPercent < minMainContourAreaPercent
+            or outerHeightPercent < minMainContourHeightPercent
+        ):
+            sample.rejected = True
+            return sample
 
-        curveList = [curve for curve in mainContour]
         innerContours: list[BContour] = []
         for contour in contours[1:]:
             contourBounds = contour.boundsRectangle
@@ -734,8 +1077,6 @@ class RasterSamplingTest(object):
                 and contourBounds.area / mainBounds.area >= 0.05
             ):
                 innerContours.append(contour)
-                for curve in contour:
-                    curveList.append(curve)
 
         doLeft, doRight = widthSelection[args.widthMethod]
 
@@ -756,42 +1097,47 @@ class RasterSamplingTest(object):
         interval = round(height * 0.02)
 
         left, _, right, _ = overallBounds.points
-        for y in range(lowerBound, upperBound, interval):
-            p1 = outline.xyPoint(left, y)
-            p2 = outline.xyPoint(right, y)
-            raster = outline.segmentFromPoints([p1, p2])
+        sample.left = left
+        sample.right = right
+
+        ys = range(lowerBound, upperBound, interval)
+        sampledContours = [mainContour] + innerContours
+        if args.engine == RasterSamplingTestArgs.engineBitmap:
+            spans = BitmapSpans(sampledContours, ys).spans
+            glyphResults["engine"] = args.engineName
+        else:
+            spans = self.analyticSpans(sampledContours, ys)
 
-            curvesAtY = self.curvesAtY(curveList, y)
-            if len(curvesAtY) == 0:
+        for y, span in zip(ys, spans):
+            if span is None:
                 missedRasterCount += 1
                 continue
 
-            intersections: list[typing.Optional[Point]] = [
-                c.intersectWithLine(raster) for c in curvesAtY
-            ]
-
-            leftmostCurve = self.leftmostPoint(intersections, outline)
-            p1 = typing.cast(Point, intersections[leftmostCurve])
-            direction = oppositeDirection[self.direction(curvesAtY[leftmostCurve])]
+            x1, leftX2, rightX2 = span
+            p1 = outline.xyPoint(x1, y)
 
             # missedLeft = missedRight = False
 
             if doLeft:
-                p2 = self.leftmostIntersection(intersections, curvesAtY, direction)
+                x2 = leftX2
 
-                if p1 != p2:
+                if x1 != x2:
+                    p2 = outline.xyPoint(x2, y)
                     rastersLeft.append(outline.segmentFromPoints([p1, p2]))
                 # else:
                 #     missedLeft = True
 
             if doRight:
-                p2 = self.rightmostIntersection(intersections, curvesAtY, direction)
+                x2 = rightX2
 
-                if p1 != p2:
+                if x1 != x2:
+                    p2 = outline.xyPoint(x2, y)
                     rastersRight.append(outline.segmentFromPoints([p1, p2]))
                 # else:
                 #     missedRight = True
 
+        sample.missedRasterCount = missedRasterCount
+
         innerBounds = None
         if (
             args.loopDetection
@@ -806,89 +1152,247 @@ class RasterSamplingTest(object):
         # bottomRight = (outlineBounds.right, outlineBounds.bottom)
         # aboutPoint = bottomLeft
 
-        wl: list[float] = []
-        wl1: list[float] = []
-        wl2: list[float] = []
-        widthsL: list[float] = []
-        rl: tuple[int, int] = (0, 0)
-
-        wr: list[float] = []
-        wr1: list[float] = []
-        wr2: list[float] = []
-        widthsR: list[float] = []
-        rr: tuple[int, int] = (0, 0)
-
         if doLeft:
-            wl, wl1, wl2, rl = self.autoRange(rastersLeft, outline)
-            if rl[0] >= 0 and rl[1] - rl[0] >= 5:
-                start = rl[0]
-                limit = rl[1] + 1
-            else:
-                start, limit = self.rangeFallback(
-                    args.range, outlineBounds, innerBounds
+            sample.sides.append(
+                self.rasterSide(
+                    "Left", rastersLeft, outline, outlineBounds, innerBounds
                 )
-
-            rastersLeft = rastersLeft[start:limit]
-            widthsL = wl[start:limit]
+            )
 
         if doRight:
-            wr, wr1, wr2, rr = self.autoRange(rastersRight, outline)
-            if rr[0] >= 0 and rr[1] - rr[0] >= 5:
-                start = rr[0]
-                limit = rr[1] + 1
-            else:
-                start, limit = self.rangeFallback(
-                    args.range, outlineBounds, innerBounds
+            sample.sides.append(
+                self.rasterSide(
+                    "Right", rastersRight, outline, outlineBounds, innerBounds
                 )
+            )
 
-            rastersRight = rastersRight[start:limit]
-            widthsR = wr[start:limit]
-
-        if doLeft and doRight:
-            midpointsL = self.midpoints(rastersLeft)
-            bL, aL, rValueL, pValueL, stdErrL = self.bestFit(midpointsL, outline)
-
-            midpointsR = self.midpoints(rastersRight)
-            bR, aR, rValueR, pValueR, stdErrR = self.bestFit(midpointsR, outline)
-
-            if round(stdErrL, 2) <= round(stdErrR, 2):
-                rasters = rastersLeft
-                chosenWidthMethod = "Left"
-                widths, midpoints, b, a, rValue, pValue, stdErr = (
-                    widthsL,
-                    midpointsL,
-                    bL,
-                    aL,
-                    rValueL,
-                    pValueL,
-                    stdErrL,
-                )
-                w, w1, w2, bestRange = wl, wl1, wl2, rl
-            else:
-                rasters = rastersRight
-                chosenWidthMethod = "Right"
-                widths, midpoints, b, a, rValue, pValue, stdErr = (
-                    widthsR,
-                    midpointsR,
-                    bR,
-                    aR,
-                    rValueR,
-                    pValueR,
-                    stdErrR,
-                )
-                w, w1, w2, bestRange = wr, wr1, wr2, rr
+        return sample
+
+    @classmethod
+    def analyticSpans(
+        cls, contours: list[BContour], ys: typing.Iterable[int]
+    ) -> typing.Iterator[typing.Optional[Span]]:
+        # Split every curve into pieces that are monotone in y once, up front,
+        # so each raster crosses each piece at most once.
+        edges = MonotoneEdges(contours)
+
+        for y in ys:
+            crossings = edges.crossingsAtY(y)
+            if len(crossings) == 0:
+                yield None
+                continue
+
+            # The leftmost crossing is on the left edge of the stroke. The right
+            # edge is on a piece that goes in the opposite direction.
+            x1, leftDirection = min(crossings)
+            direction = oppositeDirection[leftDirection]
+            oppositeXs = [x for x, d in crossings if d == direction]
+            if not oppositeXs:
+                # A raster with no width on either side
+                yield x1, x1, x1
+                continue
+
+            yield x1, min(oppositeXs), max(oppositeXs)
+
+    def rasterSide(
+        self,
+        name: str,
+        rasters: list[Bezier],
+        outline: BOutline,
+        outlineBounds: PathUtilities.BoundsRectangle,
+        innerBounds: typing.Optional[PathUtilities.BoundsRectangle],
+    ) -> RasterSide:
+        w, w1, w2, bestRange = self.autoRange(rasters, outline)
+        if bestRange[0] >= 0 and bestRange[1] - bestRange[0] >= 5:
+            start = bestRange[0]
+            limit = bestRange[1] + 1
         else:
-            if doLeft:
-                rasters = rastersLeft
-                chosenWidthMethod = "Left"
-                widths, w, w1, w2, bestRange = widthsL, wl, wl1, wl2, rl
+            start, limit = self.rangeFallback(
+                self._args.range, outlineBounds, innerBounds
+            )
+
+        return RasterSide(name, rasters, start, limit, w, w1, w2, bestRange)
+
+    @classmethod
+    def fitSide(cls, side: RasterSide, outline: BOutline) -> SideFit:
+        b, a, rValue, pValue, stdErr = cls.bestFit(side.midpoints, outline)
+
+        orthogonalDistances = [
+            distanceFromPointToLine(p, a, b) for p in side.midpoints
+        ]
+        meanOrthogonalDistance = statistics.mean(orthogonalDistances)
+        lmod = math.log1p(meanOrthogonalDistance)
+
+        widths = side.widths
+        quartiles = statistics.quantiles(widths, n=4, method="inclusive")
+        widthDict = {
+            "min": round(min(widths), 2),
+            "q1": round(quartiles[0], 2),
+            "median": round(quartiles[1], 2),
+            "mean": round(statistics.mean(widths), 2),
+            "q3": round(quartiles[2], 2),
+            "max": round(max(widths), 2),
+        }
+
+        return SideFit(b, a, rValue, pValue, stdErr, lmod, widthDict)
+
+    @classmethod
+    def fitSamples(
+        cls, samples: list[GlyphSample]
+    ) -> list[typing.Optional[list[SideFit]]]:
+        # Fit every side of every sample with one call to BatchFit.fitSegments()
+        # instead of one call to scipy.stats.linregress() per side.
+        segments = []
+        for sample in samples:
+            if not sample.needsFit:
+                continue
+            for side in sample.sides:
+                xs, ys = sample.outline.unzipPoints(side.midpoints)
+                segments.append((xs, ys, side.widths))
+
+        results = BatchFit.fitSegments(*BatchFit.packSegments(segments))
+
+        fits: list[typing.Optional[list[SideFit]]] = []
+        index = 0
+        for sample in samples:
+            if not sample.needsFit:
+                fits.append([])
+                continue
+
+            sideFits: typing.Optional[list[SideFit]] = []
+            for _ in sample.sides:
+                if sideFits is not None and results.isValid(index):
+                    b, a, rValue, pValue, stdErr = results.fit(index)
+                    lmod = float(results.lmod[index])
+                    widthDict = results.widthDict(index)
+                    sideFits.append(
+                        SideFit(b, a, rValue, pValue, stdErr, lmod, widthDict)
+                    )
+                else:
+                    sideFits = None
+                index += 1
+
+            fits.append(sideFits)
+
+        return fits
+
+    @classmethod
+    def bootstrapIntervals(
+        cls, sample: GlyphSample, side: RasterSide
+    ) -> tuple[typing.Optional[list[float]], ...]:
+        # Confidence intervals for the stroke angle, lmod and median width,
+        # from sample.bootstrap resamples of the side's rasters.
+        xs, ys = sample.outline.unzipPoints(side.midpoints)
+        resamples = BatchFit.bootstrapFit(
+            np.asarray(xs, dtype=float),
+            np.asarray(ys, dtype=float),
+            np.asarray(side.widths, dtype=float),
+            sample.bootstrap,
+        )
+
+        # The same angle finishGlyph() computes from the slope, for each resample
+        height = sample.outlineBounds.top - sample.outlineBounds.bottom
+        angles = np.degrees(np.arctan2(resamples.slope * height, height))
+        angleCI = BatchFit.percentileInterval(angles * sample.directionAdjust, 1)
+
+        return (
+            angleCI,
+            BatchFit.percentileInterval(resamples.lmod, 4),
+            BatchFit.percentileInterval(resamples.widthMedian, 2),
+        )
+
+    def fitSample(self, sample: GlyphSample) -> list[SideFit]:
+        return [self.fitSide(side, sample.outline) for side in sample.sides]
+
+    @classmethod
+    def glyphSamples(cls, sample: GlyphSample, chosen: int) -> GlyphSamples:
+        # Every raster on each side, not just the ones that were used, so the
+        # samples can be analyzed again with a different range or method.
+        # The differences are padded with NaN to the number of rasters.
+        sideColumns: list[dict[str, np.ndarray]] = []
+        for side in sample.sides:
+            rasterCount = len(side.w)
+            xs, ys = sample.outline.unzipPoints([r.midpoint for r in side.allRasters])
+            w1 = np.full(rasterCount, np.nan)
+            w1[: len(side.w1)] = side.w1
+            w2 = np.full(rasterCount, np.nan)
+            w2[: len(side.w2)] = side.w2
+            selected = np.zeros(rasterCount, dtype=bool)
+            selected[side.start : side.limit] = True
+
+            sideColumns.append(
+                {
+                    "side": np.full(rasterCount, sideNumbers[side.name], np.int8),
+                    "y": np.array(ys, dtype=np.float64),
+                    "midpoint_x": np.array(xs, dtype=np.float64),
+                    "width": np.array(side.w, dtype=np.float64),
+                    "width_diff1": w1,
+                    "width_diff2": w2,
+                    "selected": selected,
+                }
+            )
+
+        columns = {
+            name: np.concatenate([c[name] for c in sideColumns])
+            for name in sideColumns[0]
+        }
+        return GlyphSamples(sideNumbers[sample.sides[chosen].name], columns)
+
+    def finishGlyph(self, sample: GlyphSample, fits: typing.Optional[list[SideFit]]):
+        if sample.cached:
+            self.finishCachedGlyph(sample)
+            return
+
+        outdb = sample.outdb
+        glyphResults = sample.glyphResults
+        outlineBounds = sample.outlineBounds
+        charInfo = sample.charInfo
+
+        for message in sample.messages:
+            print(message)
+
+        if sample.rejected:
+            outerAreaPercent = sample.outerAreaPercent
+            outerHeightPercent = sample.outerHeightPercent
+            self.reportLine(
+                sample,
+                f"The largest contour has an area that is only {outerAreaPercent}% of the total.",
+            )
+            self.reportLine(
+                sample,
+                f"The tallest contour has an height that is only {outerHeightPercent}% of the total.",
+            )
+            if sample.silent:
+                print()
+
+            if outdb:
+                if sample.glyphNameSpec:
+                    outdb.setTestResults(
+                        sample.fontEntry, sample.glyphNameSpec, glyphResults
+                    )
+                outdb.flush()
+
+            if sample.renderPolicy.shouldRender(glyphResults):
+                self.renderFigure(sample, lambda: self.drawRejectedFigure(sample))
             else:
-                rasters = rastersRight
-                chosenWidthMethod = "Right"
-                widths, w, w1, w2, bestRange = widthsR, wr, wr1, wr2, rr
+                self.skipFigure(sample)
+            return
 
-            midpoints = self.midpoints(rasters)
-            b, a, rValue, pValue, stdErr = self.bestFit(midpoints, outline)
+        if not fits:
+            raise ValueError(f"Not enough rasters to fit a line to {charInfo}")
+
+        if len(fits) == 2:
+            fitL, fitR = fits
+            chosen = 0 if round(fitL.stdErr, 2) <= round(fitR.stdErr, 2) else 1
+        else:
+            chosen = 0
+
+        side = sample.sides[chosen]
+        fit = fits[chosen]
+        chosenWidthMethod = side.name
+        bestRange = side.bestRange
+        b, a, rValue, pValue, stdErr = fit.b, fit.a, fit.rValue, fit.pValue, fit.stdErr
+        lmod = fit.lmod
 
         my0 = outlineBounds.bottom
         myn = outlineBounds.top
@@ -897,79 +1401,141 @@ class RasterSamplingTest(object):
         mx0 = b * my0 + a
         mxn = b * myn + a
 
-        orthogonalDistances = [distanceFromPointToLine(p, a, b) for p in midpoints]
-        meanOrthogonalDistance = statistics.mean(orthogonalDistances)
-        lmod = math.log1p(meanOrthogonalDistance)
-
+        missedRasterCount = sample.missedRasterCount
         if missedRasterCount > 0:
-            print(f"{indent}{missedRasterCount} rasters did not intersect the glyph.")
+            self.reportLine(
+                sample, f"{missedRasterCount} rasters did not intersect the glyph."
+            )
 
-        print(
-            f"{indent}{chosenWidthMethod}: a = {round(a, 2)}, b = {round(b, 4)}, r_value = {round(rValue, 4)}, p_value = {round(pValue, 2)}, lmod = {round(lmod, 4)}"
+        self.reportLine(
+            sample,
+            f"{chosenWidthMethod}: a = {round(a, 2)}, b = {round(b, 4)}, r_value = {round(rValue, 4)}, p_value = {round(pValue, 2)}, lmod = {round(lmod, 4)}",
         )
 
         strokeAngle = (
             round(math.degrees(math.atan2(mxn - mx0, myn - my0)), 1)
-            * args.directionAdjust
+            * sample.directionAdjust
         )
 
-        if args.outdb:
-            glyphResults["chosen_width_method"] = chosenWidthMethod.lower()
-            glyphResults[
-                "raster_sample_range"
-            ] = f"{bestRange[0] * 2}-{bestRange[1] * 2}"
-            glyphResults["fit_results"] = {
-                "slope": round(b, 4),
-                "intercept": round(a, 2),
-                "r_value": round(rValue, 4),
-                "p_value": round(pValue, 4),
-                "std_err": round(stdErr, 4),
-                "log_mean_orthogonal_distance": round(lmod, 4),
-                "stroke_angle": strokeAngle,
-            }
+        glyphResults["chosen_width_method"] = chosenWidthMethod.lower()
+        glyphResults["raster_sample_range"] = f"{bestRange[0] * 2}-{bestRange[1] * 2}"
+        glyphResults["missed_raster_count"] = missedRasterCount
+        fitResults: dict[str, typing.Any] = {
+            "slope": round(b, 4),
+            "intercept": round(a, 2),
+            "r_value": round(rValue, 4),
+            "p_value": round(pValue, 4),
+            "std_err": round(stdErr, 4),
+            "log_mean_orthogonal_distance": round(lmod, 4),
+            "stroke_angle": strokeAngle,
+        }
+        glyphResults["fit_results"] = fitResults
 
-        avgWidth = round(statistics.mean(widths), 2)
-        quartiles = statistics.quantiles(widths, n=4, method="inclusive")
-        q1 = round(quartiles[0], 2)
-        median = round(quartiles[1], 2)
-        q3 = round(quartiles[2], 2)
-        minWidth = round(min(widths), 2)
-        maxWidth = round(max(widths), 2)
+        widthDict = fit.widthDict
 
-        print(f"{indent}angle = {strokeAngle}\u00B0")
+        self.reportLine(sample, f"angle = {strokeAngle}\u00B0")
 
-        widthDict = {
-            "min": minWidth,
-            "q1": q1,
-            "median": median,
-            "mean": avgWidth,
-            "q3": q3,
-            "max": maxWidth,
-        }
         widthsString = ", ".join([f"{k} = {v}" for k, v in widthDict.items()])
-        print(f"{indent}Widths: {widthsString}")
-        if args.silent:
+        self.reportLine(sample, f"Widths: {widthsString}")
+
+        widthResults: dict[str, typing.Any] = dict(widthDict)
+        if sample.bootstrap:
+            angleCI, lmodCI, medianCI = self.bootstrapIntervals(sample, side)
+            fitResults["stroke_angle_ci"] = angleCI
+            fitResults["log_mean_orthogonal_distance_ci"] = lmodCI
+            widthResults["median_ci"] = medianCI
+            self.reportLine(
+                sample,
+                f"{round(BatchFit.bootstrapConfidence * 100)}% intervals:"
+                f" angle = {angleCI}, lmod = {lmodCI}, median width = {medianCI}",
+            )
+
+        if sample.silent:
             print()
 
-        if args.outdb:
-            glyphResults["widths"] = widthDict
-            if glyphNameSpec:
-                testResults[glyphNameSpec] = glyphResults
+        glyphResults["widths"] = widthResults
+        if outdb:
+            if sample.glyphNameSpec:
+                outdb.setTestResults(
+                    sample.fontEntry, sample.glyphNameSpec, glyphResults
+                )
+                if sample.exportSamples:
+                    outdb.setSamples(
+                        sample.fontEntry,
+                        sample.glyphNameSpec,
+                        self.glyphSamples(sample, chosen),
+                    )
+
+            outdb.flush()
+
+        if sample.renderPolicy.shouldRender(glyphResults):
+            self.renderFigure(
+                sample, lambda: self.drawGlyphFigure(sample, side, fit, strokeAngle)
+            )
+        else:
+            self.skipFigure(sample)
 
-            if not args.silent:
-                args.outdb.close()
+    @classmethod
+    def drawRejectedFigure(cls, sample: GlyphSample) -> Figure:
+        outlineBounds = sample.outlineBounds
+        outerAreaPercent = sample.outerAreaPercent
+        outerHeightPercent = sample.outerHeightPercent
+
+        fig = cls.newFigure()
+        ax = fig.subplots()
+        outlineCenter = outlineBounds.left + outlineBounds.width / 2
+        cls.drawPathToAxis(sample.path, outlineBounds, ax)
+        ax.text( # type: ignore
+            outlineCenter,
+            outlineBounds.top + 10,
+            sample.title,
+            va="bottom",
+            ha="center",
+        )
+        ax.text( # type: ignore
+            outlineCenter,
+            outlineBounds.bottom - 10,
+            f"No main contour\nLargest area is {outerAreaPercent}% of the total\nTallest height is {outerHeightPercent}% of the total",
+            va="top",
+            ha="center",
+        )
+        ax.set_axis_off()
+        return fig
+
+    @classmethod
+    def drawGlyphFigure(
+        cls, sample: GlyphSample, side: RasterSide, fit: SideFit, strokeAngle: float
+    ) -> Figure:
+        # The full diagnostic graph: the outline with the rasters and the fitted
+        # line, the distribution of the stroke widths, and the sample range.
+        outlineBounds = sample.outlineBounds
+        rasters = side.rasters
+        chosenWidthMethod = side.name
+        widths, midpoints = side.widths, side.midpoints
+        w, w1, w2, bestRange = side.w, side.w1, side.w2, side.bestRange
+        b, a, lmod = fit.b, fit.a, fit.lmod
+        left, right = sample.left, sample.right
+
+        widthDict = fit.widthDict
+        avgWidth = widthDict["mean"]
+        median = widthDict["median"]
 
-        matplotlib.rcParams["axes.linewidth"] = lineWidth
+        my0 = outlineBounds.bottom
+        myn = outlineBounds.top
+
+        # x = by + a
+        mx0 = b * my0 + a
+        mxn = b * myn + a
 
         figWidth, figHeight = matplotlib.rcParams["figure.figsize"]
         figSize = (figWidth * 1.5, figHeight * 1.5)
 
-        fig = plt.figure(figsize=figSize, constrained_layout=True)
+        fig = cls.newFigure(figsize=figSize, constrained_layout=True)
         gs = GridSpec(5, 2, figure=fig, height_ratios=[5, 35, 10, 35, 15]) # type: ignore
-        fig.suptitle(f"{fullName}\n{charInfo}")
+        fig.suptitle(sample.title)
 
         ax1 = fig.add_subplot(gs[:, 0])
-        self.drawPathToAxis(path, outlineBounds, ax1)
+        cls.drawPathToAxis(sample.path, outlineBounds, ax1)
 
         for r in rasters:
             y = r.startY
@@ -1043,11 +1609,9 @@ class RasterSamplingTest(object):
             -0.5 * (1 / sigma * (bins - mu)) ** 2
         )
 
-        widths.sort()
+        widths = sorted(widths)
 
-        dens = statsmodels.api.nonparametric.KDEUnivariate(widths)
-        dens.fit(bw=0.9)
-        densVals = dens.evaluate(widths)
+        densVals = KernelDensity.densityAt(widths, widths, sample.kdeMethod)
 
         ax3.plot(bins, y, "m--", widths, densVals, "r--")
         ax3.vlines(
@@ -1106,8 +1670,140 @@ class RasterSamplingTest(object):
 
         # ax6.legend()
 
-        plt.savefig(svgName)
-        plt.close(fig)
+        for ax in fig.axes:
+            for spine in ax.spines.values():
+                spine.set_linewidth(lineWidth)
+
+        return fig
+
+    @classmethod
+    def reportLine(cls, sample: GlyphSample, line: str):
+        # The lines that report a glyph's results, which the cache
+        # keeps so it can report them again.
+        print(f"{sample.indent}{line}")
+        sample.report.append(line)
+
+    def cacheLookup(
+        self, sample: GlyphSample, key: str
+    ) -> typing.Optional[CachedResult]:
+        cache = sample.cache
+        assert cache
+
+        # The cache doesn't have the samples, so the glyph has to be tested
+        if sample.exportSamples:
+            return None
+
+        cached = cache.lookup(key)
+
+        # If the glyph should be rendered but was tested under a policy
+        # that didn't render it, the cache doesn't have its graph. The graph
+        # is titled with the font and character it was drawn for, so if the
+        # glyph was first tested in another font, or as another character,
+        # it's tested again to draw a graph with its own title.
+        if cached and not (
+            cache.hasSVG(key) and cached.get("svg_title") == sample.title
+        ):
+            results = sample.glyphResults | cached["results"]
+            if sample.renderPolicy.shouldRender(results):
+                return None
+
+        return cached
+
+    @classmethod
+    def drawThumbnail(cls, sample: GlyphSample) -> Figure:
+        # Just the outline, small, for a glyph that isn't rendered in full
+        outlineBounds = sample.outline.boundsRectangle
+        fig = cls.newFigure(figsize=(thumbnailSize, thumbnailSize))
+        ax = fig.subplots()
+        cls.drawPathToAxis(sample.path, outlineBounds, ax)
+        ax.set_axis_off()
+        return fig
+
+    @classmethod
+    def skipFigure(cls, sample: GlyphSample):
+        if sample.thumbnails:
+            cls.renderFigure(sample, lambda: cls.drawThumbnail(sample), full=False)
+        elif sample.cache and sample.cacheKey:
+            sample.cache.store(
+                sample.cacheKey,
+                sample.glyphResults,
+                sample.report,
+                sample.rejected,
+            )
+
+    @classmethod
+    def removeSVG(cls, sample: GlyphSample):
+        # The SVG may be a hard link to a file in the cache,
+        # so replace it rather than writing through the link.
+        if sample.cache and os.path.lexists(sample.svgName):
+            os.remove(sample.svgName)
+
+    @classmethod
+    def newFigure(cls, **kwargs) -> Figure:
+        # A figure with a canvas of its own rather than one from pyplot,
+        # so drawing it doesn't touch any global state, and several
+        # figures can be drawn at once on different threads.
+        fig = Figure(**kwargs)
+        FigureCanvasSVG(fig)
+        return fig
+
+    @classmethod
+    def renderFigure(
+        cls, sample: GlyphSample, draw: typing.Callable[[], Figure], full=True
+    ):
+        # Draw the figure and write it out. If there's a render queue, this
+        # happens on one of its threads while the next glyph is analyzed.
+        def render():
+            fig = draw()
+            cls.removeSVG(sample)
+            fig.savefig(sample.svgName)
+
+            if sample.cache and sample.cacheKey and not sample.cached:
+                sample.cache.store(
+                    sample.cacheKey,
+                    sample.glyphResults,
+                    sample.report,
+                    sample.rejected,
+                    sample.svgName if full else None,
+                    sample.title,
+                )
+
+        if sample.renderQueue:
+            sample.renderQueue.submit(sample.svgName, render)
+        else:
+            render()
+
+    def finishCachedGlyph(self, sample: GlyphSample):
+        cached = sample.cached
+        cache = sample.cache
+        outdb = sample.outdb
+        assert cached and cache and sample.cacheKey
+
+        for message in sample.messages:
+            print(message)
+
+        for line in cached["report"]:
+            print(f"{sample.indent}{line}")
+        if sample.silent:
+            print()
+
+        sample.glyphResults.update(cached["results"])
+        if outdb:
+            if sample.glyphNameSpec:
+                outdb.setTestResults(
+                    sample.fontEntry, sample.glyphNameSpec, sample.glyphResults
+                )
+            outdb.flush()
+
+        if sample.renderPolicy.shouldRender(sample.glyphResults):
+            cache.linkSVG(sample.cacheKey, sample.svgName)
+        elif sample.thumbnails:
+            self.renderFigure(sample, lambda: self.drawThumbnail(sample), full=False)
+
+    def run(self):
+        sample = self.sampleGlyph()
+        fits = self.fitSample(sample) if sample.needsFit else []
+        self.finishGlyph(sample, fits)
 
 
 def main():
@@ -1124,8 +1820,25 @@ def main():
         print(programName + ": " + str(error), file=stderr)
         exit(1)
 
+    if args.exportSamples and args.outdb:
+        args.outdb.exportSamples(os.path.join(args.outdir, sampleDirectoryName))
+
     test = RasterSamplingTest(args)
-    test.run()
+    if args.instances:
+        try:
+            test.setInstances(parseInstances(args.instances, test.font.ttFont))
+        except ValueError as error:
+            print(programName + ": " + str(error), file=stderr)
+            exit(1)
+
+        for index in range(len(test.instances)):
+            test.selectInstance(index)
+            test.run()
+    else:
+        test.run()
+
+    if args.outdb:
+        args.outdb.close()
 
 
 if __name__ == "__main__":
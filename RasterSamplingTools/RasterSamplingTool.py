@@ -6,19 +6,71 @@ Created on February 5, 2021
 @author Eric Mader
 """
 
+import typing
+
 import os
-import pathlib
+import time
+import contextlib
 from sys import argv, exit, stderr
 import pkg_resources
 from TestArguments.CommandLineArguments import CommandLineOption, CommandLineArgs
 
 from RasterSamplingTools import RasterSamplingTest
 from RasterSamplingTools.FontDatabase import FontDatabase
-from RasterSamplingTools.OutputDatabase import OutputDatabase
+from RasterSamplingTools.OutputDatabase import (
+    OutputDatabase,
+    OutputLog,
+    compactLog,
+    openOutputDatabase,
+)
+from RasterSamplingTools.GlyphIndex import GlyphIndex
+from RasterSamplingTools import GlyphPool
+from RasterSamplingTools.VariableFonts import isVariable, parseInstances
+from RasterSamplingTools.ResultCache import ResultCache
+from RasterSamplingTools.RenderPolicy import RenderPolicy
+from RasterSamplingTools.RenderQueue import RenderQueue, RenderError
+from RasterSamplingTools.MemoryProfile import MemoryProfile
+from RasterSamplingTools.Telemetry import Telemetry, defaultStatusInterval
+from RasterSamplingTools.FontDiscovery import FontDiscovery
+from RasterSamplingTools.WorkQueue import (
+    WorkQueue,
+    defaultLeaseTime,
+    stateDone,
+    stateFailed,
+    workerIDPattern,
+)
+from RasterSamplingTools.SampleExport import sampleDirectoryName
+from RasterSamplingTools.Scheduling import (
+    autoWorkerCount,
+    costFileName,
+    longestFirst,
+    readCosts,
+    writeCosts,
+)
+from RasterSamplingTools.Governor import (
+    Governor,
+    TestFailure,
+    TestJob,
+    failureError,
+    replayEvents,
+)
 
 _usage = """
 Usage:
-rastersamplingtool --input inputPath --output outputPath
+rastersamplingtool --input inputPath --output outputPath [--batchFit]
+    [--manifest manifestPath.json]
+    [--queue queuePath.sqlite [--workerID id] [--leaseTime seconds]]
+    [--outputFormat (json | jsonl)]
+    [--testTimeout seconds] [--memoryLimit megabytes] [--recycleAfter testCount]
+    [--glyphWorkers (workerCount | auto)] [--outlineArena] [--allGlyphs]
+    [--instances (named | tag=values[/tag=values...])]
+    [--cache cacheDirectoryPath [--cacheSize megabytes]]
+    [--render (all | none | anomalies | rule[,rule...])] [--thumbnails]
+    [--renderThreads threadCount] [--samples] [--bootstrap resampleCount]
+    [--engine (analytic | bitmap)]
+    [--memoryProfile profilePath [--memorySample fontCount]]
+    [--statusFile statusPath.json] [--metricsFile metricsPath.prom]
+    [--statusInterval seconds]
 """
 
 
@@ -30,14 +82,256 @@ class RasterSamplingToolArgs(CommandLineArgs):
         CommandLineOption(
             "output", None, lambda a: a.nextExtra("output directory"), "outputDir", None
         ),
+        CommandLineOption("batchFit", None, True, "batchFit", False, required=False),
+        CommandLineOption("allGlyphs", None, True, "allGlyphs", False, required=False),
+        CommandLineOption(
+            "instances",
+            None,
+            lambda a: a.nextExtra("instances"),
+            "instances",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "cache",
+            None,
+            lambda a: a.nextExtra("cache directory"),
+            "cacheDir",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "cacheSize",
+            lambda s, a: s.processPositive(a, int, "cache size"),
+            lambda a: a.nextExtra("cache size"),
+            "cacheSize",
+            1024,
+            required=False,
+        ),
+        CommandLineOption(
+            "render",
+            lambda s, a: RenderPolicy.fromSpec(a),
+            lambda a: a.nextExtra("render policy"),
+            "renderPolicy",
+            "all",
+            required=False,
+        ),
+        CommandLineOption(
+            "thumbnails", None, True, "thumbnails", False, required=False
+        ),
+        CommandLineOption(
+            "manifest",
+            None,
+            lambda a: a.nextExtra("manifest file"),
+            "manifest",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "queue",
+            None,
+            lambda a: a.nextExtra("queue file"),
+            "queue",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "workerID",
+            lambda s, a: s.processWorkerID(a),
+            lambda a: a.nextExtra("worker ID"),
+            "workerID",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "leaseTime",
+            lambda s, a: s.processPositive(a, float, "lease time"),
+            lambda a: a.nextExtra("lease time"),
+            "leaseTime",
+            defaultLeaseTime,
+            required=False,
+        ),
+        CommandLineOption(
+            "samples", None, True, "exportSamples", False, required=False
+        ),
+        CommandLineOption(
+            "engine",
+            lambda s, a: CommandLineOption.valueFromDict(
+                RasterSamplingTest.RasterSamplingTestArgs.engines, a, "engine"
+            ),
+            lambda a: a.nextExtra("engine"),
+            "engine",
+            "analytic",
+            required=False,
+        ),
+        CommandLineOption(
+            "bootstrap",
+            lambda s, a: s.processPositive(a, int, "resample count"),
+            lambda a: a.nextExtra("resample count"),
+            "bootstrap",
+            0,
+            required=False,
+        ),
+        CommandLineOption(
+            "renderThreads",
+            lambda s, a: s.processPositive(a, int, "thread count"),
+            lambda a: a.nextExtra("thread count"),
+            "renderThreads",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "memoryProfile",
+            None,
+            lambda a: a.nextExtra("memory profile"),
+            "memoryProfile",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "memorySample",
+            lambda s, a: s.processPositive(a, int, "font count"),
+            lambda a: a.nextExtra("font count"),
+            "memorySample",
+            1,
+            required=False,
+        ),
+        CommandLineOption(
+            "statusFile",
+            None,
+            lambda a: a.nextExtra("status file"),
+            "statusFile",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "metricsFile",
+            None,
+            lambda a: a.nextExtra("metrics file"),
+            "metricsFile",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "statusInterval",
+            lambda s, a: s.processPositive(a, float, "status interval"),
+            lambda a: a.nextExtra("status interval"),
+            "statusInterval",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "outputFormat",
+            lambda s, a: CommandLineOption.valueFromDict(
+                s.outputFormats, a, "output format"
+            ),
+            lambda a: a.nextExtra("output format"),
+            "outputExtension",
+            "json",
+            required=False,
+        ),
+        CommandLineOption(
+            "testTimeout",
+            lambda s, a: s.processPositive(a, float, "test timeout"),
+            lambda a: a.nextExtra("test timeout"),
+            "testTimeout",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "memoryLimit",
+            lambda s, a: s.processPositive(a, int, "memory limit"),
+            lambda a: a.nextExtra("memory limit"),
+            "memoryLimit",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "recycleAfter",
+            lambda s, a: s.processPositive(a, int, "test count"),
+            lambda a: a.nextExtra("test count"),
+            "recycleAfter",
+            None,
+            required=False,
+        ),
+        CommandLineOption(
+            "glyphWorkers",
+            lambda s, a: s.processWorkerCount(a),
+            lambda a: a.nextExtra("worker count"),
+            "glyphWorkers",
+            1,
+            required=False,
+        ),
+        CommandLineOption(
+            "outlineArena", None, True, "outlineArena", False, required=False
+        ),
     ]
 
+    outputFormats = {"json": ".json", "jsonl": ".jsonl"}
+
     def __init__(self):
         self.inputDir = ""
         self.outputDir = ""
+        self.batchFit = False
+        self.allGlyphs = False
+        self.instances: typing.Optional[str] = None
+        self.cacheDir: typing.Optional[str] = None
+        self.cacheSize = 1024
+        self.renderPolicy = RenderPolicy()
+        self.thumbnails = False
+        self.manifest: typing.Optional[str] = None
+        self.queue: typing.Optional[str] = None
+        self.workerID: typing.Optional[str] = None
+        self.leaseTime = defaultLeaseTime
+        self.exportSamples = False
+        self.bootstrap = 0
+        self.engine = RasterSamplingTest.RasterSamplingTestArgs.engineAnalytic
+        self.renderThreads: typing.Optional[int] = None
+        self.memoryProfile: typing.Optional[str] = None
+        self.memorySample = 1
+        self.statusFile: typing.Optional[str] = None
+        self.metricsFile: typing.Optional[str] = None
+        self.statusInterval = defaultStatusInterval
+        self.outputExtension = ".json"
+        self.testTimeout: typing.Optional[float] = None
+        self.memoryLimit: typing.Optional[int] = None
+        self.recycleAfter: typing.Optional[int] = None
+        self.glyphWorkers = 1
+        self.outlineArena = False
         CommandLineArgs.__init__(self)
         self._options.extend(RasterSamplingToolArgs.options)
 
+    @staticmethod
+    def processPositive(spec: str, kind: typing.Callable[[str], typing.Any], name: str):
+        try:
+            value = kind(spec)
+        except ValueError:
+            value = 0
+
+        if value > 0:
+            return value
+
+        raise ValueError(f'Invalid {name}: "{spec}"')
+
+    @classmethod
+    def processWorkerCount(cls, spec: str) -> int:
+        # auto picks as many workers as the CPUs and free memory allow
+        if spec == "auto":
+            return autoWorkerCount()
+        return cls.processPositive(spec, int, "worker count")
+
+    @staticmethod
+    def processWorkerID(spec: str) -> str:
+        # It's part of the name of the worker's output log
+        if workerIDPattern.fullmatch(spec):
+            return spec
+
+        raise ValueError(f'Invalid worker ID: "{spec}"')
+
+    @property
+    def governed(self) -> bool:
+        return bool(self.testTimeout or self.memoryLimit or self.recycleAfter)
+
 
 # def checkGlyph(testArgs, testFont):
 #     if testArgs.glyphName: return testFont.hasGlyphName(testArgs.glyphName)
@@ -46,6 +340,296 @@ class RasterSamplingToolArgs(CommandLineArgs):
 #     return False
 
 
+def testProps(db: FontDatabase, test: FontDatabase.Test) -> dict[str, typing.Any]:
+    glyph, range, widthMethod, mainContour, direction, loopDetect = db.getTest(test)
+
+    return {
+        "glyphSpec": test.get("glyph_spec", glyph),
+        "range": range,
+        "widthMethod": widthMethod,
+        "mainContourType": mainContour,
+        "directionAdjust": direction,
+        "loopDetection": loopDetect,
+    }
+
+
+def setTestProps(
+    db: FontDatabase,
+    test: FontDatabase.Test,
+    testArgs: RasterSamplingTest.RasterSamplingTestArgs,
+):
+    testArgs.setProps(testProps(db, test))
+
+
+def testGlyphNames(
+    rasterTest: RasterSamplingTest.RasterSamplingTest, tests: list[FontDatabase.Test]
+) -> list[str]:
+    glyphIndex: GlyphIndex = rasterTest.glyphIndex
+    glyphInfos = [glyphIndex.resolve(test["glyph"]) for test in tests]
+    return [glyphInfo.name for glyphInfo in glyphInfos if glyphInfo]
+
+
+def errorFailure(error: Exception, start: float) -> TestFailure:
+    return TestFailure(
+        failureError, f"{type(error).__name__}: {error}", time.monotonic() - start
+    )
+
+
+def recordFailure(
+    outdb: OutputDatabase,
+    rasterTest: RasterSamplingTest.RasterSamplingTest,
+    test: FontDatabase.Test,
+    failure: TestFailure,
+):
+    # Record the failure in place of the glyph's results, with
+    # enough about the glyph that Summarize can still use it.
+    glyphIndex: GlyphIndex = rasterTest.glyphIndex
+    glyphNameSpec = test["glyph"]
+    glyphInfo = glyphIndex.resolve(glyphNameSpec)
+
+    results: OutputDatabase.TestResults = {}
+    if glyphInfo:
+        results["code_points"] = glyphInfo.codePoints
+        results["glyph_id"] = glyphInfo.glyphID
+    results["failure"] = failure.asDict()
+
+    outdb.setTestResults(rasterTest.fontEntry(outdb), glyphNameSpec, results)
+    outdb.flush()
+
+
+def prefilterTests(
+    outdb: OutputDatabase,
+    rasterTest: RasterSamplingTest.RasterSamplingTest,
+    tests: list[FontDatabase.Test],
+) -> list[FontDatabase.Test]:
+    # Weed out the glyphs that can't have a usable vertical stroke before
+    # doing any rastering or fitting, and record why each one was rejected.
+    mainContourTypes = RasterSamplingTest.RasterSamplingTestArgs.mainContourTypes
+    candidates: list[FontDatabase.Test] = []
+    rejected: dict[str, str] = {}
+
+    for test in tests:
+        glyphNameSpec = test["glyph"]
+        reason = rasterTest.prefilterGlyph(
+            glyphNameSpec[1:], mainContourTypes[test["main_contour"]]
+        )
+        if reason:
+            rejected[glyphNameSpec] = reason
+        else:
+            candidates.append(test)
+
+    print(f"    {len(candidates)} of {len(tests)} other glyphs passed the prefilter.")
+    outdb.setFontValue(
+        outdb.getEntry(rasterTest.font),
+        "prefilter",
+        {
+            "glyph_count": len(tests),
+            "candidate_count": len(candidates),
+            "rejected": rejected,
+        },
+    )
+
+    return candidates
+
+
+@contextlib.contextmanager
+def sharedOutlines(
+    rasterTest: RasterSamplingTest.RasterSamplingTest,
+    tests: list[FontDatabase.Test],
+    enabled: bool,
+):
+    # Extract the outlines of the font's test glyphs once, into
+    # shared memory that all of the worker processes can read.
+    if not enabled:
+        yield
+        return
+
+    arena = rasterTest.createOutlineArena(testGlyphNames(rasterTest, tests))
+    rasterTest.outlineArena = arena
+    try:
+        yield
+    finally:
+        rasterTest.outlineArena = None
+        arena.close()
+
+
+def workerLogFile(outputDir: str, workerID: str) -> str:
+    return os.path.join(outputDir, f"OutputDatabase.{workerID}.jsonl")
+
+
+def finishWorker(workQueue: WorkQueue, outputDir: str):
+    # Compact this worker's log into the output database, along with the
+    # logs of any workers that died before they could compact their own.
+    dbFile = os.path.join(outputDir, "OutputDatabase.json")
+    # Theirs go first, so that where we tested the same glyphs, ours win.
+    with workQueue.exclusive():
+        writeCosts(os.path.join(outputDir, costFileName), workQueue.costs())
+        for workerID in workQueue.deadWorkers():
+            print(f"Compacting the results of {workerID}, which stopped responding.")
+            compactLog(workerLogFile(outputDir, workerID), dbFile)
+        compactLog(workerLogFile(outputDir, workQueue.workerID), dbFile)
+        workQueue.leave()
+
+    counts = workQueue.counts()
+    print(
+        f"Queue: {counts.get(stateDone, 0)} font files done,"
+        f" {workQueue.remainingCount} left, {counts.get(stateFailed, 0)} given up on."
+    )
+    workQueue.close()
+
+
+def reportRenderErrors(errors: list[RenderError]):
+    for svgName, error in errors:
+        print(
+            f"Couldn't write {os.path.basename(svgName)}:"
+            f" {type(error).__name__}: {error}\n"
+        )
+
+
+@contextlib.contextmanager
+def runStage(name: str, memoryProfile: MemoryProfile, telemetry: Telemetry):
+    with memoryProfile.stage(name), telemetry.stage(name):
+        yield
+
+
+def runTestsBatched(
+    db: FontDatabase,
+    telemetry: Telemetry,
+    tests: list[FontDatabase.Test],
+    testArgs: RasterSamplingTest.RasterSamplingTestArgs,
+    rasterTest: RasterSamplingTest.RasterSamplingTest,
+) -> tuple[int, int]:
+    # Sample every glyph first, then fit all of them with one batched call,
+    # then report them in the original order.
+    failedCount = 0
+    outdb = testArgs.outdb
+    samples: list[typing.Optional[RasterSamplingTest.GlyphSample]] = []
+    failures: list[typing.Optional[TestFailure]] = []
+    sampleTimes: list[float] = []
+    for test in tests:
+        start = time.monotonic()
+        try:
+            setTestProps(db, test, testArgs)
+            samples.append(rasterTest.sampleGlyph())
+            failures.append(None)
+        except Exception as error:
+            samples.append(None)
+            failures.append(errorFailure(error, start))
+        finally:
+            testArgs.colon = False
+            testArgs.showFullName = False
+        sampleTimes.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    goodSamples = [sample for sample in samples if sample is not None]
+    fits = iter(RasterSamplingTest.RasterSamplingTest.fitSamples(goodSamples))
+
+    # Each test gets an equal share of the batched fit
+    fitTime = (time.monotonic() - start) / max(len(goodSamples), 1)
+
+    for test, sample, failure, sampleTime in zip(tests, samples, failures, sampleTimes):
+        start = time.monotonic()
+        try:
+            if sample is not None:
+                rasterTest.finishGlyph(sample, next(fits))
+        except Exception as error:
+            failure = errorFailure(error, start)
+
+        if failure:
+            failedCount += 1
+            print("Failed\n")
+            if outdb:
+                recordFailure(outdb, rasterTest, test, failure)
+
+        elapsed = sampleTime + time.monotonic() - start
+        telemetry.testFinished(elapsed + (fitTime if sample else 0.0), failure)
+
+    return len(tests), failedCount
+
+
+def runTests(
+    toolArgs: RasterSamplingToolArgs,
+    db: FontDatabase,
+    outdb: OutputDatabase,
+    governor: typing.Optional[Governor],
+    telemetry: Telemetry,
+    testArgs: RasterSamplingTest.RasterSamplingTestArgs,
+    rasterTest: RasterSamplingTest.RasterSamplingTest,
+    tests: list[FontDatabase.Test],
+) -> tuple[int, int]:
+    if toolArgs.batchFit:
+        return runTestsBatched(db, telemetry, tests, testArgs, rasterTest)
+
+    testCount = failedCount = 0
+    if toolArgs.glyphWorkers > 1:
+        results = GlyphPool.runTests(
+            rasterTest,
+            testArgs,
+            [testProps(db, test) for test in tests],
+            toolArgs.glyphWorkers,
+        )
+        for test, (output, events, failure, elapsed, pid) in zip(tests, results):
+            print(output, end="")
+            replayEvents(events, outdb)
+
+            if failure:
+                failedCount += 1
+                print("Failed\n")
+                recordFailure(outdb, rasterTest, test, failure)
+
+            telemetry.testFinished(elapsed, failure, f"pool-{pid}")
+            testCount += 1
+
+        testArgs.colon = False
+        testArgs.showFullName = False
+    elif governor:
+        arena = rasterTest.outlineArena
+        for test in tests:
+            job = TestJob(
+                testArgs.fontFile,
+                testArgs.fontNumber,
+                testArgs.outdir,
+                testProps(db, test),
+                testArgs.colon,
+                toolArgs.instances,
+                rasterTest.instanceIndex,
+                arena.descriptor if arena else None,
+            )
+            start = time.monotonic()
+            events, failure = governor.runTest(job)
+            replayEvents(events, outdb)
+            testArgs.colon = False
+            testArgs.showFullName = False
+
+            if failure:
+                failedCount += 1
+                print(f"Failed ({failure.reason}): {failure.message}\n")
+                recordFailure(outdb, rasterTest, test, failure)
+
+            telemetry.testFinished(time.monotonic() - start, failure, "governor")
+            testCount += 1
+    else:
+        for test in tests:
+            start = time.monotonic()
+            failure = None
+            try:
+                setTestProps(db, test, testArgs)
+                rasterTest.run()
+            except Exception as error:
+                failure = errorFailure(error, start)
+                failedCount += 1
+                print("Failed\n")
+                recordFailure(outdb, rasterTest, test, failure)
+            finally:
+                testArgs.colon = False
+                testArgs.showFullName = False
+
+            telemetry.testFinished(time.monotonic() - start, failure)
+            testCount += 1
+
+    return testCount, failedCount
+
+
 def main():
     argumentList = argv
     # args = None
@@ -61,15 +645,126 @@ def main():
         print(programName + ": " + str(error), file=stderr)
         exit(1)
 
+    if toolArgs.batchFit and toolArgs.governed:
+        print(
+            f"{programName}: --batchFit can't be used with per-test limits.",
+            file=stderr,
+        )
+        exit(1)
+
+    if toolArgs.glyphWorkers > 1 and (toolArgs.batchFit or toolArgs.governed):
+        print(
+            f"{programName}: --glyphWorkers can't be used with --batchFit"
+            " or per-test limits.",
+            file=stderr,
+        )
+        exit(1)
+
+    if toolArgs.renderThreads and (toolArgs.glyphWorkers > 1 or toolArgs.governed):
+        print(
+            f"{programName}: --renderThreads can't be used with --glyphWorkers"
+            " or per-test limits.",
+            file=stderr,
+        )
+        exit(1)
+
+    if toolArgs.outlineArena and not (toolArgs.glyphWorkers > 1 or toolArgs.governed):
+        print(
+            f"{programName}: --outlineArena needs --glyphWorkers or per-test limits.",
+            file=stderr,
+        )
+        exit(1)
+
+    if toolArgs.glyphWorkers > 1 and not GlyphPool.available():
+        print(
+            f"{programName}: --glyphWorkers isn't supported on this platform,"
+            " running the tests serially.",
+            file=stderr,
+        )
+        toolArgs.glyphWorkers = 1
+
+    cache = None
+    if toolArgs.cacheDir:
+        cache = ResultCache(toolArgs.cacheDir, toolArgs.cacheSize * 1024 * 1024)
+
+    testSettings: dict[str, typing.Any] = {
+        "cache": cache,
+        "renderPolicy": toolArgs.renderPolicy,
+        "thumbnails": toolArgs.thumbnails,
+        "exportSamples": toolArgs.exportSamples,
+        "bootstrap": toolArgs.bootstrap,
+        "engine": toolArgs.engine,
+    }
+
+    # The graphs are drawn on these threads while the next glyphs are tested.
+    # Worker processes draw their own graphs, so they don't get the queue.
+    renderQueue = None
+    if toolArgs.renderThreads:
+        renderQueue = RenderQueue(toolArgs.renderThreads)
+
+    memoryProfile = MemoryProfile(
+        toolArgs.memorySample if toolArgs.memoryProfile else 0
+    )
+
+    governor = None
+    if toolArgs.governed:
+        governor = Governor(
+            toolArgs.testTimeout,
+            toolArgs.memoryLimit * 1024 * 1024 if toolArgs.memoryLimit else None,
+            toolArgs.recycleAfter,
+            testSettings,
+        )
+
     testCount = failedCount = 0
     db = FontDatabase(
         pkg_resources.resource_filename("RasterSamplingTools", "FontDatabase.json")
     )
-    outdb = OutputDatabase(os.path.join(toolArgs.outputDir, "OutputDatabase.json"))
+    workQueue = None
+    if toolArgs.queue:
+        # Each worker logs its results separately, and they're
+        # compacted into the output database one at a time.
+        workQueue = WorkQueue(
+            toolArgs.queue, toolArgs.inputDir, toolArgs.workerID, toolArgs.leaseTime
+        )
+        outdb = OutputLog(
+            workerLogFile(toolArgs.outputDir, workQueue.workerID),
+            os.path.join(toolArgs.outputDir, "OutputDatabase.json"),
+            False,
+        )
+    else:
+        outdb = openOutputDatabase(
+            os.path.join(
+                toolArgs.outputDir, "OutputDatabase" + toolArgs.outputExtension
+            )
+        )
+    if toolArgs.exportSamples:
+        outdb.exportSamples(os.path.join(toolArgs.outputDir, sampleDirectoryName))
+
+    telemetry = Telemetry(
+        toolArgs.statusFile, toolArgs.metricsFile, toolArgs.statusInterval
+    )
+
+    # Find all of the fonts first, so the telemetry can estimate the time left.
+    # A file that's in more than one place is only tested once.
+    # With a queue, the first worker to start finds them for all of the workers.
+    if workQueue:
+        if workQueue.empty:
+            # Biggest first, going by the times in the last runs
+            fontFiles = FontDiscovery(toolArgs.inputDir, toolArgs.manifest).fontFiles()
+            costs = readCosts(os.path.join(toolArgs.outputDir, costFileName))
+            workQueue.addFonts(
+                longestFirst(fontFiles, costs, db.defaultTestCount, toolArgs.allGlyphs)
+            )
+        telemetry.startRun(workQueue.remainingCount)
+        fontFiles = workQueue.leasedFontFiles()
+    else:
+        fontFiles = FontDiscovery(toolArgs.inputDir, toolArgs.manifest).fontFiles()
+        telemetry.startRun(len(fontFiles))
 
-    for path in pathlib.Path(toolArgs.inputDir).rglob("*.[otOT][tT][cfCF]"):
+    for fontFile in fontFiles:
+        path = fontFile.path
         testArgs = RasterSamplingTest.RasterSamplingTestArgs()
-        testArgs.fontFile = str(path)
+        testArgs.fontFile = path
         testArgs.fontName = None
         testArgs.fontNumber = 0
         testArgs.debug = False
@@ -80,60 +775,104 @@ def main():
         testArgs.outdb = outdb
         testArgs.silent = True
         testArgs.autoRangeOff = False
+        for name, value in testSettings.items():
+            setattr(testArgs, name, value)
+        testArgs.renderQueue = renderQueue
         os.makedirs(testArgs.outdir, exist_ok=True)
 
         print(f"{os.path.relpath(path, toolArgs.inputDir)}:")
+        for duplicatePath in fontFile.paths[1:]:
+            print(f"    Also found as {duplicatePath}, which won't be tested again.")
 
         while True:
+            memoryProfile.startFont(testArgs.fontFile, testArgs.fontNumber)
+            telemetry.startFont(f"{testArgs.fontFile}#{testArgs.fontNumber}")
             try:
-                testArgs.colon = True
-                testArgs.showFullName = True
-                rasterTest = RasterSamplingTest.RasterSamplingTest(testArgs)
-                testFont = rasterTest.font
-                info = db.getFontInfo(testFont)
-                tests = db.getTests(testFont, info)
-                for test in tests:
+                with runStage("open", memoryProfile, telemetry):
+                    testArgs.colon = True
+                    testArgs.showFullName = True
+                    rasterTest = RasterSamplingTest.RasterSamplingTest(testArgs)
+                    testFont = rasterTest.font
+                    info = db.getFontInfo(testFont)
+                    tests = db.getTests(testFont, info, rasterTest.glyphIndex)
+                memoryProfile.setFontName(testFont.postscriptName)
+
+                if toolArgs.allGlyphs:
+                    with runStage("prefilter", memoryProfile, telemetry):
+                        unlistedTests = db.getUnlistedTests(
+                            testFont, info, tests, rasterTest.glyphIndex
+                        )
+                        tests.extend(prefilterTests(outdb, rasterTest, unlistedTests))
+
+                instanceIndices: list[typing.Optional[int]] = [None]
+                if toolArgs.instances and isVariable(testFont.ttFont):
                     try:
-                        (
-                            glyph,
-                            range,
-                            widthMethod,
-                            mainContour,
-                            direction,
-                            loopDetect,
-                        ) = db.getTest(test)
-
-                        propsDict = {
-                            "glyphSpec": glyph,
-                            "range": range,
-                            "widthMethod": widthMethod,
-                            "mainContourType": mainContour,
-                            "directionAdjust": direction,
-                            "loopDetection": loopDetect,
-                        }
-
-                        testArgs.setProps(propsDict)
-                        rasterTest.run()
-                    except:
-                        failedCount += 1
-                        print("Failed\n")
-                    finally:
-                        testArgs.colon = False
-                        testArgs.showFullName = False
-
-                    testCount += 1
+                        rasterTest.setInstances(
+                            parseInstances(toolArgs.instances, testFont.ttFont)
+                        )
+                        instanceIndices = list(range(len(rasterTest.instances)))
+                    except ValueError as error:
+                        print(f"    {error}, so only testing the default instance.")
+
+                with runStage("tests", memoryProfile, telemetry), sharedOutlines(
+                    rasterTest, tests, toolArgs.outlineArena
+                ):
+                    for instanceIndex in instanceIndices:
+                        rasterTest.selectInstance(instanceIndex)
+                        if len(fontFile.paths) > 1:
+                            outdb.setFontValue(
+                                rasterTest.fontEntry(outdb),
+                                "font_files",
+                                fontFile.paths,
+                            )
+                        testArgs.colon = True
+                        testArgs.showFullName = True
+                        fontCount, fontFailures = runTests(
+                            toolArgs,
+                            db,
+                            outdb,
+                            governor,
+                            telemetry,
+                            testArgs,
+                            rasterTest,
+                            tests,
+                        )
+                        testCount += fontCount
+                        failedCount += fontFailures
+
+                if renderQueue:
+                    with runStage("render", memoryProfile, telemetry):
+                        reportRenderErrors(renderQueue.drain())
 
             except StopIteration:
+                memoryProfile.abandonFont()
                 break
 
+            memoryProfile.finishFont()
+            telemetry.finishFont()
+
             if not (
                 testArgs.fontFile.endswith(".ttc") or testArgs.fontFile.endswith("otc")
             ):
                 break
             testArgs.fontNumber += 1
 
+        telemetry.finishFontFile()
+
+    if governor:
+        governor.stop()
+
+    if renderQueue:
+        reportRenderErrors(renderQueue.shutdown())
+
     print(f"{testCount} tests, {failedCount} failures.")
     outdb.close()
+    if workQueue:
+        finishWorker(workQueue, toolArgs.outputDir)
+    telemetry.close()
+
+    if toolArgs.memoryProfile:
+        memoryProfile.write(toolArgs.memoryProfile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""\
+Decide which glyphs get a full diagnostic graph
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import re
+import math
+import operator
+
+GlyphResults = dict[str, typing.Any]
+
+renderAll = "all"
+renderNone = "none"
+renderAnomalies = "anomalies"
+
+# Short names for fields that are nested in a glyph's results
+fieldAliases = {
+    "slope": "fit_results.slope",
+    "r_value": "fit_results.r_value",
+    "p_value": "fit_results.p_value",
+    "std_err": "fit_results.std_err",
+    "lmod": "fit_results.log_mean_orthogonal_distance",
+    "stroke_angle": "fit_results.stroke_angle",
+}
+
+# The rules used by "--render anomalies": a poor line fit, no main contour,
+# rasters that missed the glyph, or stroke widths that vary a lot.
+# There's no rule for a low r_value: the fit is of x against y, so an
+# upright stem, where x hardly changes, has an r near 0 however well the
+# line fits. lmod measures how far the midpoints are from the line instead.
+anomalyRules = [
+    "lmod>0.5",
+    "main_contour_area_percent<10",
+    "main_contour_height_percent<50",
+    "missed_raster_count>0",
+    "width_spread>0.25",
+]
+
+ruleOperators: dict[str, typing.Callable[[typing.Any, typing.Any], bool]] = {
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+
+
+def widthSpread(results: GlyphResults) -> typing.Optional[float]:
+    # The interquartile range of the stroke widths, relative to the median
+    widths = results.get("widths")
+    if not widths or not widths.get("median"):
+        return None
+    return (widths["q3"] - widths["q1"]) / widths["median"]
+
+
+# Fields that are computed from a glyph's results
+derivedFields: dict[str, typing.Callable[[GlyphResults], typing.Any]] = {
+    "width_spread": widthSpread,
+}
+
+
+def fieldValue(results: GlyphResults, field: str) -> typing.Any:
+    if field in derivedFields:
+        return derivedFields[field](results)
+
+    value: typing.Any = results
+    for key in fieldAliases.get(field, field).split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+class RenderRule(object):
+    __slots__ = "field", "operatorName", "threshold"
+
+    def __init__(self, field: str, operatorName: str, threshold: float):
+        self.field = field
+        self.operatorName = operatorName
+        self.threshold = threshold
+
+    @classmethod
+    def fromSpec(cls, spec: str) -> "RenderRule":
+        m = re.fullmatch(r"\s*([A-Za-z_][A-Za-z0-9_.]*)\s*(<=|>=|==|!=|<|>)(.+)", spec)
+        if not m:
+            raise ValueError(f'Invalid render rule: "{spec}"')
+
+        try:
+            threshold = float(m.group(3))
+        except ValueError:
+            raise ValueError(f'Invalid threshold in render rule: "{spec}"')
+
+        return RenderRule(m.group(1), m.group(2), threshold)
+
+    def matches(self, results: GlyphResults) -> bool:
+        # A glyph without the field, or with a value that isn't
+        # a number, doesn't match the rule.
+        value = fieldValue(results, self.field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        if math.isnan(value):
+            return False
+        return ruleOperators[self.operatorName](value, self.threshold)
+
+    def __str__(self) -> str:
+        return f"{self.field}{self.operatorName}{self.threshold:g}"
+
+
+class RenderPolicy(object):
+    __slots__ = ("rules",)
+
+    def __init__(self, rules: typing.Optional[list[RenderRule]] = None):
+        # rules is None to render every glyph. Otherwise a glyph is
+        # rendered if it matches any of the rules.
+        self.rules = rules
+
+    @classmethod
+    def fromSpec(cls, spec: str) -> "RenderPolicy":
+        # spec is "all", "none", "anomalies", or a comma separated
+        # list of rules like "lmod>0.5,r_value<0.9"
+        if spec == renderAll:
+            return RenderPolicy(None)
+        if spec == renderNone:
+            return RenderPolicy([])
+
+        ruleSpecs = anomalyRules if spec == renderAnomalies else spec.split(",")
+        return RenderPolicy([RenderRule.fromSpec(s) for s in ruleSpecs])
+
+    @property
+    def rendersAll(self) -> bool:
+        return self.rules is None
+
+    def shouldRender(self, results: GlyphResults) -> bool:
+        if self.rules is None:
+            return True
+        return any(rule.matches(results) for rule in self.rules)
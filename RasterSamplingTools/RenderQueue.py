@@ -0,0 +1,59 @@
+"""\
+Draw and write graphs on a pool of threads
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# How many graphs can be waiting for each thread before
+# submitting another one waits for the oldest to finish.
+maxPendingPerThread = 4
+
+RenderError = tuple[str, BaseException]
+
+
+class RenderQueue(object):
+    __slots__ = "_executor", "_maxPending", "_pending", "_errors"
+
+    def __init__(self, threadCount: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=threadCount, thread_name_prefix="render"
+        )
+        self._maxPending = threadCount * maxPendingPerThread
+        self._pending: deque[tuple[str, Future]] = deque()
+        self._errors: list[RenderError] = []
+
+    def _finishOldest(self):
+        name, future = self._pending.popleft()
+        error = future.exception()
+        if error is not None:
+            self._errors.append((name, error))
+
+    def submit(self, name: str, render: typing.Callable[[], None]):
+        # Keep the number of waiting graphs, and the results
+        # they hold on to, from growing without limit.
+        while len(self._pending) >= self._maxPending:
+            self._finishOldest()
+
+        self._pending.append((name, self._executor.submit(render)))
+
+    def drain(self) -> list[RenderError]:
+        # Wait for every graph that has been submitted, and return
+        # the name of each one that failed, with the error.
+        while self._pending:
+            self._finishOldest()
+
+        errors = self._errors
+        self._errors = []
+        return errors
+
+    def shutdown(self) -> list[RenderError]:
+        errors = self.drain()
+        self._executor.shutdown()
+        return errors
@@ -0,0 +1,225 @@
+"""\
+Result cache keyed by outline and test parameters
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import json
+import time
+import shutil
+import struct
+import hashlib
+import threading
+from PathLib.Bezier import BOutline
+from RasterSamplingTools.AtomicFile import replaceFile
+
+# Change this whenever the analysis changes in a way that
+# would make results that are already in a cache wrong.
+cacheVersion = 1
+
+defaultCacheSize = 1024 * 1024 * 1024
+
+# When the cache is full, evict down to this fraction of its size
+# so we don't have to evict again on the very next store.
+evictionTarget = 0.9
+
+# The fields of a glyph's results that depend on which font it's in,
+# rather than on its outline.
+glyphIdentityFields = [
+    "code_points",
+    "unicode_character_name",
+    "glyph_id",
+    "components",
+]
+
+CachedResult = dict[str, typing.Any]
+
+
+def outlineKey(outline: BOutline, params: dict[str, typing.Any]) -> str:
+    # A hash of the scaled outline's control points, rounded so that
+    # insignificant floating point differences don't matter, plus
+    # every parameter that affects the results.
+    digest = hashlib.sha256(f"RasterSamplingTools {cacheVersion}\n".encode())
+
+    for contour in outline.contours:
+        digest.update(b"C")
+        for curve in contour.beziers:
+            digest.update(b"B")
+            for point in curve.controlPoints:
+                x, y = curve.pointXY(point)
+                # Adding 0.0 turns -0.0 into 0.0
+                digest.update(struct.pack("<dd", round(x, 3) + 0.0, round(y, 3) + 0.0))
+
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    __slots__ = "_directory", "_maxBytes", "_index", "_totalBytes", "_lock"
+
+    def __init__(self, directory: str, maxBytes: int = defaultCacheSize):
+        self._directory = directory
+        self._maxBytes = maxBytes
+
+        # key -> (last use time, size in bytes), read from the disk when
+        # it's first needed. Other processes may share the directory, so
+        # this is only a guide to what's there.
+        self._index: typing.Optional[dict[str, tuple[float, int]]] = None
+        self._totalBytes = 0
+
+        # Graphs are written, and stored here, on the render threads
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # A worker process gets the directory and size, and reads its own index.
+        return self._directory, self._maxBytes
+
+    def __setstate__(self, state: tuple[str, int]):
+        self.__init__(*state)
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self._directory, key[:2], key)
+        return base + ".json", base + ".svg"
+
+    def _entrySize(self, key: str) -> int:
+        size = 0
+        for path in self._paths(key):
+            try:
+                size += os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _loadIndex(self) -> dict[str, tuple[float, int]]:
+        if self._index is None:
+            self._index = {}
+            self._totalBytes = 0
+            if os.path.isdir(self._directory):
+                for subdirectory in os.scandir(self._directory):
+                    if not subdirectory.is_dir():
+                        continue
+                    for entry in os.scandir(subdirectory.path):
+                        key, extension = os.path.splitext(entry.name)
+                        if extension == ".json":
+                            size = self._entrySize(key)
+                            self._index[key] = (entry.stat().st_mtime, size)
+                            self._totalBytes += size
+
+        return self._index
+
+    def _forget(self, key: str):
+        with self._lock:
+            index = self._loadIndex()
+            if key in index:
+                self._totalBytes -= index.pop(key)[1]
+
+    def lookup(self, key: str) -> typing.Optional[CachedResult]:
+        jsonPath, _ = self._paths(key)
+        try:
+            with open(jsonPath) as jsonFile:
+                cached: CachedResult = json.load(jsonFile)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._forget(key)
+            return None
+
+        # The file's modification time is its last use time, so the LRU
+        # order survives from one run to the next.
+        now = time.time()
+        try:
+            os.utime(jsonPath, (now, now))
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            index = self._loadIndex()
+            size = index[key][1] if key in index else self._entrySize(key)
+            index[key] = (now, size)
+        return cached
+
+    def store(
+        self,
+        key: str,
+        results: dict[str, typing.Any],
+        report: list[str],
+        rejected: bool,
+        svgFile: typing.Optional[str] = None,
+        svgTitle: typing.Optional[str] = None,
+    ):
+        jsonPath, svgPath = self._paths(key)
+        os.makedirs(os.path.dirname(jsonPath), exist_ok=True)
+
+        cached: CachedResult = {
+            "results": {
+                k: v for k, v in results.items() if k not in glyphIdentityFields
+            },
+            "report": report,
+            "rejected": rejected,
+        }
+        if svgFile:
+            # Results can be shared by any glyph with the same outline,
+            # but the graph is only right for the one it was titled for.
+            cached["svg_title"] = svgTitle
+
+        with self._lock:
+            if svgFile and os.path.exists(svgFile):
+                linkFile(svgFile, svgPath)
+
+            # Write the JSON last, and atomically:
+            # it's what marks the entry as complete.
+            with replaceFile(jsonPath, prefix="tmp") as outFile:
+                json.dump(cached, outFile)
+
+            self._forget(key)
+            size = self._entrySize(key)
+            self._loadIndex()[key] = (time.time(), size)
+            self._totalBytes += size
+
+            if self._totalBytes > self._maxBytes:
+                self.evict()
+
+    def hasSVG(self, key: str) -> bool:
+        _, svgPath = self._paths(key)
+        return os.path.exists(svgPath)
+
+    def linkSVG(self, key: str, target: str) -> bool:
+        _, svgPath = self._paths(key)
+        with self._lock:
+            if not os.path.exists(svgPath):
+                return False
+
+            linkFile(svgPath, target)
+            return True
+
+    def evict(self):
+        # Remove the least recently used entries until we're under the target.
+        with self._lock:
+            index = self._loadIndex()
+            target = self._maxBytes * evictionTarget
+            for key, _ in sorted(index.items(), key=lambda item: item[1][0]):
+                if self._totalBytes <= target:
+                    break
+
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self._forget(key)
+
+
+def linkFile(source: str, target: str):
+    # Hard link if we can, so the cache and the output share one copy.
+    # Remove the target first, so that we never write through an existing
+    # link into a file the cache shares.
+    if os.path.lexists(target):
+        os.remove(target)
+
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
@@ -0,0 +1,123 @@
+"""\
+Export the raw samples that each glyph's results were computed from
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import numpy as np
+from RasterSamplingTools.AtomicFile import replaceFile
+
+sampleDirectoryName = "samples"
+
+# The columns that have a row for each raster on each side of a glyph
+rasterColumns = [
+    "side",
+    "y",
+    "midpoint_x",
+    "width",
+    "width_diff1",
+    "width_diff2",
+    "selected",
+]
+
+sideLeft = 0
+sideRight = 1
+sideNumbers = {"Left": sideLeft, "Right": sideRight}
+
+Columns = dict[str, np.ndarray]
+
+
+class GlyphSamples(object):
+    __slots__ = "chosenSide", "columns"
+
+    def __init__(self, chosenSide: int, columns: Columns):
+        # chosenSide is the side the glyph's results came from
+        self.chosenSide = chosenSide
+        self.columns = columns
+
+    @property
+    def rowCount(self) -> int:
+        return len(self.columns["y"])
+
+
+def readSamples(file: str) -> dict[str, GlyphSamples]:
+    # The samples for each glyph in a font's sample file, by glyph name
+    with np.load(file) as arrays:
+        glyphs = arrays["glyphs"]
+        offsets = arrays["offsets"]
+        chosenSides = arrays["chosen_side"]
+        columns = {name: arrays[name] for name in rasterColumns}
+
+    return {
+        str(glyph): GlyphSamples(
+            int(chosenSides[index]),
+            {
+                name: column[offsets[index] : offsets[index + 1]]
+                for name, column in columns.items()
+            },
+        )
+        for index, glyph in enumerate(glyphs)
+    }
+
+
+def writeSamples(file: str, glyphSamples: dict[str, GlyphSamples]):
+    # The rows for all of the glyphs are concatenated into one array per
+    # column. The rows for glyph i are offsets[i] up to offsets[i + 1].
+    samples = list(glyphSamples.values())
+    offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+    np.cumsum([s.rowCount for s in samples], out=offsets[1:])
+
+    arrays: Columns = {
+        "glyphs": np.array(list(glyphSamples.keys()), dtype=np.str_),
+        "offsets": offsets,
+        "chosen_side": np.array([s.chosenSide for s in samples], dtype=np.int8),
+    }
+    for name in rasterColumns:
+        arrays[name] = np.concatenate([s.columns[name] for s in samples])
+
+    with replaceFile(file, "wb") as sampleFile:
+        np.savez_compressed(sampleFile, **arrays)
+
+
+class SampleExport(object):
+    # Writes one file of samples per font, named for its PostScript name.
+    # Only the current font's samples are kept in memory. If the font
+    # already has a file, the new samples replace those for the same glyphs.
+    __slots__ = "directory", "_psName", "_glyphSamples"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._psName: typing.Optional[str] = None
+        self._glyphSamples: dict[str, GlyphSamples] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def sampleFile(self, psName: str) -> str:
+        return os.path.join(self.directory, f"{psName}.npz")
+
+    def add(self, psName: str, glyphNameSpec: str, samples: GlyphSamples):
+        if psName != self._psName:
+            self.flush()
+            self._psName = psName
+
+        self._glyphSamples[glyphNameSpec] = samples
+
+    def flush(self):
+        if self._psName is None or not self._glyphSamples:
+            return
+
+        file = self.sampleFile(self._psName)
+        glyphSamples = self._glyphSamples
+        if os.path.exists(file):
+            glyphSamples = readSamples(file) | glyphSamples
+
+        writeSamples(file, glyphSamples)
+        self._glyphSamples = {}
+
+    def close(self):
+        self.flush()
+        self._psName = None
@@ -0,0 +1,168 @@
+"""\
+Estimate what each font file will cost to test, and size the worker pools
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import json
+import struct
+import statistics
+
+from fontTools.ttLib import TTFont
+from RasterSamplingTools.FontDiscovery import FontFile
+from RasterSamplingTools.AtomicFile import replaceFile
+from RasterSamplingTools.ProcessMemory import processRSS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+costFileName = "FontCosts.json"
+costVersion = 1
+
+# Leave this fraction of the available memory for everything else
+memoryHeadroom = 0.2
+
+# A worker needs at least this much memory, however small the tool is
+# when it starts: the fonts and graphs aren't loaded yet.
+minWorkerMemory = 256 * 1024 * 1024
+
+# Split a pool's tests into about this many chunks per worker, so the
+# workers don't wait on each other at the end without passing every
+# test to them one at a time.
+chunksPerWorker = 4
+
+# The measured cost of testing a font file, by its path relative to the
+# input directory: {"size": bytes, "seconds": seconds}
+FontCosts = dict[str, dict[str, typing.Any]]
+
+
+def faceCount(path: str) -> int:
+    # Just reads the header, so it's cheap even for a huge collection.
+    with open(path, "rb") as fontFile:
+        header = fontFile.read(12)
+    if len(header) == 12 and header[:4] == b"ttcf":
+        return struct.unpack(">I", header[8:12])[0]
+    return 1
+
+
+def glyphCounts(path: str) -> list[int]:
+    # The number of glyphs in each font in the file. Only
+    # the table directories and the maxp tables are read.
+    counts: list[int] = []
+    for fontNumber in range(faceCount(path)):
+        with TTFont(path, fontNumber=fontNumber, lazy=True) as ttFont:
+            counts.append(ttFont["maxp"].numGlyphs)
+    return counts
+
+
+def estimateCost(fontFile: FontFile, testCount: int, allGlyphs: bool) -> float:
+    # An estimate in arbitrary units, proportional to the time it takes to
+    # test the file: each font's tests, times the average size of a glyph
+    # in the file, since bigger glyphs take longer to sample.
+    try:
+        counts = glyphCounts(fontFile.path)
+    except Exception:
+        # The tool will report what's wrong with it when it gets to it
+        return float(fontFile.size)
+
+    totalGlyphs = sum(counts) or 1
+    glyphSize = fontFile.size / totalGlyphs
+    tests = sum(count if allGlyphs else min(count, testCount) for count in counts)
+    return tests * glyphSize
+
+
+def readCosts(file: str) -> FontCosts:
+    try:
+        with open(file) as costFile:
+            contents = json.load(costFile)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    return contents.get("fonts", {}) if contents.get("version") == costVersion else {}
+
+
+def writeCosts(file: str, costs: FontCosts):
+    # Adds to the costs already in the file
+    allCosts = readCosts(file) | costs
+    with replaceFile(file, prefix=".FontCosts.") as outFile:
+        json.dump({"version": costVersion, "fonts": allCosts}, outFile)
+
+
+def longestFirst(
+    fontFiles: list[FontFile], costs: FontCosts, testCount: int, allGlyphs: bool
+) -> list[FontFile]:
+    # The font files in decreasing order of the time they're likely to take,
+    # so that the big ones don't start at the end, when they can't share the
+    # run with anything else. A file that was timed before, and hasn't
+    # changed size since, takes the time it took. The others take their
+    # estimated cost, scaled by how the estimates compared to the times.
+    estimates = {
+        fontFile.paths[0]: estimateCost(fontFile, testCount, allGlyphs)
+        for fontFile in fontFiles
+    }
+
+    measured: dict[str, float] = {}
+    for fontFile in fontFiles:
+        cost = costs.get(fontFile.paths[0])
+        if cost and cost.get("size") == fontFile.size:
+            measured[fontFile.paths[0]] = cost["seconds"]
+
+    ratios = [
+        seconds / estimates[path]
+        for path, seconds in measured.items()
+        if estimates[path] > 0
+    ]
+    scale = statistics.median(ratios) if ratios else 1.0
+
+    def seconds(fontFile: FontFile) -> float:
+        path = fontFile.paths[0]
+        return measured.get(path, estimates[path] * scale)
+
+    # sorted() is stable, so files that cost the same stay in the order found
+    return sorted(fontFiles, key=seconds, reverse=True)
+
+
+def availableCPUs() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def availableMemory() -> typing.Optional[int]:
+    if psutil:
+        return psutil.virtual_memory().available
+
+    # Without psutil, we can still get it on Linux
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
+
+
+def autoWorkerCount() -> int:
+    # One worker per CPU this process can run on, but no more
+    # than fit in the memory that's free, leaving some headroom.
+    cpus = availableCPUs()
+    memory = availableMemory()
+    if memory is None:
+        return cpus
+
+    workerMemory = max(processRSS(os.getpid()) or 0, minWorkerMemory)
+    memoryWorkers = int(memory * (1 - memoryHeadroom) // workerMemory)
+    return max(1, min(cpus, memoryWorkers))
+
+
+def chunkSize(jobCount: int, workerCount: int) -> int:
+    return max(1, jobCount // (workerCount * chunksPerWorker))
@@ -10,16 +10,14 @@ import typing
 
 import os
 from sys import argv, stderr  #, stdout
-import statistics
 from openpyxl import Workbook
 from openpyxl.worksheet import worksheet
 from openpyxl.cell import cell
 from openpyxl.styles import Alignment
 from openpyxl.utils import get_column_letter
 from TestArguments.CommandLineArguments import CommandLineOption, CommandLineArgs, ArgumentIterator
-from UnicodeData.CharProps import getScript  #, scriptCodes
-from UnicodeData.UCDTypeDictionaries import scriptNames as scriptCodes
 from RasterSamplingTools.OutputDatabase import OutputDatabase
+from RasterSamplingTools.FontSummary import FontSummaries
 
 _usage = """
 Usage:
@@ -78,9 +76,6 @@ def statCells(ws: worksheet.Worksheet, row: int, column: int, values: list[float
     percentCell = typing.cast(cell.Cell,  ws.cell(row=row, column=column + 5, value=percentFormula(row, column + 1, column + 4)))
     percentCell.number_format = "0.0%"
 
-def getScriptCode(codePoint: int) -> str:
-    return scriptCodes[getScript(codePoint)]
-
 def main():
     argumentList = argv
     args = None
@@ -100,13 +95,16 @@ def main():
 
     # font = ctFont("Calibri", 11)
 
-    outdb = OutputDatabase(args.inputFile)
+    # The per-font summaries are kept up to date as the database is written.
+    # If they're missing or out of date, summarize the fonts and save them.
+    summaries = FontSummaries(args.inputFile)
+    fontSummaries = summaries.summaries if summaries.current else OutputDatabase(args.inputFile).fontSummaries()
     widthFields = args.widthFields
-    fitResultFields = ["stroke_angle", "log_mean_orthogonal_distance"]
+    statFields = ["min", "median", "mean", "max"]
 
     wb = Workbook()
     ws = wb.active
-    fieldNames = ["ps_name", "tested glyphs", "ignored glyphs", "scripts"]
+    fieldNames = ["ps_name", "tested glyphs", "ignored glyphs", "failed glyphs", "scripts"]
     fieldNames.extend(widthFields)
     fieldNames.extend(["range", "range as % of median", "min angle", "median angle", "mean angle", "max angle", "angle range", "range as % of median", "min lmod", "median lmod", "mean lmod", "max lmod", "lmod range", "range as % of median"])
 
@@ -116,47 +114,21 @@ def main():
 
     rowNumber = 2
     # maxWidth = 0
-    for entry in outdb.db:
-        psName = entry["ps_name"]
-        testResults = entry["test_results"]
-        widths: dict[str, list[float]] = {wf: [] for wf in widthFields}
-        fits: dict[str, list[float]] = {frf: [] for frf in fitResultFields}
-        goodGlyphCount = 0
-        haveWidths = False
+    for summary in fontSummaries:
+        psName = summary["ps_name"]
+        goodGlyphCount = summary["good_glyph_count"]
+        failedGlyphCount = summary["failed_glyph_count"]
 
         # maxWidth = max(maxWidth, stringWidth(psName, font))
 
         row = [psName]
-        scripts: set[str] = set()
-
-        for result in testResults.values():
-            widthResults = result.get("widths", None)
-            fitResults = result.get("fit_results", None)
-            codePoints = result.get("code_points", None)
-
-            for codePoint in codePoints:
-                scripts.add(getScriptCode(codePoint))
-
-            if widthResults:
-                haveWidths = True
-                goodGlyphCount += 1
-                for widthField in widthFields:
-                    widths[widthField].append(widthResults[widthField])
-
-                for fitResultField in fitResultFields:
-                    fits[fitResultField].append(fitResults[fitResultField])
-
-        if haveWidths:
-            means = [statistics.mean(widths[wf]) for wf in widthFields]
-
-            angleFits = fits["stroke_angle"]
-            angleMeans = [min(angleFits), statistics.median(angleFits), statistics.mean(angleFits), max(angleFits)]
 
-            lmodFits = fits["log_mean_orthogonal_distance"]
-            lmodMeans = [min(lmodFits), statistics.median(lmodFits), statistics.mean(lmodFits), max(lmodFits)]
+        if summary["widths"]:
+            means = [summary["widths"][wf] for wf in widthFields]
+            angleMeans = [summary["stroke_angle"][sf] for sf in statFields]
+            lmodMeans = [summary["lmod"][sf] for sf in statFields]
 
-            scripts.discard("Zzzz")  # Don't count the unknown script
-            row.extend([goodGlyphCount, len(testResults) - goodGlyphCount, len(scripts)])
+            row.extend([goodGlyphCount, summary["ignored_glyph_count"], failedGlyphCount, len(summary["scripts"])])
 
             ws.append(row)
 
@@ -170,7 +142,7 @@ def main():
             statCells(ws, rowNumber, column, lmodMeans, decimals=4)
 
         else:
-            ws.append([psName, goodGlyphCount, len(testResults) - goodGlyphCount])
+            ws.append([psName, goodGlyphCount, summary["glyph_count"] - failedGlyphCount, failedGlyphCount])
 
         rowNumber += 1
 
@@ -0,0 +1,368 @@
+"""\
+Progress and throughput metrics for long runs
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import json
+import time
+import statistics
+from collections import deque
+
+from RasterSamplingTools.AtomicFile import replaceFile
+from RasterSamplingTools.Governor import TestFailure, failureError
+
+defaultStatusInterval = 10.0
+
+# The latency percentiles are over this many of the most recent tests
+latencyWindow = 10000
+
+metricPrefix = "rastersampling"
+
+
+def failureType(failure: TestFailure) -> str:
+    # The exception type for an error, otherwise the reason, like "timeout"
+    if failure.reason == failureError:
+        typeName, colon, _ = failure.message.partition(":")
+        if colon and typeName.isidentifier():
+            return typeName
+    return failure.reason
+
+
+def writeAtomically(file: str, text: str):
+    # Monitoring agents may read the file at any time, so replace it
+    # with a complete new one rather than rewriting it in place.
+    # It's usually read by another user, so it mustn't end up readable
+    # only by this one.
+    with replaceFile(file) as outFile:
+        outFile.write(text)
+
+
+def quantile(values: list[float], fraction: float) -> typing.Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+
+    # statistics.quantiles() with n=100 gives the 1st to 99th percentiles
+    return statistics.quantiles(values, n=100, method="inclusive")[
+        round(fraction * 100) - 1
+    ]
+
+
+def roundOrNone(value: typing.Optional[float], digits: int) -> typing.Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def labelString(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class Telemetry(object):
+    __slots__ = (
+        "statusFile",
+        "metricsFile",
+        "interval",
+        "_start",
+        "_lastWrite",
+        "_fontFileCount",
+        "_fontFilesDone",
+        "_fontCount",
+        "_currentFont",
+        "_testCount",
+        "_testSeconds",
+        "_latencies",
+        "_failures",
+        "_workerBusy",
+        "_workerStart",
+        "_stageSeconds",
+    )
+
+    def __init__(
+        self,
+        statusFile: typing.Optional[str] = None,
+        metricsFile: typing.Optional[str] = None,
+        interval: float = defaultStatusInterval,
+    ):
+        self.statusFile = statusFile
+        self.metricsFile = metricsFile
+        self.interval = interval
+
+        self._start = time.time()
+        self._lastWrite = 0.0
+        self._fontFileCount = 0
+        self._fontFilesDone = 0
+        self._fontCount = 0
+        self._currentFont: typing.Optional[str] = None
+        self._testCount = 0
+        self._testSeconds = 0.0
+        self._latencies: deque[float] = deque(maxlen=latencyWindow)
+
+        # (reason, type) -> count
+        self._failures: dict[tuple[str, str], int] = {}
+
+        # worker -> seconds spent running tests, and when it was first seen
+        self._workerBusy: dict[str, float] = {}
+        self._workerStart: dict[str, float] = {}
+
+        # stage -> total seconds, over all of the fonts
+        self._stageSeconds: dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.statusFile or self.metricsFile)
+
+    def startRun(self, fontFileCount: int):
+        self._fontFileCount = fontFileCount
+        self.refresh(force=True)
+
+    def startFont(self, name: str):
+        self._currentFont = name
+
+    def finishFont(self):
+        self._fontCount += 1
+        self._currentFont = None
+
+    def finishFontFile(self):
+        self._fontFilesDone += 1
+        self._currentFont = None
+        self.refresh()
+
+    def testFinished(
+        self,
+        elapsed: float,
+        failure: typing.Optional[TestFailure] = None,
+        worker: str = "main",
+    ):
+        self._testCount += 1
+        self._testSeconds += elapsed
+        self._latencies.append(elapsed)
+
+        if worker not in self._workerStart:
+            self._workerStart[worker] = time.time() - elapsed
+        self._workerBusy[worker] = self._workerBusy.get(worker, 0.0) + elapsed
+
+        if failure:
+            key = (failure.reason, failureType(failure))
+            self._failures[key] = self._failures.get(key, 0) + 1
+
+        self.refresh()
+
+    def stage(self, name: str) -> "TelemetryStage":
+        return TelemetryStage(self, name)
+
+    def addStageTime(self, name: str, seconds: float):
+        self._stageSeconds[name] = self._stageSeconds.get(name, 0.0) + seconds
+
+    def status(self, state: str = "running") -> dict[str, typing.Any]:
+        now = time.time()
+        elapsed = now - self._start
+        fontsPerSecond = self._fontCount / elapsed if elapsed > 0 else 0.0
+        testsPerSecond = self._testCount / elapsed if elapsed > 0 else 0.0
+
+        # Assume the rest of the font files take as long as the ones so far
+        eta = None
+        if self._fontFilesDone > 0 and state == "running":
+            remaining = self._fontFileCount - self._fontFilesDone
+            eta = max(remaining, 0) * elapsed / self._fontFilesDone
+
+        latencies = list(self._latencies)
+        # Pool workers' results arrive in test order, so a worker's start
+        # time is only an estimate and this can come out a bit over 1.
+        utilization = {
+            worker: round(
+                min(busy / max(now - self._workerStart[worker], 1e-9), 1.0), 3
+            )
+            for worker, busy in self._workerBusy.items()
+        }
+
+        return {
+            "state": state,
+            "start_time": round(self._start, 3),
+            "update_time": round(now, 3),
+            "elapsed": round(elapsed, 1),
+            "current_font": self._currentFont,
+            "font_files": self._fontFileCount,
+            "font_files_done": self._fontFilesDone,
+            "fonts": self._fontCount,
+            "tests": self._testCount,
+            "failures": sum(self._failures.values()),
+            "fonts_per_second": round(fontsPerSecond, 4),
+            "tests_per_second": round(testsPerSecond, 3),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "test_seconds": {
+                "p50": roundOrNone(quantile(latencies, 0.5), 4),
+                "p95": roundOrNone(quantile(latencies, 0.95), 4),
+                "sum": round(self._testSeconds, 3),
+                "count": self._testCount,
+            },
+            "failures_by_type": [
+                {"reason": reason, "type": type, "count": count}
+                for (reason, type), count in sorted(self._failures.items())
+            ],
+            "worker_utilization": utilization,
+            "stage_seconds": {
+                name: round(seconds, 3) for name, seconds in self._stageSeconds.items()
+            },
+        }
+
+    @classmethod
+    def metricsText(cls, status: dict[str, typing.Any]) -> str:
+        # Prometheus text exposition format, for node_exporter's textfile collector
+        lines: list[str] = []
+
+        def metric(
+            name: str,
+            kind: str,
+            help: str,
+            samples: list[tuple[dict[str, str], typing.Optional[float]]],
+        ):
+            fullName = f"{metricPrefix}_{name}"
+            lines.append(f"# HELP {fullName} {help}")
+            lines.append(f"# TYPE {fullName} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{fullName}{labelString(labels)} {value}")
+
+        testSeconds = status["test_seconds"]
+        metric(
+            "up",
+            "gauge",
+            "1 while the run is going.",
+            [({}, 1 if status["state"] == "running" else 0)],
+        )
+        metric(
+            "start_time_seconds",
+            "gauge",
+            "When the run started.",
+            [({}, status["start_time"])],
+        )
+        metric(
+            "font_files",
+            "gauge",
+            "Font files found in the input directory.",
+            [({}, status["font_files"])],
+        )
+        metric(
+            "font_files_done_total",
+            "counter",
+            "Font files finished.",
+            [({}, status["font_files_done"])],
+        )
+        metric(
+            "fonts_total",
+            "counter",
+            "Fonts finished, counting each font in a collection.",
+            [({}, status["fonts"])],
+        )
+        metric("tests_total", "counter", "Tests run.", [({}, status["tests"])])
+        metric(
+            "test_failures_total",
+            "counter",
+            "Tests that failed, by reason and exception type.",
+            [
+                (
+                    {"reason": failure["reason"], "type": failure["type"]},
+                    failure["count"],
+                )
+                for failure in status["failures_by_type"]
+            ],
+        )
+        metric(
+            "fonts_per_second",
+            "gauge",
+            "Fonts finished per second, over the whole run.",
+            [({}, status["fonts_per_second"])],
+        )
+        metric(
+            "tests_per_second",
+            "gauge",
+            "Tests run per second, over the whole run.",
+            [({}, status["tests_per_second"])],
+        )
+        metric(
+            "eta_seconds",
+            "gauge",
+            "Estimated time until the run finishes.",
+            [({}, status["eta_seconds"])],
+        )
+        metric(
+            "test_duration_seconds",
+            "summary",
+            f"Time per test; the quantiles are over the last {latencyWindow} tests.",
+            [
+                ({"quantile": "0.5"}, testSeconds["p50"]),
+                ({"quantile": "0.95"}, testSeconds["p95"]),
+            ],
+        )
+        lines.append(f"{metricPrefix}_test_duration_seconds_sum {testSeconds['sum']}")
+        lines.append(
+            f"{metricPrefix}_test_duration_seconds_count {testSeconds['count']}"
+        )
+        metric(
+            "worker_utilization",
+            "gauge",
+            "Fraction of the time since each worker started that it spent running tests.",
+            [
+                ({"worker": worker}, value)
+                for worker, value in status["worker_utilization"].items()
+            ],
+        )
+        metric(
+            "stage_seconds_total",
+            "counter",
+            "Time spent in each stage of testing the fonts.",
+            [
+                ({"stage": stage}, value)
+                for stage, value in status["stage_seconds"].items()
+            ],
+        )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, state: str = "running"):
+        status = self.status(state)
+        if self.statusFile:
+            writeAtomically(self.statusFile, json.dumps(status, indent=4) + "\n")
+        if self.metricsFile:
+            writeAtomically(self.metricsFile, self.metricsText(status))
+        self._lastWrite = time.monotonic()
+
+    def refresh(self, force: bool = False):
+        if not self.enabled:
+            return
+
+        if force or time.monotonic() - self._lastWrite >= self.interval:
+            self.write()
+
+    def close(self):
+        if self.enabled:
+            self.write("finished")
+
+
+class TelemetryStage(object):
+    __slots__ = "_telemetry", "_name", "_start"
+
+    def __init__(self, telemetry: Telemetry, name: str):
+        self._telemetry = telemetry
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self._telemetry.addStageTime(self._name, time.monotonic() - self._start)
+        return False
@@ -0,0 +1,210 @@
+"""\
+Variable font instances
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import re
+import copy
+import itertools
+import logging
+import numpy as np
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
+from fontTools.misc.roundTools import otRound
+from fontTools.varLib.iup import iup_delta
+from fontTools.varLib.models import supportScalar
+from PathLib.PathTypes import Contour
+from PathLib.SegmentPen import SegmentPen
+
+Location = dict[str, float]
+
+
+class VariableInstance(object):
+    __slots__ = "location", "normalized"
+
+    def __init__(self, location: Location, normalized: Location):
+        # location is in user coordinates, normalized is after avar.
+        self.location = location
+        self.normalized = normalized
+
+    @property
+    def name(self) -> str:
+        return ",".join(f"{tag}={value:g}" for tag, value in self.location.items())
+
+
+def isVariable(ttFont: TTFont) -> bool:
+    return "fvar" in ttFont
+
+
+def axisRanges(ttFont: TTFont) -> dict[str, tuple[float, float, float]]:
+    return {
+        axis.axisTag: (axis.minValue, axis.defaultValue, axis.maxValue)
+        for axis in ttFont["fvar"].axes
+    }
+
+
+def makeInstance(ttFont: TTFont, location: Location) -> VariableInstance:
+    return VariableInstance(location, ttFont.normalizeLocation(location))
+
+
+def axisValues(spec: str, axisRange: tuple[float, float, float]) -> list[float]:
+    # Either a comma separated list of values, or start:stop:count
+    # for count evenly spaced values from start to stop.
+    minValue, defaultValue, maxValue = axisRange
+    if spec == "default":
+        return [defaultValue]
+
+    if m := re.fullmatch(r"([-+.0-9]+):([-+.0-9]+):([0-9]+)", spec):
+        start, stop = float(m.group(1)), float(m.group(2))
+        count = int(m.group(3))
+        if count < 1:
+            raise ValueError(f'Invalid axis range: "{spec}"')
+        return [float(value) for value in np.linspace(start, stop, count)]
+
+    try:
+        return [float(value) for value in spec.split(",")]
+    except ValueError:
+        raise ValueError(f'Invalid axis values: "{spec}"')
+
+
+def parseInstances(spec: str, ttFont: TTFont) -> list[VariableInstance]:
+    # spec is "named" for the font's named instances, or a "/" separated
+    # list of tag=values terms, whose Cartesian product gives the locations.
+    # e.g. "wght=100:900:5/wdth=75,100". Axes that aren't mentioned are
+    # left at their default values.
+    if not isVariable(ttFont):
+        raise ValueError("The font isn't a variable font")
+
+    ranges = axisRanges(ttFont)
+
+    if spec == "named":
+        return [
+            makeInstance(ttFont, dict(instance.coordinates))
+            for instance in ttFont["fvar"].instances
+        ]
+
+    tags: list[str] = []
+    valueLists: list[list[float]] = []
+    for term in spec.split("/"):
+        m = re.fullmatch(r"([A-Za-z0-9 ]{1,4})=(.+)", term)
+        if not m or m.group(1) not in ranges:
+            raise ValueError(f'Invalid instance specification: "{term}"')
+
+        tag = m.group(1)
+        tags.append(tag)
+        valueLists.append(axisValues(m.group(2), ranges[tag]))
+
+    return [
+        makeInstance(ttFont, dict(zip(tags, values)))
+        for values in itertools.product(*valueLists)
+    ]
+
+
+class VariableOutlines(object):
+    # Outlines for every glyph at every instance location. The first time
+    # a glyph is asked for, it's computed at all of the locations at once.
+    __slots__ = "_ttFont", "_instances", "_logger", "_glyphSets", "_contours"
+
+    def __init__(
+        self,
+        ttFont: TTFont,
+        instances: list[VariableInstance],
+        logger: logging.Logger,
+    ):
+        self._ttFont = ttFont
+        self._instances = instances
+        self._logger = logger
+        self._glyphSets: dict[int, typing.Any] = {}
+        self._contours: dict[str, list[list[Contour]]] = {}
+
+    @property
+    def instances(self) -> list[VariableInstance]:
+        return self._instances
+
+    def contours(self, glyphName: str, index: int) -> list[Contour]:
+        if glyphName not in self._contours:
+            self._contours[glyphName] = self._allContours(glyphName)
+
+        return self._contours[glyphName][index]
+
+    def _glyphSet(self, index: int):
+        if index not in self._glyphSets:
+            self._glyphSets[index] = self._ttFont.getGlyphSet(
+                location=self._instances[index].normalized, normalized=True
+            )
+        return self._glyphSets[index]
+
+    def _drawAt(self, glyphName: str, index: int) -> list[Contour]:
+        # Let fontTools build the instance: used for composite glyphs,
+        # and for CFF2 fonts, whose blends we don't batch.
+        glyphSet = self._glyphSet(index)
+        pen = SegmentPen(glyphSet, self._logger)
+        glyphSet[glyphName].draw(pen)
+        return pen.contours
+
+    def instanceCoordinates(self, glyphName: str) -> typing.Optional[np.ndarray]:
+        # The coordinates of a simple glyf glyph, including the four phantom
+        # points, at every instance: an (instances, points, 2) array. Returns
+        # None if the glyph isn't a simple glyph in a glyf/gvar font.
+        ttFont = self._ttFont
+        if "glyf" not in ttFont or "gvar" not in ttFont:
+            return None
+
+        glyfTable = ttFont["glyf"]
+        glyph = glyfTable[glyphName]
+        if glyph.isComposite() or glyph.numberOfContours <= 0:
+            return None
+
+        hMetrics = ttFont["hmtx"].metrics
+        vMetrics = getattr(ttFont.get("vmtx"), "metrics", None)
+        coordinates, controls = glyfTable._getCoordinatesAndControls(
+            glyphName, hMetrics, vMetrics
+        )
+        base = np.array(coordinates, dtype=float)
+        variations = ttFont["gvar"].variations.get(glyphName, [])
+
+        # One row of scalars per instance and one delta array per tuple,
+        # so applying all of them at every location is a single product.
+        scalars = np.zeros((len(self._instances), len(variations)))
+        deltas = np.zeros((len(variations),) + base.shape)
+        for t, variation in enumerate(variations):
+            for i, instance in enumerate(self._instances):
+                scalars[i, t] = supportScalar(instance.normalized, variation.axes)
+
+            tupleDeltas = variation.coordinates
+            if None in tupleDeltas:
+                if not scalars[:, t].any():
+                    continue
+                tupleDeltas = iup_delta(tupleDeltas, coordinates, controls.endPts)
+            deltas[t] = tupleDeltas
+
+        return base + np.einsum("it,tpc->ipc", scalars, deltas)
+
+    def _allContours(self, glyphName: str) -> list[list[Contour]]:
+        allCoordinates = self.instanceCoordinates(glyphName)
+        if allCoordinates is None:
+            return [self._drawAt(glyphName, i) for i in range(len(self._instances))]
+
+        glyfTable = self._ttFont["glyf"]
+        glyph = glyfTable[glyphName]
+        allContours: list[list[Contour]] = []
+        for index, coordinates in enumerate(allCoordinates):
+            instanceGlyph = copy.copy(glyph)
+            instanceGlyph.coordinates = GlyphCoordinates(coordinates[:-4].tolist())
+            instanceGlyph.recalcBounds(glyfTable)
+
+            # Position the outline the same way fontTools' glyph set does,
+            # relative to the left phantom point.
+            leftSideX = coordinates[-4][0]
+            offset = otRound(instanceGlyph.xMin - leftSideX) - instanceGlyph.xMin
+
+            pen = SegmentPen(self._glyphSet(index), self._logger)
+            instanceGlyph.draw(pen, glyfTable, offset)
+            allContours.append(pen.contours)
+
+        return allContours
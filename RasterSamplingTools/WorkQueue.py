@@ -0,0 +1,300 @@
+"""\
+A queue of font files shared by any number of tool processes
+
+Created on October 19, 2026
+
+@author Eric Mader
+"""
+
+import typing
+
+import os
+import re
+import json
+import time
+import socket
+import sqlite3
+import threading
+import contextlib
+
+from RasterSamplingTools.FontDiscovery import FontFile
+
+# A worker holds the lease on a font file for this many seconds after
+# it claims it, or after its last heartbeat, whichever is later.
+defaultLeaseTime = 300.0
+
+# A font file whose lease has expired this many times is given up on,
+# so a font that kills every worker that tests it doesn't stop the run.
+maxAttempts = 3
+
+# How long to wait for another process to finish with the queue, in seconds.
+# Compacting a worker's results into the output database can take a while.
+busyTimeout = 3600.0
+
+stateQueued = "queued"
+stateLeased = "leased"
+stateDone = "done"
+stateFailed = "failed"
+
+workerIDPattern = re.compile(r"[A-Za-z0-9_.-]+")
+
+_schema = """
+CREATE TABLE IF NOT EXISTS fonts (
+    path TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    paths TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS fonts_state ON fonts (state, seq);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+def defaultWorkerID() -> str:
+    hostName = re.sub(r"[^A-Za-z0-9_.-]", "_", socket.gethostname())
+    return f"{hostName}-{os.getpid()}"
+
+
+def connect(file: str) -> sqlite3.Connection:
+    # Transactions are started explicitly, with BEGIN IMMEDIATE, so
+    # that two workers can't both read a font as free and claim it.
+    return sqlite3.connect(file, timeout=busyTimeout, isolation_level=None)
+
+
+@contextlib.contextmanager
+def transaction(connection: sqlite3.Connection, mode: str = "IMMEDIATE"):
+    connection.execute(f"BEGIN {mode}")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class WorkQueue(object):
+    # The font files in the input directory, in an SQLite database that every
+    # worker opens. Each worker claims the next font file that isn't done and
+    # isn't leased by another worker, tests it, and marks it done. While it
+    # tests a font file, a background thread renews its lease. If the worker
+    # dies, the lease runs out and another worker claims the font file again.
+    __slots__ = "file", "root", "workerID", "leaseTime", "_connection"
+
+    def __init__(
+        self,
+        file: str,
+        root: str,
+        workerID: typing.Optional[str] = None,
+        leaseTime: float = defaultLeaseTime,
+    ):
+        self.file = file
+        self.root = root
+        self.workerID = workerID or defaultWorkerID()
+        self.leaseTime = leaseTime
+        self._connection = connect(file)
+        self._connection.executescript(_schema)
+        self.seen()
+
+    def close(self):
+        self._connection.close()
+
+    @property
+    def empty(self) -> bool:
+        row = self._connection.execute("SELECT COUNT(*) FROM fonts").fetchone()
+        return row[0] == 0
+
+    def counts(self) -> dict[str, int]:
+        # The number of font files in each state
+        rows = self._connection.execute(
+            "SELECT state, COUNT(*) FROM fonts GROUP BY state"
+        )
+        return {state: count for state, count in rows}
+
+    @property
+    def remainingCount(self) -> int:
+        counts = self.counts()
+        return counts.get(stateQueued, 0) + counts.get(stateLeased, 0)
+
+    def addFonts(self, fontFiles: list[FontFile]):
+        # The first worker to start fills the queue. The fonts are claimed
+        # in the order they're given, and a font already queued is left alone.
+        with transaction(self._connection) as connection:
+            row = connection.execute("SELECT COALESCE(MAX(seq), -1) FROM fonts")
+            start = row.fetchone()[0] + 1
+            connection.executemany(
+                "INSERT OR IGNORE INTO fonts (path, seq, size, paths, state)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        fontFile.paths[0],
+                        start + index,
+                        fontFile.size,
+                        json.dumps(fontFile.paths),
+                        stateQueued,
+                    )
+                    for index, fontFile in enumerate(fontFiles)
+                ],
+            )
+
+    def seen(self, connection: typing.Optional[sqlite3.Connection] = None):
+        (connection or self._connection).execute(
+            "INSERT OR REPLACE INTO workers (worker, last_seen) VALUES (?, ?)",
+            (self.workerID, time.time()),
+        )
+
+    def claim(self) -> typing.Optional[FontFile]:
+        while True:
+            with transaction(self._connection) as connection:
+                now = time.time()
+                row = connection.execute(
+                    "SELECT path, size, paths, state, attempts FROM fonts"
+                    " WHERE state = ? OR (state = ? AND lease_expires < ?)"
+                    " ORDER BY seq LIMIT 1",
+                    (stateQueued, stateLeased, now),
+                ).fetchone()
+                if row is None:
+                    return None
+
+                path, size, paths, state, attempts = row
+                if state == stateLeased and attempts >= maxAttempts:
+                    connection.execute(
+                        "UPDATE fonts SET state = ?, worker = NULL WHERE path = ?",
+                        (stateFailed, path),
+                    )
+                    continue
+
+                connection.execute(
+                    "UPDATE fonts SET state = ?, worker = ?, lease_expires = ?,"
+                    " attempts = attempts + 1 WHERE path = ?",
+                    (stateLeased, self.workerID, now + self.leaseTime, path),
+                )
+                self.seen(connection)
+
+            fontFile = FontFile(os.path.join(self.root, path), size)
+            fontFile.paths = json.loads(paths)
+            return fontFile
+
+    def renew(
+        self, fontFile: FontFile, connection: typing.Optional[sqlite3.Connection] = None
+    ) -> bool:
+        # False if the lease ran out and another worker has the font now
+        connection = connection or self._connection
+        with transaction(connection):
+            cursor = connection.execute(
+                "UPDATE fonts SET lease_expires = ?"
+                " WHERE path = ? AND state = ? AND worker = ?",
+                (
+                    time.time() + self.leaseTime,
+                    fontFile.paths[0],
+                    stateLeased,
+                    self.workerID,
+                ),
+            )
+            self.seen(connection)
+        return cursor.rowcount > 0
+
+    def finish(self, fontFile: FontFile, seconds: float):
+        with transaction(self._connection) as connection:
+            connection.execute(
+                "UPDATE fonts SET state = ?, lease_expires = NULL, seconds = ?"
+                " WHERE path = ? AND state = ? AND worker = ?",
+                (stateDone, seconds, fontFile.paths[0], stateLeased, self.workerID),
+            )
+            self.seen(connection)
+
+    @contextlib.contextmanager
+    def heartbeat(self, fontFile: FontFile):
+        heartbeat = Heartbeat(self, fontFile)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            heartbeat.stop()
+
+    def leasedFontFiles(self) -> typing.Iterator[FontFile]:
+        # Claim font files until there are none left. Each one is marked
+        # done, with the time the caller spent on it, when the caller asks
+        # for the next one.
+        while (fontFile := self.claim()) is not None:
+            start = time.monotonic()
+            with self.heartbeat(fontFile):
+                yield fontFile
+            self.finish(fontFile, time.monotonic() - start)
+
+    def costs(self) -> dict[str, dict[str, typing.Any]]:
+        # How long each font file that's done took to test
+        rows = self._connection.execute(
+            "SELECT path, size, seconds FROM fonts"
+            " WHERE state = ? AND seconds IS NOT NULL",
+            (stateDone,),
+        )
+        return {
+            path: {"size": size, "seconds": round(seconds, 3)}
+            for path, size, seconds in rows
+        }
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        # Keep every other worker out of the queue, and so out of
+        # anything else they only change while they're in it.
+        with transaction(self._connection, "EXCLUSIVE"):
+            yield
+
+    def deadWorkers(self) -> list[str]:
+        # The workers that haven't been heard from for longer than a lease.
+        # Forgets them, so each one is only reported once.
+        cutoff = time.time() - self.leaseTime
+        rows = self._connection.execute(
+            "SELECT worker FROM workers WHERE last_seen < ? AND worker != ?",
+            (cutoff, self.workerID),
+        ).fetchall()
+        self._connection.execute(
+            "DELETE FROM workers WHERE last_seen < ? AND worker != ?",
+            (cutoff, self.workerID),
+        )
+        return [worker for (worker,) in rows]
+
+    def leave(self):
+        self._connection.execute(
+            "DELETE FROM workers WHERE worker = ?", (self.workerID,)
+        )
+
+
+class Heartbeat(object):
+    # Renews a lease a few times during each lease time, on a thread
+    # of its own with its own connection to the queue.
+    __slots__ = "_queue", "_fontFile", "_stopped", "_thread"
+
+    def __init__(self, queue: WorkQueue, fontFile: FontFile):
+        self._queue = queue
+        self._fontFile = fontFile
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        connection = connect(self._queue.file)
+        try:
+            while not self._stopped.wait(self._queue.leaseTime / 3):
+                try:
+                    if not self._queue.renew(self._fontFile, connection):
+                        break
+                except sqlite3.Error:
+                    # Try again next time, before the lease runs out
+                    continue
+        finally:
+            connection.close()
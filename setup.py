@@ -21,8 +21,11 @@ setup(
         "matplotlib >= 3.4.3",
         "openpyxl >= 3.0.9",
         "scipy >= 1.7.1",
-        "statsmodels >= 0.13.2",
     ],
+    extras_require={
+        "statsmodels": ["statsmodels >= 0.13.2"],
+        "governor": ["psutil >= 5.8.0"],
+    },
 
     entry_points={
         "console_scripts": [